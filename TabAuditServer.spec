@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('core', 'core')],
-    hiddenimports=['rest_framework', 'core.apps', 'waitress'],
+    hiddenimports=['rest_framework', 'core.apps', 'waitress', 'numpy'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,60 @@
+"""
+ASGI launcher: the experimental async serving mode (see core/async_views.py and
+core/syncpool.py). It is not the production server: production_server.py
+(waitress) is. In `manage.py bench_serving` this mode is slower than waitress,
+both on reads and writes alone and with exports running: one process runs all
+the Python on one GIL whichever server schedules it, and SQLite has no async
+driver, so the event loop adds a thread hop per request and saves nothing. Its
+one gain is the dashboard stream (core/stream.py), which stays open here
+instead of being polled.
+
+    python asgi_server.py
+
+Serves tab_audit_system.asgi:application with uvicorn on one event loop. The read
+endpoints (possession, history, dashboard, logs) and the dashboard stream run on
+TAB_AUDIT_READ_THREADS threads (default 4); the other views, including every write
+and export, share TAB_AUDIT_SYNC_THREADS threads (default 6, like waitress). Both
+pools are bounded and keep their DB connections. Environment: TAB_AUDIT_PORT (8000),
+TAB_AUDIT_SWEEP_INTERVAL, TAB_AUDIT_ROLLUP_INTERVAL.
+"""
+import os
+import logging
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tab_audit_system.settings')
+
+import uvicorn
+from tab_audit_system.asgi import application
+from core.sweeper import start_sweeper_thread
+from core.periodic import start_periodic_thread
+from core.rollups import rollup_usage
+from server_utils import get_ip
+
+if __name__ == '__main__':
+    ip_address = get_ip()
+    port = int(os.environ.get('TAB_AUDIT_PORT', 8000))
+
+    print("="*60)
+    print(f"   TAB AUDIT SYSTEM - EXPERIMENTAL MODE (ASGI, uvicorn)")
+    print(f"   Not for production: use production_server.py")
+    print(f"   STATUS: RUNNING")
+    print("-" * 60)
+    print(f"   >> Admin Panel:  http://{ip_address}:{port}/admin/")
+    print(f"   >> For Tab return: http://{ip_address}:{port}/")
+    print(f"   >> Admin otp dashboard: http://{ip_address}:{port}/admin/dashboard")
+    print(f"   >> Check If running or not: http://{ip_address}:{port}/api/")
+    print("="*60)
+    print("\nLogs:")
+
+    # Same background jobs as production_server.py
+    logging.basicConfig(format='%(asctime)s %(name)s: %(message)s')
+    logging.getLogger('core.sweeper').setLevel(logging.INFO)
+    sweep_interval = int(os.environ.get('TAB_AUDIT_SWEEP_INTERVAL', 300))
+    if sweep_interval > 0:
+        start_sweeper_thread(interval=sweep_interval)
+
+    rollup_interval = int(os.environ.get('TAB_AUDIT_ROLLUP_INTERVAL', 900))
+    if rollup_interval > 0:
+        start_periodic_thread('usage-rollup', rollup_usage, rollup_interval)
+
+    # One process, one event loop; lifespan events are not used by Django
+    uvicorn.run(application, host='0.0.0.0', port=port, lifespan='off', access_log=False)
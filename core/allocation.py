@@ -0,0 +1,99 @@
+# core/allocation.py
+"""
+Atomic device claiming for the assignment flows.
+
+Each concurrent request must walk away with a different device, even across
+waitress threads and server processes:
+
+* PostgreSQL (and other backends with SKIP LOCKED): SELECT ... FOR UPDATE SKIP
+  LOCKED hands each transaction the first row nobody else has locked, so
+  concurrent claims never wait on each other.
+* SQLite: a conditional UPDATE (... WHERE id = ? AND status = 'available')
+  claims a candidate only if it is still available. A request that loses the race
+  moves on to the next candidate. Candidates are shuffled so simultaneous
+  requests don't all aim at the same row.
+
+All functions must be called inside the assignment transaction.
+"""
+import random
+
+from django.db import connection
+from django.utils import timezone
+
+from .dashboard import count_devices, mark_model_dirty
+from .models import AssignmentOTP, TabletDevice
+
+CANDIDATE_BATCH = 20
+MAX_ROUNDS = 5
+
+
+def claim_any_device(tab_type, user):
+    """Assigns one available device of `tab_type` to `user`. Returns it, or None if none is free."""
+    if connection.features.has_select_for_update_skip_locked:
+        device = TabletDevice.objects.select_for_update(skip_locked=True).filter(
+            tab_type=tab_type, status='available'
+        ).order_by().first()
+        if device is None:
+            return None
+        device.status = 'assigned'
+        device.assigned_to = user
+        device.assigned_at = timezone.now()
+        device.save()
+        return device
+
+    for _ in range(MAX_ROUNDS):
+        candidates = list(TabletDevice.objects.filter(
+            tab_type=tab_type, status='available'
+        ).order_by().values_list('id', flat=True)[:CANDIDATE_BATCH])
+        if not candidates:
+            return None
+        random.shuffle(candidates)
+        for device_id in candidates:
+            if _conditional_claim(device_id, tab_type.id, user):
+                return TabletDevice.objects.select_related('tab_type').get(id=device_id)
+    return None
+
+
+def claim_device(device, user):
+    """Assigns this specific (scanned) device to `user` if it is still available. Returns True on success."""
+    if not _conditional_claim(device.id, device.tab_type_id, user):
+        return False
+    device.refresh_from_db()
+    return True
+
+
+def claim_devices(devices, user):
+    """
+    Batch form of claim_device: one conditional UPDATE for the whole list.
+    Returns the set of ids that were still available and now belong to `user`.
+    """
+    now = timezone.now()
+    device_ids = [device.id for device in devices]
+    if not TabletDevice.objects.filter(id__in=device_ids, status='available').update(
+        status='assigned', assigned_to=user, assigned_at=now
+    ):
+        return set()
+    # The rows this statement claimed carry its exact timestamp; other writers wait on them until we commit
+    won = set(TabletDevice.objects.filter(
+        id__in=device_ids, status='assigned', assigned_to=user, assigned_at=now
+    ).values_list('id', flat=True))
+    count_devices([(device.tab_type_id, 'available', 'assigned') for device in devices if device.id in won])
+    return won
+
+
+def use_assignment_otp(assignment_otp):
+    """Marks an assignment OTP as used. Returns False if a concurrent request redeemed it first."""
+    if not AssignmentOTP.objects.filter(id=assignment_otp.id, is_used=False).update(is_used=True):
+        return False
+    assignment_otp.is_used = True
+    mark_model_dirty(AssignmentOTP)
+    return True
+
+
+def _conditional_claim(device_id, tab_type_id, user):
+    claimed = TabletDevice.objects.filter(id=device_id, status='available').update(
+        status='assigned', assigned_to=user, assigned_at=timezone.now()
+    )
+    if claimed:
+        count_devices([(tab_type_id, 'available', 'assigned')])
+    return bool(claimed)
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Connect the receivers in core/receivers.py, and the query counter of core/metrics.py
+        from . import metrics, receivers  # noqa: F401
+        from .writelock import checkpoint_wal
+
+        # After the receivers of the other apps, so their rows are in the file too
+        post_migrate.connect(checkpoint_wal, sender=self)
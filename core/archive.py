@@ -0,0 +1,77 @@
+# core/archive.py
+"""
+Hot/cold split of the assignment history.
+
+AssignmentLog (hot) keeps active loans and recently closed ones. Closed logs
+(returned / transferred) whose loan ended more than ARCHIVE_AFTER_DAYS ago are
+moved to ArchivedAssignmentLog (cold). The cold table has the same columns and
+ids, so every history, dashboard and daily-limit query only touches the small
+hot table. The logs page and the CSV export read the archive on demand
+(?archive=1).
+
+Rows are copied with INSERT ... SELECT inside the database, in batches, each
+in its own transaction, so no batch holds the write lock for long.
+restore_logs() moves an issue-date range back, e.g. to fix an entry; rows that
+are still old enough move out again on the next archive pass.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+
+from .dashboard import mark_model_dirty
+from .models import ArchivedAssignmentLog, AssignmentLog
+
+ARCHIVE_AFTER_DAYS = 180
+BATCH_SIZE = 500
+
+# Shared columns of both tables (attnames, e.g. user_id)
+LOG_FIELDS = [field.attname for field in AssignmentLog._meta.concrete_fields]
+
+
+def archive_logs(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """Moves closed logs that ended before the cutoff to the archive. Returns the number moved."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    closed = AssignmentLog.objects.exclude(status='active').filter(returned_at__lt=cutoff)
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(closed.order_by().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            batch = AssignmentLog.objects.filter(id__in=ids)
+            _insert_select(
+                batch.annotate(archived_at=Value(timezone.now(), output_field=DateTimeField())),
+                ArchivedAssignmentLog, LOG_FIELDS + ['archived_at'],
+            )
+            batch.delete()  # Model signals mark the dashboard dirty
+        moved += len(ids)
+    return moved
+
+
+def restore_logs(date_from, date_to, batch_size=BATCH_SIZE):
+    """Moves archived logs issued in [date_from, date_to) back to AssignmentLog. Returns the number moved."""
+    archived = ArchivedAssignmentLog.objects.filter(issued_at__gte=date_from, issued_at__lt=date_to)
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(archived.order_by().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            batch = ArchivedAssignmentLog.objects.filter(id__in=ids)
+            _insert_select(batch, AssignmentLog, LOG_FIELDS)
+            batch.delete()
+            mark_model_dirty(AssignmentLog)  # The INSERT ... SELECT sends no signals
+        moved += len(ids)
+    return moved
+
+
+def _insert_select(queryset, model, fields):
+    """INSERT INTO model (fields) SELECT fields FROM <queryset>, without loading the rows."""
+    select_sql, params = queryset.order_by().values_list(*fields).query.sql_with_params()
+    columns = ", ".join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {select_sql}", params)
@@ -0,0 +1,102 @@
+# core/async_views.py
+"""
+Lean versions of the read endpoints, used when the app is served over ASGI
+(asgi_server.py). tab_audit_system/asgi_urls.py routes to them; under WSGI
+(waitress) the DRF views in core/views.py answer the same URLs.
+
+possession, history, dashboard and logs are plain function views without DRF's
+request and response layers. Each request runs one of them, from the JWT check
+to the JSON body, in a single hop to the read pool of core/syncpool.py. Its
+queries are ordinary sync ORM calls: a request waiting on the database holds a
+pool thread, like under waitress, but the pool is bounded, its threads keep
+their connections, and the writes and exports have a pool of their own. (Django's
+async ORM would run each request's queries on a new thread, with no bound.)
+The queries, JSON bodies, errors and ETags are the same as those of the DRF views.
+The ASGI mode is experimental (see asgi_server.py); waitress serves production.
+"""
+from functools import wraps
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import CachedJWTAuthentication
+from .dashboard import expired_otp_marker, get_dashboard_snapshot
+from .pagination import keyset_page
+from .syncpool import read_view_in_pool
+from .versioning import conditional_view_on_data_version
+from .views import activity_history, assignment_log_query, history_row, log_row, possession_logs
+
+
+def _json(data, status=200):
+    # DRF's renderer, so bodies are byte-for-byte those of the DRF views
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _error(exc, authenticator):
+    # As DRF's exception handler answers authentication and permission failures
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _json(detail, status=exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = authenticator.authenticate_header(None)
+    return response
+
+
+def authenticated(admin=False):
+    """Sets request.user from the JWT, like IsAuthenticated (and IsAdminUser) on the DRF views."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            authenticator = CachedJWTAuthentication()
+            try:
+                result = authenticator.authenticate(request)
+            except exceptions.AuthenticationFailed as e:
+                return _error(e, authenticator)
+            if result is None:
+                return _error(exceptions.NotAuthenticated(), authenticator)
+            if admin and not result[0].is_staff:
+                return _error(exceptions.PermissionDenied(), authenticator)
+
+            request.user = result[0]
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@require_GET
+@read_view_in_pool
+@authenticated()
+@conditional_view_on_data_version(per_user=True)
+def user_possession(request):
+    return _json(list(possession_logs(request.user)))
+
+
+@require_GET
+@read_view_in_pool
+@authenticated()
+@conditional_view_on_data_version(per_user=True)
+def user_history(request):
+    return _json([history_row(row) for row in activity_history(request.user)])
+
+
+@require_GET
+@read_view_in_pool
+@authenticated(admin=True)
+@conditional_view_on_data_version(extra=expired_otp_marker)
+def admin_dashboard(request):
+    return _json(get_dashboard_snapshot())
+
+
+@require_GET
+@read_view_in_pool
+@authenticated(admin=True)
+@conditional_view_on_data_version()
+def all_assignment_logs(request):
+    try:
+        logs, limit = assignment_log_query(request.GET)
+        rows, next_cursor = keyset_page(logs, request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return _json({"error": str(e)}, status=400)
+
+    return _json({"results": [log_row(row) for row in rows], "next_cursor": next_cursor})
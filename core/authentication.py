@@ -0,0 +1,144 @@
+# core/authentication.py
+"""
+JWT authentication with an in-process cache of token users.
+
+simplejwt's JWTAuthentication loads the User row on every request, before the
+view starts. On the polled endpoints (possession, history, dashboard) that is
+often the most expensive query of the request. CachedJWTAuthentication keeps
+the users it has loaded for JWT_USER_CACHE_TTL seconds, at most
+JWT_USER_CACHE_SIZE of them (least recently used go first).
+
+A cache hit makes no query. When a User row is saved, the process that saved
+it drops that user at once (core/receivers.py), and the save moves the shared
+'users' ChangeCounter. Each process reads that counter at most once every
+JWT_USER_CACHE_CHECK_INTERVAL seconds, and when it has moved, stops using the
+users it cached before: a role, status or is_active change made in another
+server process applies within that interval. A miss reads the version with
+the row, in the same query, so an entry is never older than its version.
+A login's last_login update and its password rehash change neither.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import ChangeCounter
+
+USERS_VERSION = 'users'
+
+
+def current_users_version():
+    return ChangeCounter.current(USERS_VERSION)
+
+
+def bump_users_version():
+    with transaction.atomic():
+        return ChangeCounter.bump(USERS_VERSION)
+
+
+class UserCache:
+    """Bounded LRU of User rows with a time-to-live, shared by the threads of a process."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # user id (str) -> (expires at, users version, user)
+        self._lock = threading.Lock()
+        self._version = 0               # Entries loaded at another users version are not used
+        self._checked = float('-inf')  # When the version was last read (time.monotonic())
+
+    def get(self, user_id):
+        """Returns a copy of the cached user, or None."""
+        key = str(user_id)
+        if key not in self._entries:
+            return None  # The miss reads the version with the row
+        if time.monotonic() - self._checked >= settings.JWT_USER_CACHE_CHECK_INTERVAL:
+            self._check(current_users_version())
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, version, user = entry
+            if expires <= time.monotonic() or version != self._version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Every request gets its own instance, so nothing set on request.user leaks into the next one
+        return copy.copy(user)
+
+    def put(self, user_id, user, version):
+        """Caches a user read together with the users version."""
+        with self._lock:
+            if version >= self._version:
+                # The version was read just now: it counts as a check
+                self._version, self._checked = version, time.monotonic()
+            if settings.JWT_USER_CACHE_TTL <= 0:
+                return
+            key = str(user_id)
+            self._entries[key] = (time.monotonic() + settings.JWT_USER_CACHE_TTL, version, copy.copy(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.JWT_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version, self._checked = 0, float('-inf')
+
+    def _check(self, version):
+        # Exactly the counter's value, even a lower one (a restored database)
+        with self._lock:
+            self._version, self._checked = version, time.monotonic()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that looks the token's user up in user_cache first."""
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return self.check_user(cached, validated_token)
+        try:
+            user = self.user_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed("User not found", code="user_not_found") from e
+        user_cache.put(user_id, user, user.users_version)
+        return self.check_user(user, validated_token)
+
+    def user_queryset(self):
+        # The version is read in the same statement as the row, so it is never newer than the row
+        version = ChangeCounter.objects.filter(name=USERS_VERSION).values('value')[:1]
+        return self.user_model.objects.annotate(users_version=Coalesce(Subquery(version), 0))
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+    def check_user(self, user, validated_token):
+        # The checks of JWTAuthentication.get_user(), run on cached users too
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
@@ -0,0 +1,215 @@
+# core/batch.py
+"""
+Batch checkout and return for kiosks that scan a whole cart of tablets at once.
+
+Each function takes the scanned serial numbers or QR codes and:
+  1. resolves every device with one set-based lookup,
+  2. validates each item on its own (a bad scan never fails the rest of the cart),
+  3. applies the valid items in one transaction with bulk writes,
+and returns one result per item, in request order:
+  {"device_id": <scanned code>, "ok": bool, "serial_number": ..., "message" | "error": ...}
+
+Daily limits are reserved once per tab type (core/limits.py) and devices are
+claimed with one conditional UPDATE (core/allocation.py), so concurrent carts
+and single checkouts never hand out the same device.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .allocation import claim_devices
+from .dashboard import count_devices, mark_model_dirty
+from .limits import release_daily_slots, reserve_daily_slots, unreserve_daily_slots
+from .models import AssignmentLog, ReturnVerification, TabletDevice
+from .otp import allocate_otps
+
+MAX_BATCH = 50
+
+
+def _check_batch(items):
+    if not isinstance(items, list) or not items:
+        raise ValueError("Provide a non-empty list of scanned devices.")
+    if len(items) > MAX_BATCH:
+        raise ValueError(f"A batch is limited to {MAX_BATCH} devices.")
+
+
+def _resolve(codes, **filters):
+    """{scanned code: device} for every code that matches a serial number or QR code."""
+    codes = {code for code in codes if code}
+    devices = TabletDevice.objects.select_related('tab_type').filter(
+        Q(serial_number__in=codes) | Q(qr_code__in=codes), **filters
+    )
+    found = {}
+    for device in devices:
+        for code in (device.serial_number, device.qr_code):
+            if code in codes:
+                found[code] = device
+    return found
+
+
+def _set_status(devices, status, **fields):
+    """
+    Moves the devices to `status` with one UPDATE per status they were read in, so
+    the dashboard counts move by exactly that. Rows changed since they were read are
+    moved all the same, and leave the counts to a rebuild.
+    """
+    by_status = defaultdict(list)
+    for device in devices:
+        by_status[device.status].append(device)
+    for before, group in by_status.items():
+        if before == status and not fields:
+            continue
+        ids = [device.id for device in group]
+        if TabletDevice.objects.filter(id__in=ids, status=before).update(status=status, **fields) == len(group):
+            count_devices([(device.tab_type_id, before, status) for device in group])
+        else:
+            TabletDevice.objects.filter(id__in=ids).update(status=status, **fields)
+            mark_model_dirty(TabletDevice)
+
+
+def _ok(code, device, message):
+    return {"device_id": code, "ok": True, "serial_number": device.serial_number, "message": message}
+
+
+def _error(code, error, device=None):
+    return {"device_id": code, "ok": False, "serial_number": device.serial_number if device else None, "error": error}
+
+
+def batch_assign(user, codes, ip_address, device_info):
+    """Assigns every scanned device to `user` (the scan workflow of AssignTabletView, for a cart)."""
+    _check_batch(codes)
+    codes = [str(code).strip() for code in codes]
+    devices = _resolve(codes)
+
+    results = [None] * len(codes)
+    by_type = defaultdict(list)
+    seen = set()
+    for i, code in enumerate(codes):
+        device = devices.get(code)
+        if device is None:
+            results[i] = _error(code, f"Tablet '{code}' does not exist in the system registry.")
+        elif device.id in seen:
+            results[i] = _error(code, "Scanned twice in this batch.", device)
+        elif device.status != 'available':
+            results[i] = _error(code, f"Device is currently {device.status}.", device)
+        else:
+            seen.add(device.id)
+            by_type[device.tab_type].append((i, device))
+
+    with transaction.atomic():
+        claimed = []
+        for tab_type, entries in by_type.items():
+            # 1. One limit check per tab type; the items past the limit are rejected
+            granted = reserve_daily_slots(user, tab_type, len(entries))
+            for i, device in entries[granted:]:
+                results[i] = _error(codes[i], "You reached your daily limit for this tab type.", device)
+            entries = entries[:granted]
+            if not entries:
+                continue
+
+            # 2. One conditional UPDATE claims every device that is still available
+            won = claim_devices([device for _, device in entries], user)
+            lost = [(i, device) for i, device in entries if device.id not in won]
+            if lost:
+                unreserve_daily_slots(user, tab_type, len(lost))
+            for i, device in lost:
+                results[i] = _error(codes[i], "Device was just assigned to someone else.", device)
+            claimed.extend((i, device) for i, device in entries if device.id in won)
+
+        # 3. One insert for all the loans
+        if claimed:
+            AssignmentLog.objects.bulk_create([
+                AssignmentLog(user=user, device=device, status='active', ip_address=ip_address, device_info=device_info)
+                for _, device in claimed
+            ])
+            mark_model_dirty(AssignmentLog)
+        for i, device in claimed:
+            results[i] = _ok(codes[i], device, f"Assigned! Pick up device Serial: {device.serial_number}")
+
+    return results
+
+
+def batch_initiate_return(user, codes):
+    """Starts the return of every scanned device `user` holds; each gets its own return OTP."""
+    _check_batch(codes)
+    codes = [str(code).strip() for code in codes]
+    devices = _resolve(codes, assigned_to=user, status__in=["assigned", "return_pending"])
+
+    results = [None] * len(codes)
+    returning = {}
+    for i, code in enumerate(codes):
+        device = devices.get(code)
+        if device is None:
+            results[i] = _error(code, "Device not found, not assigned to you, or already returned.")
+        elif device.id in returning:
+            results[i] = _error(code, "Scanned twice in this batch.", device)
+        else:
+            returning[device.id] = (i, device)
+
+    if returning:
+        with transaction.atomic():
+            # Replace any older unverified OTPs, exactly like InitiateReturnView
+            ReturnVerification.objects.filter(device__in=returning, verified=False).delete()
+            expires_at = timezone.now() + ReturnVerification.LIFETIME
+            allocate_otps([ReturnVerification(device=device, expires_at=expires_at) for _, device in returning.values()])
+            mark_model_dirty(ReturnVerification)
+
+            _set_status([device for _, device in returning.values()], "return_pending")
+
+    for i, device in returning.values():
+        results[i] = _ok(codes[i], device, "Return initiated. Please ask the Admin for your 6-digit OTP.")
+    return results
+
+
+def batch_verify_return(user, items):
+    """
+    Completes returns: items are {"device_id", "otp_code", "condition" (default "Good")}.
+    Devices in good condition go back to stock, the others to repair.
+    """
+    _check_batch(items)
+    items = [item if isinstance(item, dict) else {} for item in items]
+    codes = [str(item.get('device_id') or '').strip() for item in items]
+    devices = _resolve(codes, assigned_to=user)
+    pending = {
+        (rv.device_id, rv.otp_code): rv
+        for rv in ReturnVerification.objects.filter(device__in=[d.id for d in devices.values()], verified=False)
+    }
+
+    now = timezone.now()
+    results = [None] * len(items)
+    verified = {}
+    for i, (code, item) in enumerate(zip(codes, items)):
+        device = devices.get(code)
+        rv = pending.get((device.id, str(item.get('otp_code') or ''))) if device else None
+        if rv is None:
+            results[i] = _error(code, "Invalid OTP. Please check with the Admin.", device)
+        elif device.id in verified:
+            results[i] = _error(code, "Listed twice in this batch.", device)
+        elif rv.expires_at < now:
+            results[i] = _error(code, "OTP expired. Please initiate return again.", device)
+        else:
+            verified[device.id] = (i, device, rv, str(item.get('condition') or 'Good'))
+
+    if verified:
+        with transaction.atomic():
+            ReturnVerification.objects.filter(id__in=[rv.id for _, _, rv, _ in verified.values()]).update(verified=True)
+            mark_model_dirty(ReturnVerification)
+
+            # One UPDATE per distinct condition (usually just "Good")
+            by_condition = defaultdict(list)
+            for device_id, (_, device, _, condition) in verified.items():
+                by_condition[condition].append(device)
+            for condition, devices in by_condition.items():
+                status = "available" if condition.lower() == "good" else "repair"
+                _set_status(devices, status, condition=condition, assigned_to=None)
+
+            logs = list(AssignmentLog.objects.select_related('device').filter(device__in=verified, status="active"))
+            AssignmentLog.objects.filter(id__in=[log.id for log in logs]).update(status="returned", returned_at=now)
+            release_daily_slots(logs)
+            mark_model_dirty(AssignmentLog)
+
+    for i, device, _, _ in verified.values():
+        results[i] = _ok(codes[i], device, "Return Verified!")
+    return results
@@ -0,0 +1,351 @@
+# core/dashboard.py
+"""
+Precomputed admin dashboard snapshot.
+
+The dashboard payload is split into named sections, each stored as one
+DashboardSection row. Model signals (core/receivers.py) collect the sections a
+write can affect, and once the surrounding transaction commits they are marked
+stale under the next global data version (core/versioning.py). The next read
+(AdminDashboardView, the stream) rebuilds the stale sections; every other read
+only loads the stored rows. A rebuild costs as much as its section is large, so
+it runs once per read that finds the section stale, never once per write.
+
+The device counters (the stats and stock sections) are not rebuilt after a
+device changes status: writes report the moves they make (count_devices), and
+once they commit, the stored counts are adjusted in place. Only a write that
+can't say what it moved (an admin edit of an unloaded row, a new tab type)
+leaves them stale.
+
+A rebuilt section is stamped with the data version it includes, so clients
+holding a version cursor can ask for just the sections that changed since
+(see core/stream.py).
+"""
+import logging
+import threading
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    AdminAuditLog, AssignmentLog, AssignmentOTP, ChangeCounter, DashboardSection,
+    ReturnVerification, TabletDevice, TabType,
+)
+from .versioning import DATA_VERSION, bump_data_version
+
+logger = logging.getLogger(__name__)
+
+
+# --- SECTION BUILDERS ---
+
+def _build_tab_types():
+    return list(TabType.objects.values('id', 'name'))
+
+
+def _build_stock():
+    return list(TabType.objects.annotate(
+        stock_remaining=Count('devices', filter=Q(devices__status='available'))
+    ).values('id', 'name', 'stock_remaining', 'daily_limit_per_user'))
+
+
+def _build_stats():
+    # One aggregate instead of four separate COUNT queries
+    return TabletDevice.objects.aggregate(
+        total=Count('id'),
+        available=Count('id', filter=Q(status='available')),
+        assigned=Count('id', filter=Q(status='assigned')),
+        repair=Count('id', filter=Q(status='repair')),
+    )
+
+
+def _build_active_loans():
+    return list(AssignmentLog.objects.filter(status='active').values(
+        'user__employee_id', 'user__username', 'device__serial_number',
+        'device__tab_type__name', 'issued_at'
+    ).order_by('-issued_at'))
+
+
+def _build_recent_activity():
+    logs = AssignmentLog.objects.values(
+        'user__username', 'device__tab_type__name', 'status', 'notes', 'issued_at', 'returned_at'
+    ).order_by('-issued_at')[:15]
+
+    return [{
+        'user__username': log['user__username'],
+        'tab__name': log['device__tab_type__name'],
+        'action': log['status'],
+        'notes': log['notes'],  # Safely passes null for old logs, and text for new transfers
+        'timestamp': log['issued_at'] if log['status'] == 'active' else log['returned_at']
+    } for log in logs]
+
+
+def _build_audit_trails():
+    return list(AdminAuditLog.objects.order_by('-timestamp')[:20].values(
+        'admin__username', 'action_type', 'description', 'timestamp'
+    ))
+
+
+def _build_pending_returns():
+    # rv_live_device_unique allows one unverified row per device, so this is already
+    # the latest pending OTP of each device; the cost scales with devices pending return
+    pending = list(ReturnVerification.objects.filter(verified=False).values(
+        'device__serial_number', 'device__assigned_to__username', 'device__assigned_to__employee_id',
+        'otp_code', 'created_at'
+    ).order_by('-created_at'))  # Newest first
+
+    for row in pending:
+        row['device__assigned_to__username'] = row['device__assigned_to__username'] or "Unknown"
+        row['device__assigned_to__employee_id'] = row['device__assigned_to__employee_id'] or "Unknown"
+    return pending
+
+
+def _build_active_assignment_otps():
+    # expires_at is kept so expired codes can be hidden at read time without a rebuild
+    return list(AssignmentOTP.objects.filter(
+        is_used=False, expires_at__gt=timezone.now()
+    ).values('otp_code', 'tab_type__name', 'created_at', 'expires_at').order_by('-created_at'))
+
+
+SECTION_BUILDERS = {
+    'tab_types': _build_tab_types,
+    'stock': _build_stock,
+    'stats': _build_stats,
+    'active_loans': _build_active_loans,
+    'recent_activity': _build_recent_activity,
+    'audit_trails': _build_audit_trails,
+    'pending_returns': _build_pending_returns,
+    'active_assignment_otps': _build_active_assignment_otps,
+}
+
+# Which sections a write to each model can change
+SECTIONS_BY_MODEL = {
+    TabType: ('tab_types', 'stock', 'active_loans', 'recent_activity', 'active_assignment_otps'),
+    TabletDevice: ('stock', 'stats', 'active_loans', 'recent_activity', 'pending_returns'),
+    AssignmentLog: ('active_loans', 'recent_activity'),
+    AdminAuditLog: ('audit_trails',),
+    ReturnVerification: ('pending_returns',),
+    AssignmentOTP: ('active_assignment_otps',),
+}
+
+# Sections that display user names; refreshed when a User is edited
+USER_SECTIONS = ('active_loans', 'recent_activity', 'audit_trails', 'pending_returns')
+
+# Device counts, kept up to date from the status moves of the writes (count_devices)
+COUNTER_SECTIONS = ('stats', 'stock')
+# The other sections a device write can change
+DEVICE_LIST_SECTIONS = tuple(name for name in SECTIONS_BY_MODEL[TabletDevice] if name not in COUNTER_SECTIONS)
+
+
+# --- MAINTENANCE ---
+
+# The version of a section whose data has changed since it was built (and of a new row)
+STALE = 0
+
+_pending = threading.local()
+# Sections a failed mark_stale() could not reach; they are added to the next one
+_unmarked = set()
+_unmarked_lock = threading.Lock()
+
+
+def mark_dirty(sections):
+    """
+    Marks the given sections stale once the current transaction commits.
+    Several writes in one transaction share a single mark; outside of a
+    transaction it happens immediately.
+    """
+    pending = getattr(_pending, 'sections', None)
+    if pending is None:
+        pending = _pending.sections = set()
+    pending.update(sections)
+    transaction.on_commit(_flush_pending)
+
+
+def mark_model_dirty(model):
+    """For queryset.update()/bulk_create() writes, which don't send model signals."""
+    mark_dirty(SECTIONS_BY_MODEL[model])
+
+
+def count_devices(moves):
+    """
+    For writes to devices: `moves` are (tab type id, status before, status after)
+    triples, with None before a new device and after a deleted one. Once the
+    current transaction commits, the stored device counts are adjusted by them and
+    the other device sections are marked stale.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        # Already committed, so a rebuild may have counted it: rebuild instead
+        mark_model_dirty(TabletDevice)
+        return
+
+    counts = Counter()
+    for tab_type_id, before, after in moves:
+        if before:
+            counts[str(tab_type_id), before] -= 1
+        if after:
+            counts[str(tab_type_id), after] += 1
+
+    pending = getattr(_pending, 'sections', None)
+    if pending is None:
+        pending = _pending.sections = set()
+    pending.update(DEVICE_LIST_SECTIONS)
+    # The counts travel with the callback, so a rolled back transaction drops them.
+    # Taken before the commit: a section stored before this moment can't include these moves.
+    transaction.on_commit(partial(_flush_pending, counts, timezone.now()))
+
+
+def _flush_pending(counts=None, moved_at=None):
+    sections = getattr(_pending, 'sections', None) or set()
+    if not sections and not counts:
+        return  # Already flushed by an earlier callback of the same transaction
+    _pending.sections = None
+    with _unmarked_lock:
+        sections |= _unmarked
+        _unmarked.clear()
+
+    # A failure here must never turn a committed write into an error response
+    try:
+        mark_stale(sections, counts, moved_at)
+    except Exception:
+        if counts:
+            sections |= set(COUNTER_SECTIONS)  # The moves are lost, so the counts can't be trusted
+        logger.exception("Could not mark dashboard sections %s stale; retrying with the next write", sorted(sections))
+        with _unmarked_lock:
+            _unmarked.update(sections)
+
+
+def mark_stale(sections, counts=None, moved_at=None):
+    """
+    Flags the sections for a rebuild at their next read, under a new data version,
+    and adds the device `counts` of count_devices() to the stored counter sections.
+    A write costs the same whatever the size of the sections it changes, and a burst
+    of writes between two dashboard polls costs a single rebuild.
+    """
+    with transaction.atomic():
+        # The counter first: writers queue on its row before they lock any section
+        version = ChangeCounter.bump(DATA_VERSION)
+        if sections:
+            DashboardSection.objects.filter(name__in=sorted(sections)).update(version=STALE)
+        counts = {key: n for key, n in (counts or {}).items() if n}
+        if counts:
+            _apply_counts(set(COUNTER_SECTIONS) - set(sections), counts, moved_at, version)
+    return version
+
+
+def _apply_counts(names, counts, moved_at, version):
+    now = timezone.now()
+    changed = []
+    for section in DashboardSection.objects.select_for_update().filter(name__in=sorted(names)).exclude(version=STALE):
+        # A section stored after the moves may already include them (a rebuild in between): rebuild it again
+        if section.updated_at < moved_at and COUNTERS[section.name](section.payload, counts):
+            section.version = version
+        else:
+            section.version = STALE
+        section.updated_at = now
+        changed.append(section)
+    DashboardSection.objects.bulk_update(changed, ['payload', 'version', 'updated_at'])
+
+
+def _count_stats(stats, counts):
+    for (_, status), n in counts.items():
+        if status in stats:
+            stats[status] += n
+        stats['total'] += n  # Moves between two statuses add up to 0
+    return True
+
+
+def _count_stock(stock, counts):
+    rows = {row['id']: row for row in stock}
+    for (tab_type_id, status), n in counts.items():
+        if status == 'available':
+            if tab_type_id not in rows:
+                return False  # A type this section doesn't list yet
+            rows[tab_type_id]['stock_remaining'] += n
+    return True
+
+
+COUNTERS = {'stats': _count_stats, 'stock': _count_stock}
+
+
+def refresh_sections(sections=None):
+    """Rebuilds and stores the given sections (all of them by default) now."""
+    sections = sorted(sections or SECTION_BUILDERS)
+    mark_stale(sections)
+    _rebuild_stale(sections)
+
+
+def _rebuild_stale(sections):
+    """Rebuilds those of the given sections that are stale or missing."""
+    for name in sorted(sections):
+        with transaction.atomic():
+            # Locked, so concurrent readers rebuild a section once. A write committed in the
+            # meantime marks it stale again once this rebuild is done.
+            section, _ = DashboardSection.objects.select_for_update().get_or_create(name=name)
+            if section.version != STALE:
+                continue  # Rebuilt by another request while this one waited for the lock
+            # Read before the payload is built: it includes every write up to this version
+            section.version = ChangeCounter.current(DATA_VERSION) or ChangeCounter.bump(DATA_VERSION)
+            section.payload = SECTION_BUILDERS[name]()
+            section.save()
+
+
+# --- READ PATH ---
+
+def get_dashboard_snapshot():
+    """Returns the full dashboard payload from the stored sections, rebuilding the stale ones."""
+    snapshot = {
+        name: payload for name, payload, version in DashboardSection.objects.values_list('name', 'payload', 'version')
+        if version != STALE
+    }
+
+    stale = set(SECTION_BUILDERS) - set(snapshot)
+    if stale:
+        # First read after a write (or after a fresh install/migration): build what is out of date
+        _rebuild_stale(stale)
+        snapshot.update(DashboardSection.objects.filter(name__in=stale).values_list('name', 'payload'))
+
+    snapshot['active_assignment_otps'] = _live_otps(snapshot['active_assignment_otps'])
+    return snapshot
+
+
+def get_dashboard_delta(since=0):
+    """
+    Returns {"version": cursor, "sections": {...}} with only the sections changed
+    after version `since`. A cursor of 0 (or one from before a database reset)
+    returns every section.
+    """
+    # Read the cursor before the data: a section changed in between is sent again, never skipped
+    current = ChangeCounter.current(DATA_VERSION)
+    if since <= 0 or since > current:
+        return {'version': current, 'sections': get_dashboard_snapshot()}
+
+    rows = list(DashboardSection.objects.filter(
+        Q(version__gt=since) | Q(version=STALE)
+    ).values_list('name', 'payload', 'version'))
+    sections = {name: payload for name, payload, version in rows if version != STALE}
+    stale = {name for name, _, version in rows if version == STALE}
+    if stale:
+        _rebuild_stale(stale)
+        sections.update(DashboardSection.objects.filter(name__in=stale).values_list('name', 'payload'))
+
+    if 'active_assignment_otps' in sections:
+        sections['active_assignment_otps'] = _live_otps(sections['active_assignment_otps'])
+    # Not the newest section version: a section rebuilt by another reader since may share it
+    return {'version': current, 'sections': sections}
+
+
+def expired_otp_marker(request=None):
+    """
+    Number of stored assignment OTPs that have expired since the last rebuild.
+    Expiry changes the dashboard response without a write, so it is part of its ETag.
+    """
+    otps = DashboardSection.objects.filter(name='active_assignment_otps').values_list('payload', flat=True).first() or []
+    return len(otps) - len(_live_otps(otps))
+
+
+def _live_otps(otps):
+    # expires_at is passed on so clients can drop codes that expire between deltas
+    now = timezone.now()
+    return [otp for otp in otps if parse_datetime(otp['expires_at']) > now]
@@ -0,0 +1,166 @@
+# core/fleet.py
+"""
+Fleet concurrency over time and the hour-of-week utilisation heatmap.
+
+Loans are fetched as plain (issued, returned) epoch-second pairs computed by the
+database, and never as model instances. They are then swept as sorted arrays:
+
+* mean devices on loan in a bucket = loan-seconds inside it / bucket length.
+  Loan-seconds before t is  sum(t - issued | issued < t) - sum(t - returned | returned < t),
+  i.e. two binary searches and two prefix sums per bucket edge;
+* peak devices on loan in a bucket = the level at its start, raised by every
+  checkout inside it (cumulative sum over the time-ordered +1/-1 events).
+
+This runs vectorized on NumPy (O((loans + buckets) log loans) in C), which is
+in requirements.txt and the PyInstaller bundle. Only when it can't be imported
+(a broken install) does the same algorithm run on Python lists, much more
+slowly; results are identical, and a warning is logged.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate, chain
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedAssignmentLog, AssignmentLog, TabletDevice
+
+try:
+    import numpy as np
+except ImportError:  # Last resort: the pure-Python sweep below
+    np = None
+    logging.getLogger(__name__).warning("NumPy can't be imported: fleet concurrency runs the slow pure-Python sweep")
+
+HOUR = 3600
+DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def _epoch(field):
+    """Seconds since 1970 as computed by the database, so no datetime objects are built per row."""
+    if connection.vendor == 'postgresql':
+        return Func(F(field), template='EXTRACT(EPOCH FROM %(expressions)s)', output_field=FloatField())
+    if connection.vendor == 'sqlite':
+        return Func(F(field), template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)', output_field=FloatField())
+    return Func(F(field), function='UNIX_TIMESTAMP', output_field=FloatField())
+
+
+def _loan_intervals(start, end, tab_type=None):
+    """Flat [issued, returned, issued, returned, ...] epochs of every loan overlapping [start, end)."""
+    end_epoch = min(end, timezone.now()).timestamp()
+    parts = []
+    for model in (AssignmentLog, ArchivedAssignmentLog):
+        loans = model.objects.filter(issued_at__lt=end).filter(Q(returned_at__isnull=True) | Q(returned_at__gt=start))
+        if tab_type is not None:
+            loans = loans.filter(device__tab_type=tab_type)
+        # Open loans run to the end of the range, or to now when the range runs into the future
+        parts.append(loans.order_by().annotate(
+            s=_epoch('issued_at'), r=Coalesce(_epoch('returned_at'), Value(end_epoch), output_field=FloatField())
+        ).values_list('s', 'r').iterator(chunk_size=10000))
+    return chain.from_iterable(chain.from_iterable(parts))
+
+
+def _sweep_numpy(starts, ends, edges):
+    s, r = np.sort(starts), np.sort(ends)
+    prefix_s = np.concatenate(([0.0], np.cumsum(s)))
+    prefix_r = np.concatenate(([0.0], np.cumsum(r)))
+
+    k, j = np.searchsorted(s, edges), np.searchsorted(r, edges)
+    loan_seconds_before = (k * edges - prefix_s[k]) - (j * edges - prefix_r[j])
+    mean = np.diff(loan_seconds_before) / np.diff(edges)
+
+    peak = np.searchsorted(s, edges[:-1], 'right') - np.searchsorted(r, edges[:-1], 'right')
+    times = np.concatenate((r, s))
+    order = np.argsort(times, kind='stable')  # Returns sort before checkouts at the same instant
+    levels = np.cumsum(np.concatenate((-np.ones(len(r)), np.ones(len(s))))[order])
+    times = times[order]
+    inside = (times >= edges[0]) & (times < edges[-1])
+    np.maximum.at(peak, np.searchsorted(edges, times[inside], 'right') - 1, levels[inside].astype(peak.dtype))
+    return mean.tolist(), peak.tolist()
+
+
+def _sweep_python(starts, ends, edges):
+    s, r = sorted(starts), sorted(ends)
+    prefix_s, prefix_r = [0.0, *accumulate(s)], [0.0, *accumulate(r)]
+
+    def loan_seconds_before(t):
+        k, j = bisect_left(s, t), bisect_left(r, t)
+        return (k * t - prefix_s[k]) - (j * t - prefix_r[j])
+
+    before = [loan_seconds_before(t) for t in edges]
+    mean = [(b - a) / (t1 - t0) for a, b, t0, t1 in zip(before, before[1:], edges, edges[1:])]
+
+    peak = [bisect_right(s, t) - bisect_right(r, t) for t in edges[:-1]]
+    level = 0
+    for t, delta in sorted(chain(((t, -1) for t in r), ((t, 1) for t in s))):
+        level += delta
+        if edges[0] <= t < edges[-1]:
+            bucket = bisect_right(edges, t) - 1
+            peak[bucket] = max(peak[bucket], level)
+    return mean, peak
+
+
+def fleet_concurrency(date_from, date_to, tab_type=None, bucket='hour'):
+    """
+    Devices on loan between local days date_from and date_to (inclusive).
+    Returns the timeline (per `bucket`: 'hour' or 'day') and the hour-of-week heatmap.
+    """
+    start = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    origin = start.timestamp()
+
+    # Times relative to the range start, clamped to it, keep the prefix sums small and exact
+    flat = _loan_intervals(start, end, tab_type)
+    span = end.timestamp() - origin
+    # The last hour is short or long on DST change days
+    hour_edges = [float(h * HOUR) for h in range(int(span // HOUR))] + [span]
+    if bucket == 'day':
+        days = (date_to - date_from).days + 1
+        edges = [timezone.make_aware(datetime.combine(date_from + timedelta(days=d), datetime.min.time())).timestamp() - origin
+                 for d in range(days + 1)]
+    else:
+        edges = hour_edges
+
+    if np is not None:
+        pairs = np.clip(np.fromiter(flat, dtype=float).reshape(-1, 2) - origin, 0.0, span)
+        sweep = _sweep_numpy
+        starts, ends = pairs[:, 0], pairs[:, 1]
+        edges_in, hour_edges_in = np.array(edges), np.array(hour_edges)
+    else:
+        values = [min(max(value - origin, 0.0), span) for value in flat]
+        sweep = _sweep_python
+        starts, ends = values[0::2], values[1::2]
+        edges_in, hour_edges_in = edges, hour_edges
+
+    mean, peak = sweep(starts, ends, edges_in)
+    hourly_mean = mean if bucket == 'hour' else sweep(starts, ends, hour_edges_in)[0]
+
+    # Hour-of-week heatmap: average of every hourly bucket that falls on that local weekday/hour
+    tz = timezone.get_current_timezone()
+    totals, counts = [[0.0] * 24 for _ in range(7)], [[0] * 24 for _ in range(7)]
+    for edge, value in zip(hour_edges, hourly_mean):
+        local = datetime.fromtimestamp(origin + edge, tz=tz)
+        totals[local.weekday()][local.hour] += value
+        counts[local.weekday()][local.hour] += 1
+    heatmap = [[total / count if count else None for total, count in zip(*row)] for row in zip(totals, counts)]
+
+    devices = TabletDevice.objects.all() if tab_type is None else TabletDevice.objects.filter(tab_type=tab_type)
+    fleet_size = devices.count()
+
+    return {
+        'engine': 'numpy' if np is not None else 'python',
+        'fleet_size': fleet_size,
+        'bucket': bucket,
+        'timeline': [{
+            'start': datetime.fromtimestamp(origin + edge, tz=tz),
+            'mean_on_loan': round(value, 3),
+            'peak_on_loan': int(top),
+        } for edge, value, top in zip(edges, mean, peak)],
+        'heatmap': {
+            'days': DAY_NAMES,
+            'mean_on_loan': [[round(v, 3) if v is not None else None for v in row] for row in heatmap],
+            'utilisation': [[round(v / fleet_size, 4) if v is not None and fleet_size else None for v in row] for row in heatmap],
+        },
+    }
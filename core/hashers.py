@@ -0,0 +1,43 @@
+# core/hashers.py
+"""
+Password hashing for the login pool (core/login.py).
+
+This module runs inside the pool's worker processes, so it imports no models:
+a fresh process only needs the settings to hash.
+"""
+import os
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the iteration count of settings.PASSWORD_HASH_ITERATIONS
+    (Django's default when 0). A hash made with another count is redone at the next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+def init_worker():
+    """ProcessPoolExecutor initializer: sets up Django in a new worker process."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tab_audit_system.settings')
+    django.setup()
+
+
+def check_password(password, encoded):
+    """
+    Returns (correct, new encoded hash or None). The new hash is made when the
+    stored one uses an old hasher or cost, so the caller only has to save it.
+    """
+    upgraded = []
+    correct = hashers.check_password(password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw)))
+    return correct, (upgraded[0] if upgraded else None)
+
+
+def make_password(password):
+    return hashers.make_password(password)
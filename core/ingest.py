@@ -0,0 +1,148 @@
+# core/ingest.py
+"""
+Bulk device onboarding for new shipments.
+
+Rows come as CSV (header: serial_number, qr_code, tab_type[, condition]) or as a
+JSON list of objects with the same keys. qr_code is optional and defaults to
+"QR-<serial>". tab_type is the TabType name.
+
+Validation is set-based: one query per chunk of serials / QR codes, one for the
+tab types. Every valid row is then inserted with batched bulk_create in a single
+transaction. Invalid rows are reported with their row number and skipped; they
+never abort the rest of the batch.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+
+from .dashboard import count_devices, mark_model_dirty
+from .models import AdminAuditLog, TabletDevice, TabType
+
+BATCH_SIZE = 500
+MAX_ROWS = 20000
+
+SERIAL_MAX_LENGTH = TabletDevice._meta.get_field('serial_number').max_length
+QR_MAX_LENGTH = TabletDevice._meta.get_field('qr_code').max_length
+CONDITION_MAX_LENGTH = TabletDevice._meta.get_field('condition').max_length
+
+
+def parse_csv(text):
+    """Returns [(row_number, row), ...]; row numbers are file line numbers."""
+    reader = csv.DictReader(io.StringIO(text))
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    return [(reader.line_num, row) for row in reader]
+
+
+def parse_json(data):
+    """Accepts a JSON string or an already decoded list. Row numbers start at 1."""
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of device objects.")
+    return [(number, row if isinstance(row, dict) else {}) for number, row in enumerate(data, start=1)]
+
+
+def ingest_devices(rows, admin=None, create_types=False, source="API"):
+    """
+    Validates and inserts [(row_number, row), ...].
+
+    create_types: create TabTypes whose name is not known yet instead of rejecting the rows.
+    Returns {"created": int, "tab_types_created": [...], "errors": [{"row", "serial_number", "error"}]}.
+    """
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"A single import is limited to {MAX_ROWS} rows.")
+
+    errors = []
+    candidates = []
+    seen_serials, seen_qr_codes = set(), set()
+
+    # 1. Per-row checks, including duplicates inside the batch itself
+    for number, row in rows:
+        serial = str(row.get('serial_number') or '').strip()
+        qr_code = str(row.get('qr_code') or '').strip() or f"QR-{serial}"
+        type_name = str(row.get('tab_type') or '').strip()
+        condition = str(row.get('condition') or '').strip()
+
+        if not serial or not type_name:
+            error = "serial_number and tab_type are required."
+        elif len(serial) > SERIAL_MAX_LENGTH or len(qr_code) > QR_MAX_LENGTH or len(condition) > CONDITION_MAX_LENGTH:
+            error = "serial_number, qr_code or condition is too long."
+        elif serial in seen_serials:
+            error = f"Duplicate serial number '{serial}' in this import."
+        elif qr_code in seen_qr_codes:
+            error = f"Duplicate QR code '{qr_code}' in this import."
+        else:
+            error = None
+
+        if error:
+            errors.append({"row": number, "serial_number": serial, "error": error})
+            continue
+        seen_serials.add(serial)
+        seen_qr_codes.add(qr_code)
+        candidates.append((number, serial, qr_code, type_name, condition))
+
+    # 2. Set-based checks against the existing rows
+    existing_serials = _existing('serial_number', seen_serials)
+    existing_qr_codes = _existing('qr_code', seen_qr_codes)
+    tab_types = {}
+    for tab_type in TabType.objects.filter(name__in={c[3] for c in candidates}).order_by('created_at'):
+        tab_types.setdefault(tab_type.name, tab_type)
+
+    missing_types = sorted({c[3] for c in candidates} - set(tab_types))
+
+    with transaction.atomic():
+        if create_types and missing_types:
+            new_types = [TabType(name=name) for name in missing_types]
+            TabType.objects.bulk_create(new_types)
+            tab_types.update((tab_type.name, tab_type) for tab_type in new_types)
+            mark_model_dirty(TabType)
+
+        devices = []
+        for number, serial, qr_code, type_name, condition in candidates:
+            if serial in existing_serials:
+                error = f"Serial number '{serial}' is already registered."
+            elif qr_code in existing_qr_codes:
+                error = f"QR code '{qr_code}' is already registered."
+            elif type_name not in tab_types:
+                error = f"Unknown tab type '{type_name}'."
+            else:
+                devices.append(TabletDevice(
+                    tab_type=tab_types[type_name], serial_number=serial, qr_code=qr_code, condition=condition
+                ))
+                continue
+            errors.append({"row": number, "serial_number": serial, "error": error})
+
+        # 3. Insert and leave one audit entry for the whole batch
+        if devices:
+            TabletDevice.objects.bulk_create(devices, batch_size=BATCH_SIZE)
+            count_devices([(device.tab_type_id, None, device.status) for device in devices])
+
+            per_type = {}
+            for device in devices:
+                per_type[device.tab_type.name] = per_type.get(device.tab_type.name, 0) + 1
+            breakdown = ", ".join(f"{count} x {name}" for name, count in sorted(per_type.items()))
+            AdminAuditLog.objects.create(
+                admin=admin,
+                action_type="Inventory Update",
+                description=f"Bulk import ({source}): added {len(devices)} devices ({breakdown}); {len(errors)} rows rejected."
+            )
+
+    errors.sort(key=lambda error: error['row'])
+    return {
+        "created": len(devices),
+        "tab_types_created": missing_types if create_types else [],
+        "errors": errors,
+    }
+
+
+def _existing(field, values):
+    """Values of `field` that are already taken, looked up in chunks (SQLite caps query parameters)."""
+    values = list(values)
+    taken = set()
+    for start in range(0, len(values), BATCH_SIZE):
+        taken.update(TabletDevice.objects.filter(
+            **{f'{field}__in': values[start:start + BATCH_SIZE]}
+        ).values_list(field, flat=True))
+    return taken
@@ -0,0 +1,99 @@
+# core/limits.py
+"""
+Daily-limit bookkeeping for TabType.daily_limit_per_user.
+
+DailyUsage keeps one counter row per (user, tab type, local day). A checkout
+reserves a slot with a single conditional UPDATE, which checks the limit and
+increments the counter in one statement. That makes it safe under concurrent
+checkouts, and it is rolled back with the surrounding assignment transaction.
+Returned and transferred loans give their slot back, so only loans that are
+still open count against the limit.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DailyUsage
+
+MAX_RETRIES = 5
+
+
+def reserve_daily_slot(user, tab_type):
+    """
+    Counts a new loan against today's limit. Returns False (and changes nothing)
+    if the user already reached the limit. Call inside the assignment transaction.
+    """
+    limit = tab_type.daily_limit_per_user
+    day = timezone.localdate()
+
+    if DailyUsage.objects.filter(user=user, tab_type=tab_type, day=day, count__lt=limit).update(count=F('count') + 1):
+        return True
+    if limit <= 0:
+        return False
+
+    # No row yet for today, or the row is at the limit
+    try:
+        with transaction.atomic():
+            DailyUsage.objects.create(user=user, tab_type=tab_type, day=day, count=1)
+        return True
+    except IntegrityError:
+        # The row exists (possibly created concurrently): retry the conditional increment once
+        return bool(DailyUsage.objects.filter(
+            user=user, tab_type=tab_type, day=day, count__lt=limit
+        ).update(count=F('count') + 1))
+
+
+def reserve_daily_slots(user, tab_type, wanted):
+    """
+    Batch form of reserve_daily_slot: reserves up to `wanted` slots at once and
+    returns how many were granted (0..wanted). Call inside the batch transaction.
+    """
+    limit = tab_type.daily_limit_per_user
+    day = timezone.localdate()
+    usage = DailyUsage.objects.filter(user=user, tab_type=tab_type, day=day)
+
+    for _ in range(MAX_RETRIES):
+        current = usage.values_list('count', flat=True).first()
+        granted = min(wanted, max(limit - (current or 0), 0))
+        if granted == 0:
+            return 0
+
+        if current is None:
+            try:
+                with transaction.atomic():
+                    DailyUsage.objects.create(user=user, tab_type=tab_type, day=day, count=granted)
+                return granted
+            except IntegrityError:
+                continue  # Created concurrently: read it again
+        # Compare-and-set: only applies if no concurrent checkout moved the counter since the read
+        elif usage.filter(count=current).update(count=current + granted):
+            return granted
+    return 0
+
+
+def release_daily_slot(log):
+    """Gives back the slot of a loan that is being closed (returned, transferred or force-returned)."""
+    _give_back(log.user_id, log.device.tab_type_id, timezone.localdate(log.issued_at), 1)
+
+
+def release_daily_slots(logs):
+    """Batch form of release_daily_slot: one UPDATE per (user, tab type, day)."""
+    groups = Counter(
+        (log.user_id, log.device.tab_type_id, timezone.localdate(log.issued_at)) for log in logs
+    )
+    for (user_id, tab_type_id, day), count in groups.items():
+        _give_back(user_id, tab_type_id, day, count)
+
+
+def unreserve_daily_slots(user, tab_type, count):
+    """Undoes today's reservations for checkouts that failed after reserve_daily_slots()."""
+    _give_back(user.id, tab_type.id, timezone.localdate(), count)
+
+
+def _give_back(user_id, tab_type_id, day, count):
+    DailyUsage.objects.filter(
+        user_id=user_id, tab_type_id=tab_type_id, day=day, count__gt=0,
+    ).update(count=Greatest(F('count') - count, 0))
@@ -0,0 +1,121 @@
+# core/login.py
+"""
+Login pipeline for shift changes, when hundreds of employees log in within minutes.
+
+A login is one slow password hash (PBKDF2). Run on the request threads, a
+burst of logins holds every server thread and CPU, and all other endpoints
+wait behind it. Here:
+
+- PooledModelBackend does the hashing in a pool of LOGIN_HASH_WORKERS
+  processes, which run on every core without holding the server's GIL. A
+  stored hash with an outdated cost (PASSWORD_HASH_ITERATIONS, see
+  core/hashers.py) is redone in the pool and saved.
+- login_slot() admits at most LOGIN_MAX_PENDING logins per server process.
+  MyTokenObtainPairView answers the rest at once with 429 and a Retry-After
+  that spaces their retries out at the rate logins get through.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashers
+
+
+class LoginBusy(Exception):
+    """LOGIN_MAX_PENDING logins are already in progress in this process."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after  # Seconds
+
+
+_slots = threading.BoundedSemaphore(settings.LOGIN_MAX_PENDING)
+_turns_lock = threading.Lock()
+_login_seconds = 0.5  # Moving average of an admitted login's duration
+_next_turn = 0.0      # When the last rejected login was told to come back (time.monotonic())
+
+
+@contextmanager
+def login_slot():
+    """Admission control for the token view: raises LoginBusy rather than waiting for a slot."""
+    global _login_seconds
+    if not _slots.acquire(blocking=False):
+        raise LoginBusy(_retry_after())
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _slots.release()
+        with _turns_lock:
+            _login_seconds = 0.8 * _login_seconds + 0.2 * (time.monotonic() - start)
+
+
+def _retry_after():
+    # Gives each rejected login the next free turn, so the retries of a burst come back
+    # spread out rather than all at once. Turns are handed out at twice the rate logins
+    # get through: a client back too early only costs another cheap 429, but one back
+    # too late leaves a slot idle.
+    global _next_turn
+    with _turns_lock:
+        now = time.monotonic()
+        _next_turn = max(_next_turn, now) + _login_seconds / settings.LOGIN_MAX_PENDING / 2
+        return max(1, round(_next_turn - now))
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # Created on first use in each process: a pool inherited through fork (gunicorn
+    # workers) would belong to the parent
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: the workers start clean, without copies of this process's threads and DB connections
+            _pool = ProcessPoolExecutor(
+                settings.LOGIN_HASH_WORKERS, mp_context=get_context('spawn'), initializer=hashers.init_worker,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def run_hasher(func, *args):
+    """Runs a core.hashers function in the pool (on this thread with LOGIN_HASH_WORKERS = 0)."""
+    if settings.LOGIN_HASH_WORKERS <= 0:
+        return func(*args)
+    return _get_pool().submit(func, *args).result()
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend with the password hashing done by run_hasher()."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so an unknown employee ID takes as long as a wrong password (as ModelBackend does)
+            run_hasher(hashers.make_password, password)
+            return None
+
+        correct, upgraded = run_hasher(hashers.check_password, password, user.password)
+        if not correct:
+            return None
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
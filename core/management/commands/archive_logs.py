@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import ARCHIVE_AFTER_DAYS, BATCH_SIZE, archive_logs
+
+
+class Command(BaseCommand):
+    help = 'Moves closed assignment logs older than N days to the archive table (see core/archive.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS, help='Archive loans that ended this long ago')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        moved = archive_logs(older_than_days=options['older_than_days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} assignment logs."))
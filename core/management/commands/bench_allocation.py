@@ -0,0 +1,81 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from core.allocation import claim_any_device
+from core.models import TabletDevice, TabType, User
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent device allocation (core.allocation) and checks that no device is handed out twice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=1000, help='Devices in the benchmark pool')
+        parser.add_argument('--concurrency', default='1,2,4,8,16', help='Comma-separated worker counts to measure')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        device_count = options['devices']
+
+        self.stdout.write(f"Database: {connection.vendor}, pool of {device_count} devices")
+
+        # Throwaway fixtures (bulk_create: no dashboard update per row)
+        tag = uuid.uuid4().hex[:8]
+        tab_type = TabType.objects.create(name=f"Benchmark {tag}", daily_limit_per_user=device_count)
+        user = User(username=f"bench-{tag}", employee_id=f"BENCH-{tag}", email=f"bench-{tag}@example.com")
+        User.objects.bulk_create([user])
+        TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=tab_type, serial_number=f"BENCH-{tag}-{i}", qr_code=f"QR-BENCH-{tag}-{i}")
+            for i in range(device_count)
+        ], batch_size=500)
+
+        try:
+            self.stdout.write(f"{'workers':>8} {'claims':>8} {'seconds':>8} {'claims/s':>10} {'errors':>7}")
+            for workers in levels:
+                claims, seconds, errors = self._run(tab_type, user, workers)
+
+                # Every claim must be a distinct device, and the table must agree
+                if len(claims) != len(set(claims)):
+                    raise CommandError(f"Double assignment with {workers} workers!")
+                assigned = TabletDevice.objects.filter(tab_type=tab_type, status='assigned').count()
+                if assigned != len(claims):
+                    raise CommandError(f"{assigned} devices assigned but {len(claims)} claims reported with {workers} workers!")
+
+                self.stdout.write(f"{workers:>8} {len(claims):>8} {seconds:>8.2f} {len(claims) / seconds:>10.0f} {errors:>7}")
+        finally:
+            with transaction.atomic():
+                TabletDevice.objects.filter(tab_type=tab_type).delete()
+                tab_type.delete()
+                user.delete()
+
+        self.stdout.write(self.style.SUCCESS("No device was assigned twice."))
+
+    def _run(self, tab_type, user, workers):
+        TabletDevice.objects.filter(tab_type=tab_type).update(status='available', assigned_to=None, assigned_at=None)
+
+        def worker(_):
+            claimed, errors = [], 0
+            try:
+                while True:
+                    try:
+                        with transaction.atomic():
+                            device = claim_any_device(tab_type, user)
+                    except OperationalError:
+                        errors += 1  # e.g. SQLite "database is locked"; retry
+                        continue
+                    if device is None:
+                        return claimed, errors
+                    claimed.append(device.id)
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(worker, range(workers)))
+        seconds = time.perf_counter() - start
+
+        claims = [device_id for claimed, _ in results for device_id in claimed]
+        return claims, seconds, sum(errors for _, errors in results)
@@ -0,0 +1,164 @@
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User
+
+from .bench_serving import _percentile, _wait_until_up
+
+PASSWORD = 'shift-change-123'
+
+MODES = {
+    # Hashing on the request threads, no admission control: how logins used to run
+    'inline': {'TAB_AUDIT_LOGIN_WORKERS': '0', 'TAB_AUDIT_LOGIN_MAX_PENDING': '100000'},
+    # core/login.py as configured in settings.py
+    'pooled': {},
+}
+
+
+class Command(BaseCommand):
+    help = 'Simulates a shift-change login burst against a waitress server and measures logins and other requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='inline,pooled', help='Comma-separated: inline, pooled')
+        parser.add_argument('--users', type=int, default=500, help='Employees logging in')
+        parser.add_argument('--spread', type=float, default=10, help='Seconds over which the logins arrive')
+        parser.add_argument('--readers', type=int, default=8, help='Logged-in clients polling their possession meanwhile')
+        parser.add_argument('--iterations', type=int, default=100000,
+                            help="PBKDF2 iterations of the test passwords (0: the server's configured cost)")
+        parser.add_argument('--threads', type=int, default=6, help='waitress threads')
+        parser.add_argument('--port', type=int, default=8766)
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(
+            f"Database: {connection.vendor}; {options['users']} logins over {options['spread']:.0f}s, "
+            f"{options['readers']} readers; {options['threads']} threads, {os.cpu_count()} CPUs"
+        )
+
+        # Throwaway fixtures. One hash for everyone, one INSERT for all the users.
+        tag = uuid.uuid4().hex[:8]
+        with override_settings(PASSWORD_HASH_ITERATIONS=options['iterations']):
+            password = make_password(PASSWORD)
+        users = [
+            User(username=f"bench-{tag}-{i}", employee_id=f"BENCH-{tag}-{i}", email=f"bench-{tag}-{i}@example.com", password=password)
+            for i in range(options['users'] + options['readers'])
+        ]
+        User.objects.bulk_create(users, batch_size=500)
+
+        try:
+            reader_tokens = [str(RefreshToken.for_user(user).access_token) for user in users[options['users']:]]
+            self.stdout.write(
+                f"{'mode':>7} {'class':>6} {'done':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'429s':>6} {'errors':>7}"
+            )
+            for mode in modes:
+                # The stored hashes use the benchmark's cost; keep the server from rehashing them
+                env = dict(os.environ, **MODES[mode], TAB_AUDIT_PASSWORD_ITERATIONS=str(options['iterations']))
+                results = self._run(env, users[:options['users']], reader_tokens, options)
+                for kind in ('login', 'read'):
+                    latencies, rejected, errors = results[kind]
+                    self.stdout.write(
+                        f"{mode:>7} {kind:>6} {len(latencies):>6} {_percentile(latencies, 0.50):>8.0f} "
+                        f"{_percentile(latencies, 0.99):>8.0f} {max(latencies, default=0):>8.0f} {rejected:>6} {errors:>7}"
+                    )
+        finally:
+            with transaction.atomic():
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def _run(self, env, users, reader_tokens, options):
+        port = options['port']
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'waitress', f'--listen=127.0.0.1:{port}', f"--threads={options['threads']}",
+             'tab_audit_system.wsgi:application'],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_up(port, process)
+            results = {'login': ([], 0, 0), 'read': ([], 0, 0)}
+            lock = threading.Lock()
+            done = threading.Event()
+
+            def record(kind, latencies, rejected, errors):
+                with lock:
+                    total, total_rejected, total_errors = results[kind]
+                    results[kind] = (total + latencies, total_rejected + rejected, total_errors + errors)
+
+            def employee(user, delay):
+                # Arrives at a random moment of the burst; follows Retry-After on 429.
+                # Login latency is from the first attempt to the tokens.
+                time.sleep(delay)
+                body = json.dumps({'employee_id': user.employee_id, 'password': PASSWORD})
+                start, rejected = time.perf_counter(), 0
+                while True:
+                    status, headers = _request(port, 'POST', '/api/token/', body)
+                    if status == 429:
+                        rejected += 1
+                        # Retry-After is whole seconds: like a browser would, don't all come back on the second
+                        time.sleep(int(headers.get('Retry-After', 1)) + random.random())
+                        continue
+                    latency = (time.perf_counter() - start) * 1000
+                    record('login', [latency] if status == 200 else [], rejected, 0 if status == 200 else 1)
+                    return
+
+            def reader(token):
+                latencies, errors = [], 0
+                while not done.is_set():
+                    start = time.perf_counter()
+                    status, _ = _request(port, 'GET', '/api/possession/', None, token)
+                    if status == 200:
+                        latencies.append((time.perf_counter() - start) * 1000)
+                    else:
+                        errors += 1
+                    time.sleep(1)
+                record('read', latencies, 0, errors)
+
+            employees = [
+                threading.Thread(target=employee, args=(user, random.uniform(0, options['spread'])))
+                for user in users
+            ]
+            readers = [threading.Thread(target=reader, args=(token,)) for token in reader_tokens]
+            for thread in readers + employees:
+                thread.start()
+            for thread in employees:
+                thread.join()
+            done.set()
+            for thread in readers:
+                thread.join()
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def _request(port, method, path, body, token=None):
+    """One request on a new connection. Returns (status, headers); status 0 when the connection failed."""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status, response.headers
+    except (OSError, http.client.HTTPException):
+        return 0, {}
+    finally:
+        conn.close()
@@ -0,0 +1,200 @@
+import http.client
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import AssignmentLog, TabletDevice, TabType, User
+
+SERVERS = {
+    # The deployment (production_server.py) and the experimental async mode (asgi_server.py)
+    'waitress': lambda port, threads: [
+        sys.executable, '-m', 'waitress', f'--listen=127.0.0.1:{port}', f'--threads={threads}',
+        'tab_audit_system.wsgi:application',
+    ],
+    'asgi': lambda port, threads: [
+        sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port),
+        '--lifespan', 'off', '--no-access-log', 'tab_audit_system.asgi:application',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares request latency of the waitress (WSGI) and ASGI servers under a mixed read/write/export load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='waitress,asgi', help='Comma-separated: waitress, asgi')
+        parser.add_argument('--seconds', type=float, default=20, help='Load duration per server')
+        parser.add_argument('--readers', type=int, default=24, help='Clients polling possession/history/dashboard/logs')
+        parser.add_argument('--writers', type=int, default=4, help='Clients generating assignment OTPs')
+        parser.add_argument('--exporters', type=int, default=6, help='Clients downloading the full CSV export')
+        parser.add_argument('--pause', type=float, default=0.5, help='Seconds between requests of a reader or writer')
+        parser.add_argument('--history', type=int, default=5000, help='Closed loans created for the exports to read')
+        parser.add_argument('--threads', type=int, default=6, help='waitress threads / ASGI sync pool threads')
+        parser.add_argument('--read-threads', type=int, default=4, help='ASGI read pool threads')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(',')
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown server(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(
+            f"Database: {connection.vendor}; {options['readers']} readers, {options['writers']} writers, "
+            f"{options['exporters']} exporters for {options['seconds']:.0f}s; {options['threads']} threads, "
+            f"{options['read_threads']} ASGI read threads"
+        )
+
+        # Throwaway fixtures (bulk_create: no dashboard update per row)
+        tag = uuid.uuid4().hex[:8]
+        tab_type = TabType.objects.create(name=f"Benchmark {tag}", daily_limit_per_user=1000)
+        admin = User(username=f"bench-admin-{tag}", employee_id=f"BENCH-A-{tag}", email=f"bench-a-{tag}@example.com", is_staff=True)
+        users = [
+            User(username=f"bench-{tag}-{i}", employee_id=f"BENCH-{tag}-{i}", email=f"bench-{tag}-{i}@example.com")
+            for i in range(max(options['readers'], 1))
+        ]
+        User.objects.bulk_create([admin, *users])
+        devices = TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=tab_type, serial_number=f"BENCH-{tag}-{i}", qr_code=f"QR-BENCH-{tag}-{i}")
+            for i in range(100)
+        ])
+        AssignmentLog.objects.bulk_create([
+            AssignmentLog(
+                user=users[i % len(users)], device=devices[i % len(devices)], status='returned',
+                returned_at=timezone.now(), ip_address='127.0.0.1', device_info='bench_serving',
+            ) for i in range(options['history'])
+        ], batch_size=500)
+
+        try:
+            admin_token = str(RefreshToken.for_user(admin).access_token)
+            user_tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+            # shed: 503 from PriorityAdmissionMiddleware, not in the latencies
+            self.stdout.write(
+                f"{'server':>9} {'class':>7} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+                f"{'shed':>6} {'errors':>7}"
+            )
+            for server in servers:
+                results = self._run(server, tab_type, admin_token, user_tokens, options)
+                for kind in ('read', 'write', 'export'):
+                    latencies, shed, errors = results[kind]
+                    if latencies or shed or errors:
+                        self.stdout.write(
+                            f"{server:>9} {kind:>7} {len(latencies):>9} {_percentile(latencies, 0.50):>8.1f} "
+                            f"{_percentile(latencies, 0.99):>8.1f} {max(latencies, default=0):>8.1f} {shed:>6} {errors:>7}"
+                        )
+        finally:
+            with transaction.atomic():
+                AssignmentLog.objects.filter(device__tab_type=tab_type).delete()
+                User.objects.filter(id__in=[admin.id, *(user.id for user in users)]).delete()
+                TabletDevice.objects.filter(tab_type=tab_type).delete()
+                tab_type.delete()
+
+    def _run(self, server, tab_type, admin_token, user_tokens, options):
+        port, deadline_seconds = options['port'], options['seconds']
+        env = dict(
+            os.environ, TAB_AUDIT_SYNC_THREADS=str(options['threads']), TAB_AUDIT_READ_THREADS=str(options['read_threads']),
+        )
+        process = subprocess.Popen(
+            SERVERS[server](port, options['threads']), env=env, cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_up(port, process)
+
+            read_paths = [
+                ('/api/possession/', None), ('/api/user/history/', None),
+                ('/api/admin/dashboard/', admin_token), ('/api/logs/?limit=50', admin_token),
+            ]
+            otp_body = json.dumps({'tab_type_id': str(tab_type.id)})
+
+            def reader(i):
+                path, token = read_paths[i % len(read_paths)]
+                return 'GET', path, token or user_tokens[i % len(user_tokens)], None
+
+            clients = (
+                [('read', lambda n, i=i: reader(i + n)) for i in range(options['readers'])]
+                + [('write', lambda n: ('POST', '/api/assign/generate-otp/', admin_token, otp_body))] * options['writers']
+                + [('export', lambda n: ('GET', '/api/admin/export-csv/', admin_token, None))] * options['exporters']
+            )
+            results = {kind: ([], 0, 0) for kind in ('read', 'write', 'export')}
+            lock = threading.Lock()
+            deadline = time.monotonic() + deadline_seconds
+
+            def client(kind, next_request):
+                # Exporters ask back to back: the slow requests that used to take every thread
+                latencies, shed, errors = _load(port, next_request, deadline, 0 if kind == 'export' else options['pause'])
+                with lock:
+                    done, turned_away, failed = results[kind]
+                    results[kind] = (done + latencies, turned_away + shed, failed + errors)
+
+            threads = [threading.Thread(target=client, args=spec) for spec in clients]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def _wait_until_up(port, process, timeout=30):
+    give_up = time.monotonic() + timeout
+    while time.monotonic() < give_up:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError("Server did not start")
+
+
+def _load(port, next_request, deadline, pause):
+    """One client on a keep-alive connection. Returns (latencies in ms, requests shed, errors)."""
+    latencies, shed, errors, n = [], 0, 0, 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    while time.monotonic() < deadline:
+        method, path, token, body = next_request(n)
+        n += 1
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            continue
+        if response.status == 503:
+            shed += 1
+        elif response.status >= 500:
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(pause)
+    conn.close()
+    return latencies, shed, errors
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[math.ceil(fraction * len(values)) - 1]
@@ -0,0 +1,179 @@
+import logging
+import math
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import AssignmentLog, ReturnVerification, TabletDevice, TabType, User
+
+
+class Command(BaseCommand):
+    help = ('Runs a mixed read/write load in-process against SQLite: with its default settings (baseline), '
+            'with the profile of settings.py (wal), and with that profile plus write serialization (tuned)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='baseline,wal,tuned', help='Comma-separated: baseline, wal, tuned')
+        parser.add_argument('--seconds', type=float, default=15, help='Load duration per profile')
+        parser.add_argument('--readers', type=int, default=8, help='Threads polling possession/history/dashboard/logs')
+        parser.add_argument('--writers', type=int, default=4, help='Threads looping assign -> initiate return -> verify return')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds between the requests of a reader')
+        parser.add_argument('--history', type=int, default=2000, help='Closed loans created for the reads')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"This benchmark is for SQLite; the database is {connection.vendor}")
+        if connection.is_in_memory_db():
+            raise CommandError("Run it against a database file (DATABASE_URL=sqlite:///...)")
+        profiles = options['profiles'].split(',')
+        unknown = set(profiles) - {'baseline', 'wal', 'tuned'}
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+
+        # Failed requests are counted below; their tracebacks would drown the report
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        # Throwaway fixtures (bulk_create: no dashboard update per row)
+        tag = uuid.uuid4().hex[:8]
+        tab_type = TabType.objects.create(name=f"Benchmark {tag}", daily_limit_per_user=100000)
+        admin = User(username=f"bench-admin-{tag}", employee_id=f"BENCH-A-{tag}", email=f"bench-a-{tag}@example.com", is_staff=True)
+        users = [
+            User(username=f"bench-{tag}-{i}", employee_id=f"BENCH-{tag}-{i}", email=f"bench-{tag}-{i}@example.com")
+            for i in range(max(options['readers'], options['writers'], 1))
+        ]
+        User.objects.bulk_create([admin, *users])
+        devices = TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=tab_type, serial_number=f"BENCH-{tag}-{i}", qr_code=f"QR-BENCH-{tag}-{i}")
+            for i in range(len(users))
+        ])
+        AssignmentLog.objects.bulk_create([
+            AssignmentLog(
+                user=users[i % len(users)], device=devices[i % len(devices)], status='returned',
+                returned_at=timezone.now(), ip_address='127.0.0.1', device_info='bench_sqlite',
+            ) for i in range(options['history'])
+        ], batch_size=500)
+
+        db = connection.settings_dict  # Shared by the connections of every thread
+        original = {'OPTIONS': dict(db['OPTIONS']), 'CONN_MAX_AGE': db['CONN_MAX_AGE']}
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers for {options['seconds']:.0f}s per profile"
+        )
+        self.stdout.write(
+            f"{'profile':>9} {'reads/s':>8} {'writes/s':>9} {'write p50':>10} {'write p99':>10} {'errors':>7}"
+        )
+        try:
+            admin_token = str(RefreshToken.for_user(admin).access_token)
+            user_tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+            for profile in profiles:
+                if profile == 'baseline':
+                    # SQLite's and Django's defaults: rollback journal, deferred transactions, 5s timeout
+                    self._configure(db, options={}, conn_max_age=0, journal_mode='DELETE')
+                else:
+                    self._configure(db, options=original['OPTIONS'], conn_max_age=original['CONN_MAX_AGE'], journal_mode='WAL')
+                with override_settings(SQLITE_SERIALIZE_WRITES=(profile == 'tuned')):
+                    reads, writes, latencies, errors = self._run(devices, admin_token, user_tokens, options)
+                seconds = options['seconds']
+                self.stdout.write(
+                    f"{profile:>9} {reads / seconds:>8.0f} {writes / seconds:>9.1f} {_percentile(latencies, 0.50):>10.1f} "
+                    f"{_percentile(latencies, 0.99):>10.1f} {errors:>7}"
+                )
+        finally:
+            self._configure(db, options=original['OPTIONS'], conn_max_age=original['CONN_MAX_AGE'], journal_mode='WAL')
+            with transaction.atomic():
+                TabletDevice.objects.filter(tab_type=tab_type).update(assigned_to=None)
+                AssignmentLog.objects.filter(device__tab_type=tab_type).delete()
+                ReturnVerification.objects.filter(device__tab_type=tab_type).delete()
+                User.objects.filter(id__in=[admin.id, *(user.id for user in users)]).delete()
+                TabletDevice.objects.filter(tab_type=tab_type).delete()
+                tab_type.delete()
+
+    def _configure(self, db, options, conn_max_age, journal_mode):
+        connections.close_all()
+        db['OPTIONS'] = dict(options)
+        db['CONN_MAX_AGE'] = conn_max_age
+        with connection.cursor() as cursor:
+            # The journal mode is stored in the database file; WAL stays on until switched off
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        connections.close_all()
+
+    def _run(self, devices, admin_token, user_tokens, options):
+        TabletDevice.objects.filter(id__in=[device.id for device in devices]).update(
+            status='available', assigned_to=None, assigned_at=None,
+        )
+        AssignmentLog.objects.filter(device__in=devices, status='active').update(status='returned', returned_at=timezone.now())
+        connections.close_all()
+
+        read_paths = [
+            ('/api/possession/', None), ('/api/user/history/', None),
+            ('/api/admin/dashboard/', admin_token), ('/api/logs/?limit=50', admin_token),
+        ]
+        totals = {'reads': 0, 'writes': 0, 'latencies': [], 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def reader(i):
+            client, reads, errors = Client(raise_request_exception=False), 0, 0
+            while time.monotonic() < deadline:
+                path, token = read_paths[(i + reads + errors) % len(read_paths)]
+                response = client.get(path, headers={'Authorization': f'Bearer {token or user_tokens[i % len(user_tokens)]}'})
+                if response.status_code >= 500:
+                    errors += 1
+                else:
+                    reads += 1
+                time.sleep(options['pause'])
+            close_old_connections()
+            with lock:
+                totals['reads'] += reads
+                totals['errors'] += errors
+
+        def writer(i):
+            # A user who takes their own tablet and hands it back, over and over
+            client = Client(raise_request_exception=False, headers={'Authorization': f'Bearer {user_tokens[i]}'})
+            serial, latencies, errors = devices[i].serial_number, [], 0
+
+            def post(path, data):
+                nonlocal errors
+                start = time.perf_counter()
+                response = client.post(path, data, content_type='application/json')
+                if response.status_code >= 500:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                return response
+
+            while time.monotonic() < deadline:
+                post('/api/assign/', {'device_id': serial})
+                post('/api/return/initiate/', {'device_id': serial})
+                # The code the admin reads out from the dashboard
+                otp_code = ReturnVerification.objects.filter(
+                    device=devices[i], verified=False,
+                ).values_list('otp_code', flat=True).order_by('-created_at').first()
+                close_old_connections()
+                post('/api/return/verify/', {'device_id': serial, 'otp_code': otp_code})
+            with lock:
+                totals['writes'] += len(latencies)
+                totals['latencies'] += latencies
+                totals['errors'] += errors
+
+        threads = (
+            [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+            + [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return totals['reads'], totals['writes'], totals['latencies'], totals['errors']
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[math.ceil(fraction * len(values)) - 1]
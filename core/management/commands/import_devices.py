@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingest import ingest_devices, parse_csv, parse_json
+
+
+class Command(BaseCommand):
+    help = 'Bulk-registers devices from a CSV or JSON file (serial_number, qr_code, tab_type[, condition])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension (CSV for stdin)')
+        parser.add_argument('--create-types', action='store_true', help='Create unknown tab types instead of rejecting their rows')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+
+        try:
+            if path == '-':
+                text = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8-sig') as f:
+                    text = f.read()
+            rows = parse_json(text) if fmt == 'json' else parse_csv(text)
+            result = ingest_devices(rows, create_types=options['create_types'], source=f"import_devices {path}")
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for error in result['errors']:
+            self.stderr.write(f"  row {error['row']} ({error['serial_number'] or '-'}): {error['error']}")
+        for name in result['tab_types_created']:
+            self.stdout.write(f"Created Tab Type: {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} devices, rejected {len(result['errors'])} rows."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.dashboard import SECTION_BUILDERS, refresh_sections
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed admin dashboard snapshot (e.g. after bulk edits that bypass model signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sections', nargs='*', choices=sorted(SECTION_BUILDERS), help='Sections to rebuild (default: all)')
+
+    def handle(self, *args, **options):
+        sections = options['sections'] or None
+        refresh_sections(sections)
+        self.stdout.write(self.style.SUCCESS(f"Dashboard snapshot rebuilt: {', '.join(sorted(sections or SECTION_BUILDERS))}"))
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.archive import BATCH_SIZE, restore_logs
+
+
+class Command(BaseCommand):
+    help = 'Moves archived assignment logs issued in a date range back to the live table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date_from', help='First issue day to restore (YYYY-MM-DD, local time)')
+        parser.add_argument('date_to', help='Last issue day to restore, inclusive (YYYY-MM-DD, local time)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        days = [parse_date(options['date_from']), parse_date(options['date_to'])]
+        if None in days:
+            raise CommandError("Dates must be YYYY-MM-DD.")
+        start, end = (timezone.make_aware(datetime.combine(day, datetime.min.time())) for day in days)
+
+        moved = restore_logs(start, end + timedelta(days=1), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {moved} assignment logs. Loans that ended before the archive cutoff "
+            f"move back on the next archive_logs run."
+        ))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from core.models import TabType, TabletDevice, User
 from django.db import transaction
+from core.ingest import ingest_devices
 import random
 
 class Command(BaseCommand):
@@ -17,6 +18,7 @@ class Command(BaseCommand):
                 {"name": "Lenovo Tab M10", "limit": 2},
             ]
 
+            rows = []
             for t_data in tab_types_data:
                 tab_type, created = TabType.objects.get_or_create(
                     name=t_data["name"],
@@ -30,17 +32,10 @@ class Command(BaseCommand):
                 # Let's create 5 devices for each type for testing
                 for i in range(1, 6): 
                     serial_num = f"{t_data['name'][:3].upper()}-{random.randint(1000, 9999)}"
-                    
-                    device, dev_created = TabletDevice.objects.get_or_create(
-                        serial_number=serial_num,
-                        defaults={
-                            "tab_type": tab_type,
-                            "qr_code": f"QR-{serial_num}",
-                            "status": "available",
-                            "condition": "Good"
-                        }
-                    )
-                    if dev_created:
-                        self.stdout.write(f"  -> Added Device: {serial_num}")
+                    rows.append((len(rows) + 1, {"serial_number": serial_num, "tab_type": tab_type.name, "condition": "Good"}))
+
+            # One set-based validation + bulk insert; serials that already exist are skipped
+            result = ingest_devices(rows, source="seed_data")
+            self.stdout.write(f"  -> Added {result['created']} devices")
 
         self.stdout.write(self.style.SUCCESS("Database seeded successfully with Tab Types and Devices!"))
\ No newline at end of file
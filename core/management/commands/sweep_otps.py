@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.sweeper import BATCH_SIZE, KEEP_DAYS, sweep
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired and old used/verified OTP rows in small batches (see core/sweeper.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows deleted per transaction')
+        parser.add_argument('--keep-days', type=int, default=KEEP_DAYS, help='Retention for used/verified codes')
+
+    def handle(self, *args, **options):
+        result = sweep(batch_size=options['batch_size'], keep_days=options['keep_days'])
+
+        for name, count in result['removed'].items():
+            self.stdout.write(f"  {name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {sum(result['removed'].values())} rows in {result['seconds']:.2f}s"
+        ))
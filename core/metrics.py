@@ -0,0 +1,355 @@
+# core/metrics.py
+"""
+Per-endpoint request metrics, served in the Prometheus text format at /api/admin/metrics/.
+
+MetricsMiddleware (core/middleware.py) records every request by route (URL name)
+and method: status codes, latency, DB queries and the time spent in them, and the
+response size. Latency runs until the response is closed, so a streamed CSV export
+counts until its last row is sent. The histograms have fixed buckets: memory grows
+with the number of routes, never with the number of requests.
+
+Queries are counted by an execute wrapper on every DB connection. It adds to the
+stats of the request in progress, which are found through a ContextVar: that is how
+the pool threads that serve ASGI requests (core/syncpool.py) count for their request.
+
+Each process keeps its own counters. With several worker processes (gunicorn), each
+one also writes them to settings.METRICS_DIR every METRICS_FLUSH_INTERVAL seconds,
+and a scrape adds up the files. The files of exited workers are folded into
+archive.json, so the totals don't go backwards when gunicorn recycles a worker.
+Without METRICS_DIR, a scrape sees the counters of the process that serves it.
+"""
+import atexit
+import json
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds of the histogram buckets (a last, unbounded one is added)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Seconds
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)  # Bytes
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+ARCHIVE = 'archive.json'
+
+
+class RequestStats:
+    """What one request has used so far."""
+    __slots__ = ('start', 'queries', 'db_seconds', 'size')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.size = 0
+
+
+current = ContextVar('request_stats', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    # Fired again when a thread's connection reconnects; its wrappers are still in place
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def metered(iterator, stats):
+    """Wraps a response's streaming_content: counts its bytes and the queries made to produce them."""
+    iterator = iter(iterator)
+    while True:
+        token = current.set(stats)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            current.reset(token)
+        stats.size += len(chunk)
+        yield chunk
+
+
+async def ametered(iterator, stats):
+    """metered() for async streaming_content."""
+    iterator = aiter(iterator)
+    while True:
+        token = current.set(stats)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            current.reset(token)
+        stats.size += len(chunk)
+        yield chunk
+
+
+def _new_series():
+    return {
+        'responses': {},  # Status code -> count
+        'duration': [0] * (len(DURATION_BUCKETS) + 1), 'duration_sum': 0.0,
+        'queries': [0] * (len(QUERY_BUCKETS) + 1), 'queries_sum': 0, 'db_seconds': 0.0,
+        'size': [0] * (len(SIZE_BUCKETS) + 1), 'size_sum': 0,
+    }
+
+
+def _add(totals, series):
+    """Adds a snapshot ({'view method': series}) into totals, in place."""
+    for key, other in series.items():
+        into = totals.setdefault(key, _new_series())
+        for status, count in other['responses'].items():
+            into['responses'][status] = into['responses'].get(status, 0) + count
+        for name in ('duration', 'queries', 'size'):
+            into[name] = [a + b for a, b in zip(into[name], other[name])]
+        for name in ('duration_sum', 'queries_sum', 'db_seconds', 'size_sum'):
+            into[name] += other[name]
+
+
+class Registry:
+    """The counters of this process, and its file in METRICS_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        # Also run in a forked worker: it starts from zero, with a file of its own
+        self._pid = os.getpid()
+        self.filename = f'{self._pid}-{secrets.token_hex(4)}.json'
+        self._series = {}
+        self._next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._start()
+
+    def record(self, view, method, status, stats):
+        duration = time.perf_counter() - stats.start
+        key = f"{view} {method if method in METHODS else 'other'}"
+        with self._lock:
+            self._check_fork()
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _new_series()
+            status = str(status)
+            series['responses'][status] = series['responses'].get(status, 0) + 1
+            series['duration'][bisect_left(DURATION_BUCKETS, duration)] += 1
+            series['duration_sum'] += duration
+            series['queries'][bisect_left(QUERY_BUCKETS, stats.queries)] += 1
+            series['queries_sum'] += stats.queries
+            series['db_seconds'] += stats.db_seconds
+            series['size'][bisect_left(SIZE_BUCKETS, stats.size)] += 1
+            series['size_sum'] += stats.size
+            due = time.monotonic() >= self._next_flush
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            totals = {}
+            _add(totals, self._series)
+            return totals
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def flush(self):
+        """Writes this process's counters to its file in METRICS_DIR (when set)."""
+        directory = settings.METRICS_DIR
+        if not directory or not self._flush_lock.acquire(blocking=False):
+            return  # Another thread is writing them right now
+        try:
+            self._next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+            series = self.snapshot()
+            if series:
+                os.makedirs(directory, exist_ok=True)
+                _write(os.path.join(directory, self.filename), {'series': series})
+        finally:
+            self._flush_lock.release()
+
+
+registry = Registry()
+# The last few seconds of a worker that exits normally (e.g. recycled by gunicorn)
+atexit.register(registry.flush)
+
+
+def collect():
+    """Totals of all the server's processes: this one's counters, the other live processes' files and the archive."""
+    totals = registry.snapshot()
+    directory = settings.METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return totals
+
+    _fold_exited(directory)
+    # Listed before the archive is read: a file folded in the meantime is then skipped, not counted twice
+    names = _process_files(directory)
+    archive = _read(os.path.join(directory, ARCHIVE)) or {}
+    folded = set(archive.get('folded', ()))
+    _add(totals, archive.get('series', {}))
+    for name in names:
+        if name != registry.filename and name not in folded:
+            _add(totals, (_read(os.path.join(directory, name)) or {}).get('series', {}))
+    return totals
+
+
+def _process_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.json') and name != ARCHIVE]
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        return False  # Windows runs a single (waitress) process: the other files are from earlier runs
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Someone else's process
+    return True
+
+
+def _fold_exited(directory):
+    # One scrape at a time folds; a lock left behind by a crashed one expires
+    lock = os.path.join(directory, 'archive.lock')
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock) > 60:
+                os.remove(lock)
+        except OSError:
+            pass
+        return
+
+    try:
+        archive_path = os.path.join(directory, ARCHIVE)
+        archive = _read(archive_path) or {'series': {}, 'folded': []}
+        exited = []
+        for name in _process_files(directory):
+            try:
+                pid = int(name.split('-', 1)[0])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                exited.append(name)
+
+        # Files of the last fold that are still there: already in the archive (we stopped before removing them)
+        last = set(archive['folded'])
+        new = [name for name in exited if name not in last]
+        if not new:
+            for name in exited:
+                _remove(os.path.join(directory, name))
+            return
+        for name in new:
+            _add(archive['series'], (_read(os.path.join(directory, name)) or {}).get('series', {}))
+        archive['folded'] = new
+        _write(archive_path, archive)
+        for name in exited:
+            _remove(os.path.join(directory, name))
+    finally:
+        os.close(fd)
+        _remove(lock)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # Gone since it was listed
+
+
+def _write(path, data):
+    # Readers see the old file or the new one, never half of one
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# --- PROMETHEUS TEXT FORMAT ---
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram(lines, name, buckets, counts, total, **labels):
+    cumulative = 0
+    for bound, count in zip(buckets + ('+Inf',), counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total}')
+    lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+
+def render(totals=None):
+    """The metrics in the Prometheus text exposition format."""
+    totals = collect() if totals is None else totals
+    series = [(*key.rsplit(' ', 1), totals[key]) for key in sorted(totals)]
+    lines = []
+
+    lines += ['# HELP tab_audit_http_requests_total Responses by route, method and status code.',
+              '# TYPE tab_audit_http_requests_total counter']
+    for view, method, s in series:
+        for status, count in sorted(s['responses'].items()):
+            lines.append(f'tab_audit_http_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+    lines += ['# HELP tab_audit_http_request_duration_seconds Time from the request to the end of the response.',
+              '# TYPE tab_audit_http_request_duration_seconds histogram']
+    for view, method, s in series:
+        _histogram(lines, 'tab_audit_http_request_duration_seconds', DURATION_BUCKETS,
+                   s['duration'], s['duration_sum'], view=view, method=method)
+
+    lines += ['# HELP tab_audit_http_db_queries DB queries per request.',
+              '# TYPE tab_audit_http_db_queries histogram']
+    for view, method, s in series:
+        _histogram(lines, 'tab_audit_http_db_queries', QUERY_BUCKETS,
+                   s['queries'], s['queries_sum'], view=view, method=method)
+
+    lines += ['# HELP tab_audit_http_db_seconds_total Time spent in DB queries.',
+              '# TYPE tab_audit_http_db_seconds_total counter']
+    for view, method, s in series:
+        lines.append(f'tab_audit_http_db_seconds_total{_labels(view=view, method=method)} {s["db_seconds"]}')
+
+    lines += ['# HELP tab_audit_http_response_bytes Size of the response body.',
+              '# TYPE tab_audit_http_response_bytes histogram']
+    for view, method, s in series:
+        _histogram(lines, 'tab_audit_http_response_bytes', SIZE_BUCKETS,
+                   s['size'], s['size_sum'], view=view, method=method)
+
+    return '\n'.join(lines) + '\n'
@@ -1,12 +1,306 @@
 # core/middleware.py
+import asyncio
+import threading
+from collections import deque
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import metrics
+from .syncpool import aiter_in_pool, run_in_pool
+
 
 class DisableCSRFForAPIMiddleware:
+    # Sync and async capable: one sync-only middleware would put every ASGI request on a thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         # If the request is hitting our mobile/React API, bypass CSRF completely
         if request.path.startswith('/api/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
             
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class ASGIURLConfMiddleware:
+    """Resolves ASGI requests against settings.ASGI_URLCONF (lean read views, bounded thread pools)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.ASGI_URLCONF
+        return self.get_response(request)
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise, which is sync-only, made async capable: static files are read on the sync pool."""
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        response = await run_in_pool(self.serve, static_file, request)
+        response.streaming_content = aiter_in_pool(response.streaming_content)
+        return response
+
+
+def call_on_close(response, func):
+    """Calls func() once the server has closed the response, i.e. after the body is sent."""
+    close = response.close
+
+    def closing():
+        try:
+            close()
+        finally:
+            func()
+
+    response.close = closing
+
+
+def route_name(request):
+    """
+    The route of the request: its URL name (with namespace), else its pattern;
+    None when nothing matches. Resolved once per request.
+    """
+    if not hasattr(request, '_route_name'):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(request.path_info, getattr(request, 'urlconf', None))
+            except Resolver404:
+                match = None
+        request._route_name = None if match is None else (match.view_name if match.url_name else match.route)
+    return request._route_name
+
+
+# --- METRICS ---
+
+class MetricsMiddleware:
+    """
+    Records each request in core.metrics. It comes before PriorityAdmissionMiddleware,
+    so the requests that middleware sheds are counted too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.measure(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.measure(request, response, stats)
+
+    def measure(self, request, response, stats):
+        if not response.streaming:
+            stats.size = len(response.content)
+        elif response.is_async:
+            response.streaming_content = metrics.ametered(response.streaming_content, stats)
+        else:
+            response.streaming_content = metrics.metered(response.streaming_content, stats)
+        # Recorded when the server closes the response, i.e. after the body is sent
+        call_on_close(response, partial(
+            metrics.registry.record, route_name(request) or 'unmatched', request.method, response.status_code, stats,
+        ))
+        return response
+
+
+# --- PRIORITY ADMISSION ---
+
+# /api/ routes by URL name. Named routes not listed here (possession, history, ...) are 'normal'.
+CRITICAL_ROUTES = {
+    'token_obtain_pair', 'token_refresh', 'transfer-initiate', 'transfer-accept',
+    'assign-tablet', 'generate-assign-otp', 'return-initiate', 'return-verify',
+    'assign-batch', 'return-initiate-batch', 'return-verify-batch', 'admin-force-return',
+}
+LOW_PRIORITY_ROUTES = {
+    'all-logs', 'export_usage_csv', 'admin-dashboard', 'usage-analytics', 'fleet-concurrency', 'import-devices',
+    'tab-check-in',
+}
+# Routes whose writes are critical while their reads are not: GET /api/check-in/ lists every
+# device (the heaviest read), so only its other methods skip the tiers
+CRITICAL_WRITE_ROUTES = {'tab-check-in'}
+# The stream is open for as long as the admin watches; under ASGI it only holds a thread while it
+# checks for changes, and under WSGI it returns at once. Metrics must still be scraped when the
+# server is saturated.
+UNLIMITED_ROUTES = {'admin-dashboard-stream', 'metrics'}
+
+
+class AdmissionTier:
+    """
+    Caps the requests of one priority tier that are in progress at once. Under ASGI a
+    request over the cap can wait in line (`queue` long, at most `wait` seconds); a
+    waiting coroutine holds no thread. Under WSGI it would hold a server thread, so it
+    is turned away at once.
+    """
+
+    def __init__(self, name, limit, queue, wait):
+        self.name, self.limit, self.queue, self.wait = name, limit, queue, wait
+        self.active = 0
+        self._waiters = deque()  # (loop, future) of queued async requests
+        self._lock = threading.Lock()
+
+    def try_enter(self):
+        with self._lock:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            return False
+
+    async def aenter(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.queue:
+                return False
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), self.wait)
+        except asyncio.TimeoutError:
+            self._give_up(waiter)
+            return False
+        except asyncio.CancelledError:
+            self._give_up(waiter)
+            raise
+        return True
+
+    def _give_up(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return
+        self.leave()  # leave() handed us the slot just as we stopped waiting: pass it on
+
+    def leave(self):
+        with self._lock:
+            if self._waiters:
+                # The slot goes straight to the next in line; `active` stays the same
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(_grant, future)
+            else:
+                self.active -= 1
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class PriorityAdmissionMiddleware:
+    """
+    Sheds low-value /api/ work when the server is saturated, so the critical flows
+    (assignments, returns, force returns) keep their threads and their latency.
+
+    Each /api/ route belongs to a tier (the sets above; check-in by method).
+    settings.ADMISSION_TIERS caps the 'normal' and 'low' requests in progress per
+    process; critical ones are never capped. Over the cap, the request gets 503 with
+    Retry-After (after queueing, under ASGI). A slot is held until the response is
+    closed, so a streamed CSV export keeps its slot until the last row is sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.tiers = {
+            name: AdmissionTier(name, limit, queue, wait)
+            for name, (limit, queue, wait) in settings.ADMISSION_TIERS.items()
+        }
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        tier = self.tier_for(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request, tier)
+        if tier is None:
+            return self.get_response(request)
+        if not tier.try_enter():
+            return self.shed(tier)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            tier.leave()
+            raise
+        # Released when the server closes the response, i.e. after the body is sent
+        call_on_close(response, tier.leave)
+        return response
+
+    async def __acall__(self, request, tier):
+        if tier is None:
+            return await self.get_response(request)
+        if not await tier.aenter():
+            return self.shed(tier)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            tier.leave()
+            raise
+        call_on_close(response, tier.leave)
+        return response
+
+    def tier_for(self, request):
+        if not request.path.startswith('/api/'):
+            return None
+        name = route_name(request)
+        if name is None or name in CRITICAL_ROUTES or name in UNLIMITED_ROUTES:
+            return None
+        if name in CRITICAL_WRITE_ROUTES and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        return self.tiers.get('low' if name in LOW_PRIORITY_ROUTES else 'normal')
+
+    def shed(self, tier):
+        response = JsonResponse(
+            {"error": "The server is busy. Please try again in a few seconds."}, status=503,
+        )
+        response['Retry-After'] = str(max(1, round(tier.wait)))
+        return response
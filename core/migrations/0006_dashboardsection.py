@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:00
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_assignmentlog_notes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSection',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('payload', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+def rename_dashboard_counter(apps, schema_editor):
+    """
+    The dashboard section versions become the global data version.
+    Keep the counter value so existing section versions and client cursors stay monotonic.
+    """
+    ChangeCounter = apps.get_model('core', 'ChangeCounter')
+    old = ChangeCounter.objects.filter(name='dashboard').first()
+    if old is not None:
+        ChangeCounter.objects.update_or_create(name='data', defaults={'value': old.value})
+        old.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_changecounter_dashboardsection_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_dashboard_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_data_version_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adminauditlog',
+            index=models.Index(fields=['-timestamp'], name='audit_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(fields=['user', 'status'], name='log_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(fields=['user', '-issued_at'], name='log_user_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(fields=['device', 'status'], name='log_device_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(fields=['-issued_at', '-id'], name='log_issued_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-issued_at'], name='log_active_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentlog',
+            index=models.Index(condition=models.Q(('status', 'returned')), fields=['-returned_at'], name='log_returned_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentotp',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['otp_code'], name='otp_live_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentotp',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['expires_at'], name='otp_live_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnverification',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['otp_code', '-created_at'], name='rv_live_otp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnverification',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['device'], name='rv_live_device_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnverification',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['-created_at'], name='rv_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tabletdevice',
+            index=models.Index(fields=['tab_type', 'status'], name='device_type_status_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_open_loans(apps, schema_editor):
+    """Seed the counters from the loans that are open right now (closed ones hold no slot)."""
+    AssignmentLog = apps.get_model('core', 'AssignmentLog')
+    DailyUsage = apps.get_model('core', 'DailyUsage')
+
+    counts = {}
+    for user_id, tab_type_id, issued_at in AssignmentLog.objects.filter(status='active').values_list(
+        'user_id', 'device__tab_type_id', 'issued_at'
+    ):
+        key = (user_id, tab_type_id, timezone.localdate(issued_at))
+        counts[key] = counts.get(key, 0) + 1
+
+    DailyUsage.objects.bulk_create([
+        DailyUsage(user_id=user_id, tab_type_id=tab_type_id, day=day, count=count)
+        for (user_id, tab_type_id, day), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('tab_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.tabtype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'tab_type', 'day'), name='daily_usage_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_open_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+def retire_duplicate_live_codes(apps, schema_editor):
+    """
+    Before the unique constraints, leave at most one live row per code (the newest).
+    Older duplicate assignment OTPs are marked used; older duplicate return/transfer
+    OTPs are deleted, as InitiateReturnView already does for superseded codes.
+    """
+    AssignmentOTP = apps.get_model('core', 'AssignmentOTP')
+    ReturnVerification = apps.get_model('core', 'ReturnVerification')
+
+    for model, live, retire in (
+        (AssignmentOTP, {'is_used': False}, lambda qs: qs.update(is_used=True)),
+        (ReturnVerification, {'verified': False}, lambda qs: qs.delete()),
+    ):
+        seen = set()
+        stale_ids = []
+        for pk, code in model.objects.filter(**live).order_by('-created_at').values_list('id', 'otp_code'):
+            if code in seen:
+                stale_ids.append(pk)
+            seen.add(code)
+        if stale_ids:
+            retire(model.objects.filter(id__in=stale_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dailyusage'),
+    ]
+
+    operations = [
+        migrations.RunPython(retire_duplicate_live_codes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='assignmentotp',
+            name='otp_live_code_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='returnverification',
+            name='rv_live_otp_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='assignmentotp',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_used', False)), fields=('otp_code',), name='otp_live_code_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='returnverification',
+            constraint=models.UniqueConstraint(condition=models.Q(('verified', False)), fields=('otp_code',), name='rv_live_otp_unique'),
+        ),
+    ]
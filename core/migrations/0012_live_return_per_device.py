@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+def keep_latest_pending_per_device(apps, schema_editor):
+    """
+    Before the constraint, leave only the newest unverified code of each device.
+    The older ones were already superseded (the views delete them on re-initiation).
+    """
+    ReturnVerification = apps.get_model('core', 'ReturnVerification')
+
+    seen = set()
+    stale_ids = []
+    for pk, device_id in ReturnVerification.objects.filter(verified=False).order_by('-created_at').values_list('id', 'device_id'):
+        if device_id in seen:
+            stale_ids.append(pk)
+        seen.add(device_id)
+    if stale_ids:
+        ReturnVerification.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_live_otp_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_pending_per_device, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='returnverification',
+            name='rv_live_device_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='returnverification',
+            constraint=models.UniqueConstraint(condition=models.Q(('verified', False)), fields=('device',), name='rv_live_device_unique'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_live_return_per_device'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAssignmentLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('issued_at', models.DateTimeField()),
+                ('returned_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('device_info', models.TextField()),
+                ('notes', models.CharField(blank=True, max_length=255, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.tabletdevice')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-issued_at'],
+                'indexes': [models.Index(fields=['-issued_at', '-id'], name='archlog_issued_id_idx'), models.Index(fields=['-returned_at'], name='archlog_returned_at_idx')],
+            },
+        ),
+    ]
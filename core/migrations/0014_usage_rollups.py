@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_archivedassignmentlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TabTypeDailyRollup',
+            fields=[
+                ('day', models.DateField()),
+                ('checkouts', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+                ('transfers', models.IntegerField(default=0)),
+                ('force_returns', models.IntegerField(default=0)),
+                ('mean_loan_seconds', models.FloatField(null=True)),
+                ('p95_loan_seconds', models.FloatField(null=True)),
+                ('peak_concurrent', models.IntegerField(default=0)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tab_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.tabtype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='tab_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tab_type', 'day'), name='tab_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDailyRollup',
+            fields=[
+                ('day', models.DateField()),
+                ('checkouts', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+                ('transfers', models.IntegerField(default=0)),
+                ('force_returns', models.IntegerField(default=0)),
+                ('mean_loan_seconds', models.FloatField(null=True)),
+                ('p95_loan_seconds', models.FloatField(null=True)),
+                ('peak_concurrent', models.IntegerField(default=0)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='user_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='user_rollup_unique')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
@@ -44,9 +45,29 @@ class TabletDevice(models.Model):
     assigned_to = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     assigned_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # OTP assignment / stock checks: available devices of a type
+            models.Index(fields=['tab_type', 'status'], name='device_type_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tab_type.name} - {self.serial_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_status()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_status()
+
+    def _remember_status(self):
+        # What the stored row counts as on the dashboard (core/dashboard.py), None if deferred
+        self._stored_status = (self.__dict__.get('tab_type_id'), self.__dict__.get('status'))
+
 class AssignmentLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.PROTECT)
@@ -62,6 +83,60 @@ class AssignmentLog(models.Model):
 
     class Meta:
         ordering = ['-issued_at']
+        indexes = [
+            # Possession: a user's active loans
+            models.Index(fields=['user', 'status'], name='log_user_status_idx'),
+            # History and daily limits: a user's loans by issue time (tab type is reached via the device PK)
+            models.Index(fields=['user', '-issued_at'], name='log_user_issued_idx'),
+            # Return / force return / transfer: the active loan of a device
+            models.Index(fields=['device', 'status'], name='log_device_status_idx'),
+            # Logs page keyset order
+            models.Index(fields=['-issued_at', '-id'], name='log_issued_id_idx'),
+            # Dashboard active loans and the export's return stream
+            models.Index(fields=['-issued_at'], name='log_active_issued_idx', condition=models.Q(status='active')),
+            models.Index(fields=['-returned_at'], name='log_returned_at_idx', condition=models.Q(status='returned')),
+        ]
+
+class ArchivedAssignmentLog(models.Model):
+    """
+    Cold storage for closed AssignmentLog rows (see core/archive.py).
+    Same columns and ids as AssignmentLog, so rows can be moved back unchanged.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='+')
+    device = models.ForeignKey(TabletDevice, on_delete=models.PROTECT, related_name='+')
+    issued_at = models.DateTimeField()
+    returned_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20)
+    ip_address = models.GenericIPAddressField()
+    device_info = models.TextField()
+    notes = models.CharField(max_length=255, blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-issued_at']
+        indexes = [
+            # Logs page keyset order and range restores
+            models.Index(fields=['-issued_at', '-id'], name='archlog_issued_id_idx'),
+            # The export's return stream
+            models.Index(fields=['-returned_at'], name='archlog_returned_at_idx'),
+        ]
+
+class DailyUsage(models.Model):
+    """
+    Loans a user opened today for a tab type, by local day (TIME_ZONE), that are still open.
+    Maintained by core/limits.py so the daily limit check is a single-row lookup.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tab_type = models.ForeignKey(TabType, on_delete=models.CASCADE)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tab_type', 'day'], name='daily_usage_unique'),
+        ]
 
 class AdminAuditLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -70,6 +145,11 @@ class AdminAuditLog(models.Model):
     description = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-timestamp'], name='audit_timestamp_idx'),
+        ]
+
 class ReturnVerification(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     device = models.ForeignKey(TabletDevice, on_delete=models.CASCADE)
@@ -78,11 +158,63 @@ class ReturnVerification(models.Model):
     expires_at = models.DateTimeField()
     verified = models.BooleanField(default=False)
 
+    class Meta:
+        # Only unverified rows are ever looked up, so the indexes skip verified history
+        indexes = [
+            models.Index(fields=['-created_at'], name='rv_pending_created_idx', condition=models.Q(verified=False)),
+        ]
+        constraints = [
+            # A live return/transfer code identifies exactly one row (see core/otp.py)
+            models.UniqueConstraint(fields=['otp_code'], condition=models.Q(verified=False), name='rv_live_otp_unique'),
+            # At most one live code per device: a new return/transfer replaces the old code (issue_return_otp)
+            models.UniqueConstraint(fields=['device'], condition=models.Q(verified=False), name='rv_live_device_unique'),
+        ]
+
+    LIFETIME = timedelta(minutes=10)  # OTP valid 10 min
+
     def save(self, *args, **kwargs):
         if not self.expires_at:
-            self.expires_at = timezone.now() + timedelta(minutes=10)  # OTP valid 10 min
+            self.expires_at = timezone.now() + self.LIFETIME
         super().save(*args, **kwargs)
 
+class UsageRollup(models.Model):
+    """Daily utilisation metrics, precomputed from the assignment logs by core/rollups.py."""
+    day = models.DateField()
+    checkouts = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    transfers = models.IntegerField(default=0)
+    force_returns = models.IntegerField(default=0)
+    mean_loan_seconds = models.FloatField(null=True)  # Loans closed that day
+    p95_loan_seconds = models.FloatField(null=True)
+    peak_concurrent = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class TabTypeDailyRollup(UsageRollup):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tab_type = models.ForeignKey(TabType, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tab_type', 'day'], name='tab_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='tab_rollup_day_idx'),
+        ]
+
+class UserDailyRollup(UsageRollup):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='user_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='user_rollup_day_idx'),
+        ]
+
 class AssignmentOTP(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tab_type = models.ForeignKey(TabType, on_delete=models.CASCADE)
@@ -91,8 +223,55 @@ class AssignmentOTP(models.Model):
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='otp_live_expiry_idx', condition=models.Q(is_used=False)),
+        ]
+        constraints = [
+            # A live assignment code identifies exactly one row (see core/otp.py)
+            models.UniqueConstraint(fields=['otp_code'], condition=models.Q(is_used=False), name='otp_live_code_unique'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.expires_at:
             # OTPs for assignment are valid for 12 hours
             self.expires_at = timezone.now() + timedelta(hours=12)  
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class DashboardSection(models.Model):
+    """
+    One precomputed section of the admin dashboard payload.
+    Rows are marked stale by every committed state transition and rebuilt at the
+    next read, except the device counts, which writes adjust in place (see
+    core/dashboard.py); any other dashboard poll is a single read of this small table.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    payload = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    version = models.BigIntegerField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class ChangeCounter(models.Model):
+    """
+    A named, monotonically increasing counter shared by all server processes.
+    bump() must run inside a transaction: the row stays locked until commit,
+    so values become visible in the same order they were handed out.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(value=models.F('value') + 1):
+            cls.objects.get_or_create(name=name)
+            cls.objects.filter(name=name).update(value=models.F('value') + 1)
+        return cls.objects.values_list('value', flat=True).get(name=name)
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
@@ -0,0 +1,98 @@
+# core/otp.py
+"""
+One allocator for every 6-digit OTP: assignment codes (AssignmentOTP) and
+return/transfer codes (ReturnVerification).
+
+Live codes (unused / unverified) are unique per table through partial unique
+constraints, so the database is the source of truth. Allocation inserts a
+random code and retries with a fresh one if the constraint rejects it. Each
+attempt runs in its own savepoint, so the caller's transaction survives a
+collision. The expected number of round-trips is 1 / (1 - live / 900,000),
+i.e. effectively one while the number of live codes stays far below the code
+space.
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AssignmentOTP, ReturnVerification
+
+MAX_ATTEMPTS = 25
+
+# What makes a row "live" (and therefore covered by the unique constraint) per model
+LIVE_FILTERS = {
+    AssignmentOTP: {'is_used': False},
+    ReturnVerification: {'verified': False},
+}
+
+
+class OTPSpaceExhausted(Exception):
+    """No free code was found after MAX_ATTEMPTS inserts (far too many live codes)."""
+
+
+def random_code():
+    return f"{secrets.randbelow(900000) + 100000}"
+
+
+def allocate_otp(model, **fields):
+    """
+    Creates and returns a `model` row whose otp_code no other live row holds.
+    `fields` are passed to create() (e.g. tab_type=... or device=...).
+    """
+    live = LIVE_FILTERS[model]
+    for _ in range(MAX_ATTEMPTS):
+        code = random_code()
+        try:
+            with transaction.atomic():
+                return model.objects.create(otp_code=code, **fields)
+        except IntegrityError:
+            holders = model.objects.filter(otp_code=code, **live)
+            if not holders.exists():
+                raise  # Some other constraint failed; retrying with a new code won't help
+            # Expired codes that were never used still hold their slot: reclaim them
+            holders.filter(expires_at__lte=timezone.now()).delete()
+    raise OTPSpaceExhausted(f"Could not allocate a unique {model.__name__} code after {MAX_ATTEMPTS} attempts.")
+
+
+def allocate_otps(objs):
+    """
+    Batch form of allocate_otp: gives every unsaved instance in `objs` (all of one
+    model) a distinct live code and inserts them with one bulk_create. On a
+    collision the whole batch is retried in a fresh savepoint with new codes.
+    """
+    if not objs:
+        return objs
+    model = type(objs[0])
+    live = LIVE_FILTERS[model]
+    for _ in range(MAX_ATTEMPTS):
+        codes = set()
+        while len(codes) < len(objs):
+            codes.add(random_code())
+        for obj, code in zip(objs, codes):
+            obj.otp_code = code
+        try:
+            with transaction.atomic():
+                return model.objects.bulk_create(objs)
+        except IntegrityError:
+            holders = model.objects.filter(otp_code__in=codes, **live)
+            if not holders.exists():
+                raise
+            holders.filter(expires_at__lte=timezone.now()).delete()
+    raise OTPSpaceExhausted(f"Could not allocate {len(objs)} unique {model.__name__} codes after {MAX_ATTEMPTS} attempts.")
+
+
+def issue_return_otp(device):
+    """
+    Replaces the live return/transfer code of `device` with a new one. The
+    rv_live_device_unique constraint allows a single live code per device; if a
+    concurrent request issued one in between, that code is replaced too.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        ReturnVerification.objects.filter(device=device, verified=False).delete()
+        try:
+            with transaction.atomic():
+                return allocate_otp(ReturnVerification, device=device)
+        except IntegrityError:
+            continue
+    raise OTPSpaceExhausted(f"Could not issue a return code for device {device.pk} after {MAX_ATTEMPTS} attempts.")
@@ -0,0 +1,70 @@
+# core/pagination.py
+"""
+Keyset ("seek") pagination for the history endpoints.
+
+Rows are ordered newest first on (timestamp, id), and the cursor is the position
+of the last row returned. Each page is then a plain indexed range scan, so page
+1,000 costs the same as page 1, unlike OFFSET pagination.
+"""
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp, pk):
+    raw = json.dumps([timestamp.isoformat(), str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (timestamp, pk). Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        parsed = parse_datetime(timestamp)
+        pk = uuid.UUID(pk)
+    except (TypeError, ValueError, AttributeError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor.")
+    if parsed is None:
+        raise ValueError("Malformed cursor.")
+    return parsed, pk
+
+
+def parse_page_size(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    size = int(value)  # ValueError is reported by the caller
+    if size < 1:
+        raise ValueError("limit must be at least 1.")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, field='issued_at'):
+    """
+    Returns (rows, next_cursor) for a .values() queryset that includes `field` and 'id'.
+    next_cursor is None on the last page.
+    """
+    # Fetch one extra row to learn whether another page exists
+    rows = list(_seek(queryset, cursor, field)[:limit + 1])
+    return _split(rows, limit, field)
+
+
+def _seek(queryset, cursor, field):
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk}))
+    return queryset
+
+
+def _split(rows, limit, field):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][field], rows[-1]['id'])
@@ -0,0 +1,26 @@
+# core/periodic.py
+"""In-process periodic jobs for the single-process servers (production_server.py)."""
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def start_periodic_thread(name, job, interval):
+    """Runs job() every `interval` seconds in a daemon thread. Failures are logged, never raised."""
+    def run():
+        while True:
+            try:
+                job()
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+            finally:
+                close_old_connections()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
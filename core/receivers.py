@@ -0,0 +1,82 @@
+# core/receivers.py
+"""
+Model signal receivers connected by CoreConfig.ready().
+
+They keep derived state in step with the rows it comes from: the stored
+dashboard sections (core/dashboard.py) and the token user cache
+(core/authentication.py). core/signals.py holds receivers that are not
+connected.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from . import dashboard
+from .authentication import bump_users_version, user_cache
+from .models import TabletDevice, User
+
+# --- DASHBOARD SNAPSHOT ---
+
+def refresh_dashboard_for_model(sender, **kwargs):
+    """
+    Marks the dashboard sections affected by a write as dirty. They are marked
+    stale once the surrounding transaction commits, and rebuilt at their next read.
+    """
+    dashboard.mark_dirty(dashboard.SECTIONS_BY_MODEL[sender])
+
+for _model in dashboard.SECTIONS_BY_MODEL.keys() - {TabletDevice}:
+    post_save.connect(refresh_dashboard_for_model, sender=_model, dispatch_uid=f"dashboard-save-{_model.__name__}")
+    post_delete.connect(refresh_dashboard_for_model, sender=_model, dispatch_uid=f"dashboard-delete-{_model.__name__}")
+
+@receiver(post_save, sender=TabletDevice, dispatch_uid="dashboard-save-TabletDevice")
+def count_saved_device(sender, instance, created, **kwargs):
+    """
+    Device counts move by the status change the save made. A device that wasn't
+    loaded from the database has no known status before it: its counts are rebuilt.
+    """
+    before = (None, None) if created else getattr(instance, '_stored_status', (None, None))
+    after = (instance.tab_type_id, instance.status)
+    if not created and None in before:
+        dashboard.mark_model_dirty(TabletDevice)
+    else:
+        dashboard.count_devices([(before[0], before[1], None), (after[0], None, after[1])])
+    instance._remember_status()
+
+@receiver(post_delete, sender=TabletDevice, dispatch_uid="dashboard-delete-TabletDevice")
+def count_deleted_device(sender, instance, **kwargs):
+    before = getattr(instance, '_stored_status', (None, None))
+    if None in before:
+        dashboard.mark_model_dirty(TabletDevice)
+    else:
+        dashboard.count_devices([(before[0], before[1], None)])
+
+@receiver(post_save, sender=User)
+def refresh_dashboard_for_user(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Names shown on the dashboard come from User rows.
+    Logins only touch last_login (and password, when rehashed), so they leave the dashboard as it is.
+    """
+    if created or (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        return
+    dashboard.mark_dirty(dashboard.USER_SECTIONS)
+
+# --- AUTHENTICATION CACHE ---
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Role, status and is_active changes apply from the user's next request in this
+    process, and within JWT_USER_CACHE_CHECK_INTERVAL in the others: each one stops
+    using its cached users once the version moves. A login only updates last_login,
+    and maybe rehashes the password, which leaves the caches as they are.
+    """
+    if update_fields and set(update_fields) <= _login_fields():
+        return
+    user_cache.forget(instance.pk)
+    bump_users_version()
+
+
+def _login_fields():
+    # A cached password hash only matters when tokens are checked against it
+    return {'last_login'} if api_settings.CHECK_REVOKE_TOKEN else {'last_login', 'password'}
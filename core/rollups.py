@@ -0,0 +1,144 @@
+# core/rollups.py
+"""
+Incremental daily usage rollups (TabTypeDailyRollup, UserDailyRollup).
+
+For each local day (TIME_ZONE) and each tab type / user:
+  checkouts       loans issued that day
+  returns         loans returned that day (verified returns)
+  transfers       loans closed that day by a transfer to another user
+  force_returns   loans closed that day by an admin force return
+  mean / p95 loan duration of the loans closed that day
+  peak_concurrent the highest number of loans open at the same moment
+
+The watermark is the latest day already rolled up. A run recomputes that day
+(it may have been partial) through today and leaves older days alone: loans
+that close later only count on the day they close, and an open loan was
+already counted as open until the end of every past day. The cost of a run
+therefore depends on the loans touching those few days, not on the size of the
+history. Rollups read both the live and the archived logs (core/archive.py).
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import ArchivedAssignmentLog, AssignmentLog, TabTypeDailyRollup, UserDailyRollup
+from .versioning import bump_data_version
+
+FORCE_RETURN_NOTE = "Force returned by Admin"  # Set by AdminForceReturnView
+METRICS = ('checkouts', 'returns', 'transfers', 'force_returns', 'mean_loan_seconds', 'p95_loan_seconds', 'peak_concurrent')
+
+
+class _DayStats:
+    """Accumulates the loans of one (day, tab type) or (day, user) group."""
+
+    def __init__(self):
+        self.checkouts = self.returns = self.transfers = self.force_returns = 0
+        self.durations = []
+        self.events = []
+
+    def add(self, issued_at, returned_at, status, notes, day_start, day_end):
+        if issued_at >= day_start:
+            self.checkouts += 1
+        closed_today = returned_at is not None and returned_at < day_end
+        if closed_today:
+            if status == 'transferred':
+                self.transfers += 1
+            elif notes == FORCE_RETURN_NOTE:
+                self.force_returns += 1
+            else:
+                self.returns += 1
+            self.durations.append((returned_at - issued_at).total_seconds())
+            self.events.append((returned_at, -1))
+        self.events.append((max(issued_at, day_start), 1))
+
+    def metrics(self):
+        # Sweep the open/close events; a close sorts before an open at the same instant
+        open_loans = peak = 0
+        for _, delta in sorted(self.events):
+            open_loans += delta
+            peak = max(peak, open_loans)
+
+        durations = sorted(self.durations)
+        return {
+            'checkouts': self.checkouts,
+            'returns': self.returns,
+            'transfers': self.transfers,
+            'force_returns': self.force_returns,
+            'mean_loan_seconds': sum(durations) / len(durations) if durations else None,
+            'p95_loan_seconds': durations[math.ceil(0.95 * len(durations)) - 1] if durations else None,
+            'peak_concurrent': peak,
+        }
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def rollup_usage(since=None):
+    """
+    Recomputes the rollups from `since` (default: the watermark) through today.
+    Returns the number of days processed.
+    """
+    today = timezone.localdate()
+    if since is None:
+        since = TabTypeDailyRollup.objects.aggregate(day=Max('day'))['day']
+    if since is None:
+        # First run: start at the oldest log
+        firsts = [model.objects.aggregate(first=Min('issued_at'))['first'] for model in (AssignmentLog, ArchivedAssignmentLog)]
+        firsts = [first for first in firsts if first is not None]
+        if not firsts:
+            return 0
+        since = timezone.localdate(min(firsts))
+
+    start, end = _day_start(since), _day_start(today + timedelta(days=1))
+
+    # 1. Every loan open at some point between `start` and now, bucketed by the days it touches
+    days = defaultdict(list)
+    for model in (AssignmentLog, ArchivedAssignmentLog):
+        loans = model.objects.filter(issued_at__lt=end).filter(
+            Q(returned_at__isnull=True) | Q(returned_at__gte=start)
+        ).values_list('issued_at', 'returned_at', 'status', 'notes', 'user_id', 'device__tab_type_id')
+        for loan in loans.iterator(chunk_size=2000):
+            first_day = max(timezone.localdate(loan[0]), since)
+            last_day = timezone.localdate(loan[1]) if loan[1] is not None else today
+            day = first_day
+            while day <= min(last_day, today):
+                days[day].append(loan)
+                day += timedelta(days=1)
+
+    # 2. Per-day metrics for each tab type and each user
+    tab_rows, user_rows = [], []
+    day = since
+    while day <= today:
+        day_start, day_end = _day_start(day), _day_start(day + timedelta(days=1))
+        per_tab, per_user = defaultdict(_DayStats), defaultdict(_DayStats)
+        for issued_at, returned_at, status, notes, user_id, tab_type_id in days.get(day, ()):
+            per_tab[tab_type_id].add(issued_at, returned_at, status, notes, day_start, day_end)
+            per_user[user_id].add(issued_at, returned_at, status, notes, day_start, day_end)
+
+        tab_rows += [TabTypeDailyRollup(day=day, tab_type_id=key, **stats.metrics()) for key, stats in per_tab.items()]
+        user_rows += [UserDailyRollup(day=day, user_id=key, **stats.metrics()) for key, stats in per_user.items()]
+        day += timedelta(days=1)
+
+    # 3. Replace the recomputed days. A run that finds them as they were writes nothing,
+    # and leaves the data version (hence every ETag) as it was.
+    if _unchanged(TabTypeDailyRollup, 'tab_type_id', tab_rows, since) and _unchanged(UserDailyRollup, 'user_id', user_rows, since):
+        return (today - since).days + 1
+    with transaction.atomic():
+        TabTypeDailyRollup.objects.filter(day__gte=since).delete()
+        UserDailyRollup.objects.filter(day__gte=since).delete()
+        TabTypeDailyRollup.objects.bulk_create(tab_rows, batch_size=500)
+        UserDailyRollup.objects.bulk_create(user_rows, batch_size=500)
+        # The analytics endpoint's ETag follows the data version
+        bump_data_version()
+
+    return (today - since).days + 1
+
+
+def _unchanged(model, key, rows, since):
+    stored = model.objects.filter(day__gte=since).values_list('day', key, *METRICS)
+    return set(stored) == {(row.day, getattr(row, key), *(getattr(row, name) for name in METRICS)) for row in rows}
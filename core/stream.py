@@ -0,0 +1,95 @@
+# core/stream.py
+"""
+Server-Sent Events stream of admin dashboard changes.
+
+Clients pass the last version they have seen (?since=N or the Last-Event-ID
+header) and receive only the dashboard sections changed after it.
+
+Under ASGI (tab_audit_system/asgi.py) the view is a coroutine that waits
+between checks without holding a thread: each check runs on the read pool of
+core/syncpool.py. The connection stays open and new deltas are pushed as they
+are committed. Under WSGI (waitress) it sends the pending delta and closes, and
+the client reconnects after `retry` with its new cursor. That makes it a cheap
+cursor poll.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+from .dashboard import get_dashboard_delta
+from .syncpool import run_in_read_pool
+
+POLL_INTERVAL = 1          # Seconds between checks for newer section versions
+KEEPALIVE_INTERVAL = 15    # Seconds of silence before sending an SSE comment
+RECONNECT_DELAY_MS = 2000  # Client reconnect delay after the stream closes
+
+
+def _authenticate_admin(request):
+    """Same JWT check as the DRF views, done by hand since this is a plain Django view."""
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is None or not result[0].is_staff:
+        return None
+    return result[0]
+
+
+def _cursor(request):
+    value = request.GET.get('since') or request.headers.get('Last-Event-ID') or 0
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _event(delta):
+    data = json.dumps(delta, cls=DjangoJSONEncoder)
+    return f"retry: {RECONNECT_DELAY_MS}\nid: {delta['version']}\nevent: delta\ndata: {data}\n\n"
+
+
+async def _event_stream(cursor):
+    last_sent = time.monotonic()
+    first = True
+
+    while True:
+        delta = await run_in_read_pool(get_dashboard_delta, cursor)
+        if first or delta['sections']:
+            cursor = delta['version']
+            last_sent = time.monotonic()
+            first = False
+            yield _event(delta)
+        elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+@require_GET
+async def dashboard_stream(request):
+    """Streams dashboard deltas to an admin as Server-Sent Events."""
+    asgi = isinstance(request, ASGIRequest)
+    # Under WSGI the queries go back to the request's own thread
+    run = run_in_read_pool if asgi else lambda func, *args: sync_to_async(func)(*args)
+    user = await run(_authenticate_admin, request)
+    if user is None:
+        return JsonResponse({"error": "Admin authentication required."}, status=401)
+
+    cursor = _cursor(request)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    if not asgi:
+        # WSGI worker threads are scarce: answer with one delta and let the client reconnect
+        delta = await run(get_dashboard_delta, cursor)
+        return HttpResponse(_event(delta), content_type='text/event-stream', headers=headers)
+
+    return StreamingHttpResponse(_event_stream(cursor), content_type='text/event-stream', headers=headers)
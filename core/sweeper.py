@@ -0,0 +1,78 @@
+# core/sweeper.py
+"""
+Periodic cleanup of OTP rows that can no longer be used.
+
+* AssignmentOTP: unused codes past expires_at, and used codes older than the
+  retention window.
+* ReturnVerification: unverified codes past expires_at (the device stays
+  return_pending; the user simply initiates the return again), and verified
+  codes older than the retention window.
+
+AssignmentLog and AdminAuditLog keep the history of every loan, so these rows
+carry nothing that is needed later. Rows are deleted in small batches, each in
+its own short transaction, with a pause in between. A pass therefore never
+blocks assignments or returns for long, even on SQLite's single writer lock.
+
+Run it with `manage.py sweep_otps` (e.g. from cron), or in-process with
+start_sweeper_thread() (production_server.py does this).
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AssignmentOTP, ReturnVerification
+from .periodic import start_periodic_thread
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+KEEP_DAYS = 7         # Used / verified codes are kept this long for support questions
+PAUSE = 0.05          # Seconds between batches, so other writers get the lock
+INTERVAL = 300        # Seconds between passes of the in-process sweeper
+
+
+def _sweep_targets(keep_days):
+    now = timezone.now()
+    retention_cutoff = now - timedelta(days=keep_days)
+    return {
+        'expired_assignment_otps': (AssignmentOTP, {'is_used': False, 'expires_at__lte': now}),
+        'used_assignment_otps': (AssignmentOTP, {'is_used': True, 'created_at__lt': retention_cutoff}),
+        'expired_return_otps': (ReturnVerification, {'verified': False, 'expires_at__lte': now}),
+        'verified_return_otps': (ReturnVerification, {'verified': True, 'created_at__lt': retention_cutoff}),
+    }
+
+
+def sweep(batch_size=BATCH_SIZE, keep_days=KEEP_DAYS, pause=PAUSE):
+    """Runs one pass. Returns {"removed": {target: rows}, "seconds": float}."""
+    start = time.perf_counter()
+    removed = {}
+
+    for name, (model, conditions) in _sweep_targets(keep_days).items():
+        removed[name] = 0
+        while True:
+            ids = list(model.objects.filter(**conditions).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Conditions are re-checked: a code redeemed since the SELECT is not touched
+                deleted, _ = model.objects.filter(id__in=ids, **conditions).delete()
+            removed[name] += deleted
+            if len(ids) < batch_size:
+                break
+            time.sleep(pause)
+
+    return {'removed': removed, 'seconds': time.perf_counter() - start}
+
+
+def start_sweeper_thread(interval=INTERVAL, **options):
+    """Starts a daemon thread that runs sweep() every `interval` seconds."""
+    def job():
+        result = sweep(**options)
+        total = sum(result['removed'].values())
+        if total:
+            logger.info("OTP sweep removed %d rows %s in %.2fs", total, result['removed'], result['seconds'])
+
+    return start_periodic_thread('otp-sweeper', job, interval)
@@ -0,0 +1,144 @@
+# core/syncpool.py
+"""
+Bounded thread pools for sync code under ASGI (the experimental asgi_server.py).
+
+Left alone, Django's ASGI handler runs each sync view on a thread of its own,
+and so does the async ORM for each request: a burst of requests starts as many
+threads and database connections, all queued on SQLite's single writer lock.
+Sync views wrapped with sync_view_in_pool() share settings.ASGI_SYNC_THREADS
+threads instead (the same budget as waitress). The read views of
+core/async_views.py and the dashboard stream run on a second pool of
+settings.ASGI_READ_THREADS threads, so slow exports and writes can't take the
+threads the reads need. A request waiting on the database still holds a pool
+thread; the pools only bound how many there are. Pool threads live as long as
+the process, so they keep their connections (CONN_MAX_AGE).
+
+A streaming response (CSV export) is iterated on one pool thread as well, so
+its queryset iterators keep using the same connection; chunks are handed to
+the event loop in batches of about 64 KiB through a small buffer (one thread
+hop per batch, not per CSV row).
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+STREAM_BATCH_BYTES = 64 * 1024  # Chunks are joined up to this size before crossing threads
+STREAM_BUFFER = 8               # Batches a streaming response may produce ahead of the client
+
+_pool = ThreadPoolExecutor(max_workers=settings.ASGI_SYNC_THREADS, thread_name_prefix='sync-view')
+_read_pool = ThreadPoolExecutor(max_workers=settings.ASGI_READ_THREADS, thread_name_prefix='read-view')
+_END = object()
+
+
+def _with_connections(func):
+    # Pool threads don't see request_started/request_finished: apply CONN_MAX_AGE around each call
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return inner
+
+
+def run_in_pool(func, *args, **kwargs):
+    """Awaitable that runs func(*args, **kwargs) on the pool."""
+    return sync_to_async(_with_connections(func), thread_sensitive=False, executor=_pool)(*args, **kwargs)
+
+
+def run_in_read_pool(func, *args, **kwargs):
+    """run_in_pool() on the read pool."""
+    return sync_to_async(_with_connections(func), thread_sensitive=False, executor=_read_pool)(*args, **kwargs)
+
+
+def close_pool_connections():
+    """Closes the connections kept by the pool threads (e.g. before the test database is dropped)."""
+    for pool, size in ((_pool, settings.ASGI_SYNC_THREADS), (_read_pool, settings.ASGI_READ_THREADS)):
+        # Each call waits for the others, so every thread of the pool takes exactly one
+        barrier = threading.Barrier(size)
+
+        def close():
+            connections.close_all()
+            barrier.wait()
+
+        for future in [pool.submit(close) for _ in range(size)]:
+            future.result()
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()  # DRF responses are rendered here, not on a per-request thread
+    return response
+
+
+def sync_view_in_pool(view):
+    """Wraps a sync view into an async one that runs (and renders) it on the pool."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await run_in_pool(_render, view, request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = aiter_in_pool(response.streaming_content)
+        return response
+
+    return wrapper
+
+
+def read_view_in_pool(view):
+    """sync_view_in_pool() on the read pool, for views that don't stream."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_read_pool(_render, view, request, *args, **kwargs)
+
+    return wrapper
+
+
+async def aiter_in_pool(iterator):
+    """Iterates a sync iterator of bytes on one pool thread and yields them, in batches, on the event loop."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+    stopped = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        batch, size = [], 0
+        try:
+            for chunk in iterator:
+                if stopped.is_set():
+                    break
+                batch.append(chunk)
+                size += len(chunk)
+                if size >= STREAM_BATCH_BYTES:
+                    put(b''.join(batch))
+                    batch, size = [], 0
+            if batch and not stopped.is_set():
+                put(b''.join(batch))
+        except Exception as e:
+            put(e)
+        finally:
+            if not stopped.is_set():
+                put(_END)
+
+    producer = asyncio.ensure_future(run_in_pool(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # The client went away (or the stream ended): unblock the producer and let it finish
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
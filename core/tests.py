@@ -1,3 +1,1481 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models.signals import post_save
+from django.http import StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from tab_audit_system import urls
+
+from .models import (
+    AdminAuditLog, ArchivedAssignmentLog, AssignmentLog, AssignmentOTP, ChangeCounter, DailyUsage, DashboardSection, ReturnVerification,
+    TabletDevice, TabTypeDailyRollup, TabType, User, UserDailyRollup,
+)
+from . import async_views, dashboard, fleet, hashers, login, metrics, stream, views
+from .allocation import claim_any_device, claim_device
+from .archive import archive_logs, restore_logs
+from .authentication import CachedJWTAuthentication, bump_users_version, current_users_version, user_cache
+from .batch import batch_assign, batch_initiate_return, batch_verify_return
+from .dashboard import refresh_sections
+from .ingest import ingest_devices, parse_csv
+from .limits import release_daily_slot, reserve_daily_slot
+from .middleware import AdmissionTier
+from .otp import allocate_otp, issue_return_otp
+from .pagination import encode_cursor
+from .receivers import refresh_dashboard_for_model
+from .rollups import rollup_usage
+from .sweeper import sweep
+from .syncpool import close_pool_connections, sync_view_in_pool
+from .versioning import current_data_version
+from .views import possession_logs
+from .writelock import serialized_writes
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    Every hot lookup in core/views.py must be answered from an index.
+    The plans are checked with EXPLAIN, so a dropped or mismatched index fails here.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Test Tab")
+        cls.user = User.objects.create(username="indexer", employee_id="IDX-1")
+        cls.device = TabletDevice.objects.create(tab_type=cls.tab_type, serial_number="IDX-S1", qr_code="QR-IDX-S1")
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would always be seq-scanned; only fail when no index can serve the query
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        elif connection.vendor != 'sqlite':
+            raise unittest.SkipTest(f"No plan checks for {connection.vendor}")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # "SCAN core_x" without "USING ... INDEX" is a full table scan
+            table_scans = [
+                line for line in plan.splitlines()
+                if re.search(r'\bSCAN (TABLE )?core_\w+', line) and 'INDEX' not in line
+            ]
+        else:
+            table_scans = [line for line in plan.splitlines() if 'Seq Scan on core_' in line]
+        self.assertEqual(table_scans, [], f"Table scan in plan:\n{plan}\n\nSQL: {queryset.query}")
+
+    def test_possession_lookup(self):
+        self.assertUsesIndex(AssignmentLog.objects.filter(user=self.user, status='active'))
+
+    def test_user_history(self):
+        self.assertUsesIndex(AssignmentLog.objects.filter(user=self.user).order_by('-issued_at')[:20])
+
+    def test_daily_limit_counter(self):
+        self.assertUsesIndex(DailyUsage.objects.filter(
+            user=self.user, tab_type=self.tab_type, day=timezone.localdate(), count__lt=1
+        ))
+
+    def test_active_log_of_device(self):
+        self.assertUsesIndex(AssignmentLog.objects.filter(device=self.device, status='active'))
+
+    def test_logs_page_keyset_order(self):
+        self.assertUsesIndex(AssignmentLog.objects.filter(
+            issued_at__lt=timezone.now()
+        ).order_by('-issued_at', '-id')[:100])
+
+    def test_dashboard_active_loans(self):
+        self.assertUsesIndex(AssignmentLog.objects.filter(status='active').order_by('-issued_at'))
+
+    def test_return_verification_by_otp(self):
+        self.assertUsesIndex(ReturnVerification.objects.filter(otp_code='123456', verified=False).order_by('-created_at'))
+
+    def test_return_verification_by_device(self):
+        self.assertUsesIndex(ReturnVerification.objects.filter(device=self.device, verified=False))
+
+    def test_pending_returns(self):
+        self.assertUsesIndex(ReturnVerification.objects.filter(verified=False).order_by('-created_at'))
+
+    def test_assignment_otp_redeem(self):
+        self.assertUsesIndex(AssignmentOTP.objects.filter(otp_code='123456', is_used=False))
+
+    def test_live_assignment_otps(self):
+        self.assertUsesIndex(AssignmentOTP.objects.filter(is_used=False, expires_at__gt=timezone.now()))
+
+    def test_available_devices_of_type(self):
+        self.assertUsesIndex(TabletDevice.objects.filter(tab_type=self.tab_type, status='available'))
+
+    def test_audit_trail(self):
+        self.assertUsesIndex(AdminAuditLog.objects.order_by('-timestamp')[:20])
+
+
+class DashboardSnapshotTests(TestCase):
+
+    def setUp(self):
+        # Sections marked dirty by the writes of earlier tests, which never commit
+        dashboard._pending.sections = None
+        dashboard._unmarked.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tab_type = TabType.objects.create(name="Snapshot Tab")
+        refresh_sections()
+
+    def add_device(self, serial):
+        with self.captureOnCommitCallbacks(execute=True):
+            TabletDevice.objects.create(tab_type=self.tab_type, serial_number=serial, qr_code=f"QR-{serial}")
+
+    def test_writes_mark_sections_stale_and_reads_rebuild_them(self):
+        version = current_data_version()
+        self.add_device("SNAP-S1")
+        self.assertGreater(current_data_version(), version)
+        self.assertEqual(DashboardSection.objects.get(name='active_loans').version, dashboard.STALE)
+
+        delta = dashboard.get_dashboard_delta(version)
+        self.assertEqual(delta['sections']['stats']['total'], 1)
+        self.assertNotIn('audit_trails', delta['sections'])
+        self.assertEqual(DashboardSection.objects.get(name='stats').version, delta['version'])
+        self.assertEqual(dashboard.get_dashboard_delta(delta['version'])['sections'], {})
+
+    def test_device_moves_update_the_counts_in_place(self):
+        self.add_device("SNAP-S1")
+        self.add_device("SNAP-S2")
+        device = TabletDevice.objects.get(serial_number="SNAP-S1")
+        with self.captureOnCommitCallbacks(execute=True):
+            device.status = 'repair'
+            device.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            TabletDevice.objects.filter(serial_number="SNAP-S2").delete()
+
+        counters = DashboardSection.objects.filter(name__in=dashboard.COUNTER_SECTIONS)
+        self.assertFalse(counters.filter(version=dashboard.STALE).exists())
+        sections = dict(counters.values_list('name', 'payload'))
+        self.assertEqual(sections['stats'], {'total': 1, 'available': 0, 'assigned': 0, 'repair': 1})
+        self.assertEqual([row['stock_remaining'] for row in sections['stock']], [0])
+
+        # A rolled back move is not counted
+        with transaction.atomic():
+            device.status = 'available'
+            device.save()
+            transaction.set_rollback(True)
+        self.assertEqual(DashboardSection.objects.get(name='stats').payload['repair'], 1)
+
+        # A device loaded without its status has none known before the save: the counts are rebuilt
+        with self.captureOnCommitCallbacks(execute=True):
+            device = TabletDevice.objects.only('serial_number').get(id=device.id)
+            device.status = 'available'
+            device.save()
+        self.assertEqual(DashboardSection.objects.get(name='stats').version, dashboard.STALE)
+        self.assertEqual(dashboard.get_dashboard_snapshot()['stats']['available'], 1)
+
+    def test_counts_stored_after_the_move_are_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TabletDevice.objects.create(tab_type=self.tab_type, serial_number="SNAP-S1", qr_code="QR-SNAP-S1")
+            # A rebuild between the write and its commit may have counted the device already
+            DashboardSection.objects.filter(name='stats').update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(DashboardSection.objects.get(name='stats').version, dashboard.STALE)
+        self.assertEqual(dashboard.get_dashboard_snapshot()['stats']['total'], 1)
+
+    def test_failed_marks_are_retried_with_the_next_write(self):
+        with unittest.mock.patch.object(dashboard, 'mark_stale', side_effect=DatabaseError), self.assertLogs('core.dashboard'):
+            self.add_device("SNAP-S1")
+        self.assertFalse(DashboardSection.objects.filter(version=dashboard.STALE).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AdminAuditLog.objects.create(action_type="Snapshot", description="Next write")
+        stale = set(DashboardSection.objects.filter(version=dashboard.STALE).values_list('name', flat=True))
+        self.assertTrue({'stats', 'audit_trails'} <= stale)
+        self.assertEqual(dashboard.get_dashboard_snapshot()['stats']['total'], 1)
+
+
+class OTPAllocatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="OTP Tab")
+        cls.device = TabletDevice.objects.create(tab_type=cls.tab_type, serial_number="OTP-S1", qr_code="QR-OTP-S1")
+
+    def test_database_rejects_duplicate_live_codes(self):
+        AssignmentOTP.objects.create(tab_type=self.tab_type, otp_code='111111')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AssignmentOTP.objects.create(tab_type=self.tab_type, otp_code='111111')
+
+        ReturnVerification.objects.create(device=self.device, otp_code='222222')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReturnVerification.objects.create(device=self.device, otp_code='222222')
+
+    def test_used_codes_can_be_reissued(self):
+        AssignmentOTP.objects.create(tab_type=self.tab_type, otp_code='333333', is_used=True)
+        AssignmentOTP.objects.create(tab_type=self.tab_type, otp_code='333333')
+
+    def test_one_live_return_code_per_device(self):
+        first = issue_return_otp(self.device)
+        second = issue_return_otp(self.device)
+
+        self.assertEqual(list(ReturnVerification.objects.filter(verified=False).values_list('id', flat=True)), [second.id])
+        self.assertNotEqual(first.id, second.id)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReturnVerification.objects.create(device=self.device, otp_code='666666')
+
+    def test_collision_retries_and_reclaims_expired_codes(self):
+        expired = AssignmentOTP.objects.create(
+            tab_type=self.tab_type, otp_code='444444', expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        codes = iter(['444444', '555555'])
+        with unittest.mock.patch('core.otp.random_code', lambda: next(codes)):
+            otp = allocate_otp(AssignmentOTP, tab_type=self.tab_type)
+
+        self.assertEqual(otp.otp_code, '555555')
+        self.assertFalse(AssignmentOTP.objects.filter(id=expired.id).exists())
+
+
+class OTPAllocatorStressTests(TransactionTestCase):
+    """
+    Allocates tens of thousands of live codes from concurrent workers, with the
+    dashboard receivers connected. On SQLite the test database is a file
+    (settings.py), so the workers contend for its write lock as server threads do.
+    """
+    CODES = 20000
+    WORKERS = 8
+
+    def setUp(self):
+        self.tab_type = TabType.objects.create(name="Stress Tab")
+
+    def test_concurrent_allocation_is_collision_free(self):
+        def allocate(count):
+            try:
+                return [allocate_otp(AssignmentOTP, tab_type=self.tab_type).otp_code for _ in range(count)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            batches = list(pool.map(allocate, [self.CODES // self.WORKERS] * self.WORKERS))
+
+        codes = [code for batch in batches for code in batch]
+        self.assertEqual(len(codes), self.CODES)
+        self.assertEqual(len(set(codes)), self.CODES)
+        self.assertEqual(AssignmentOTP.objects.filter(is_used=False).count(), self.CODES)
+        self.assertEqual(len(dashboard.get_dashboard_snapshot()['active_assignment_otps']), self.CODES)
+
+
+class DeviceAllocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Claim Tab")
+        cls.user = User.objects.create(username="claimer", employee_id="CLM-1")
+        cls.devices = [
+            TabletDevice.objects.create(tab_type=cls.tab_type, serial_number=f"CLM-S{i}", qr_code=f"QR-CLM-S{i}")
+            for i in range(3)
+        ]
+
+    def test_claims_hand_out_distinct_devices_until_exhausted(self):
+        claimed = [claim_any_device(self.tab_type, self.user) for _ in range(3)]
+
+        self.assertEqual({device.id for device in claimed}, {device.id for device in self.devices})
+        self.assertIsNone(claim_any_device(self.tab_type, self.user))
+        self.assertEqual(TabletDevice.objects.filter(assigned_to=self.user, status='assigned').count(), 3)
+
+    def test_scanned_device_cannot_be_claimed_twice(self):
+        stale_copy = TabletDevice.objects.get(id=self.devices[0].id)
+
+        self.assertTrue(claim_device(self.devices[0], self.user))
+        self.assertFalse(claim_device(stale_copy, self.user))
+
+
+@override_settings(SQLITE_SERIALIZE_WRITES=False)
+class DeviceAllocationStressTests(TransactionTestCase):
+    """
+    Checkouts from concurrent threads through /api/assign/. The per-process write lock
+    is off, so on SQLite the requests meet at the database's own write lock, as the
+    requests of several server processes do.
+    """
+    WORKERS = 8
+
+    def setUp(self):
+        self.tab_type = TabType.objects.create(name="Rush Tab", daily_limit_per_user=3)
+        self.devices = TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=self.tab_type, serial_number=f"RSH-S{i}", qr_code=f"QR-RSH-S{i}") for i in range(5)
+        ])
+        self.users = User.objects.bulk_create([User(username=f"rush-{i}", employee_id=f"RSH-{i}") for i in range(12)])
+        refresh_sections()
+
+    def checkout(self, requests):
+        """Runs (user, data) checkouts concurrently; returns the response codes in the same order."""
+        def post(request):
+            user, data = request
+            try:
+                return Client().post('/api/assign/', data, content_type='application/json', headers=headers[user.pk]).status_code
+            finally:
+                connection.close()
+
+        headers = {user.pk: {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"} for user, _ in requests}
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            return list(pool.map(post, requests))
+
+    def assertSlotsMatchLoans(self):
+        loans = Counter(AssignmentLog.objects.filter(status='active').values_list('user_id', flat=True))
+        slots = {user_id: count for user_id, count in DailyUsage.objects.values_list('user_id', 'count') if count}
+        self.assertEqual(slots, dict(loans))
+        stats = dashboard.get_dashboard_snapshot()['stats']
+        self.assertEqual((stats['assigned'], stats['available']), (sum(loans.values()), 5 - sum(loans.values())))
+
+    def test_one_device_has_one_winner(self):
+        codes = self.checkout([(user, {'device_id': "RSH-S0"}) for user in self.users[:self.WORKERS]])
+
+        self.assertEqual(codes.count(201), 1)
+        self.assertEqual(sorted(set(codes)), [201, 400])
+        winner = self.users[codes.index(201)]
+        self.assertEqual(TabletDevice.objects.get(serial_number="RSH-S0").assigned_to_id, winner.pk)
+        self.assertEqual(AssignmentLog.objects.filter(status='active').count(), 1)
+        self.assertSlotsMatchLoans()  # The losers' reservations were rolled back
+
+    def test_a_type_is_handed_out_once_per_device(self):
+        otps = AssignmentOTP.objects.bulk_create([
+            AssignmentOTP(tab_type=self.tab_type, otp_code=f"{700000 + i}", expires_at=timezone.now() + timedelta(hours=1))
+            for i in range(len(self.users))
+        ])
+        codes = self.checkout([(user, {'otp_code': otp.otp_code}) for user, otp in zip(self.users, otps)])
+
+        self.assertEqual(codes.count(201), 5)
+        self.assertEqual(codes.count(400), len(self.users) - 5)  # No devices left
+        held = list(TabletDevice.objects.filter(status='assigned').values_list('assigned_to_id', flat=True))
+        self.assertEqual(sorted(held), sorted(user.pk for user, code in zip(self.users, codes) if code == 201))
+        self.assertEqual(AssignmentOTP.objects.filter(is_used=True).count(), 5)  # The failed claims kept their code
+        self.assertSlotsMatchLoans()
+
+    def test_one_user_never_exceeds_the_daily_limit(self):
+        user = self.users[0]
+        codes = self.checkout([(user, {'device_id': device.serial_number}) for device in self.devices])
+
+        self.assertEqual((codes.count(201), codes.count(400)), (3, 2))
+        self.assertEqual(DailyUsage.objects.get(user=user).count, 3)
+        self.assertSlotsMatchLoans()
+
+
+class DailyLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Limit Tab", daily_limit_per_user=2)
+        cls.user = User.objects.create(username="limited", employee_id="LIM-1")
+        TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=cls.tab_type, serial_number=f"LIM-S{i}", qr_code=f"QR-LIM-S{i}") for i in range(3)
+        ])
+
+    def post(self, path, data):
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        return self.client.post(path, data, content_type='application/json', headers=headers)
+
+    def test_checkouts_past_the_limit_are_rejected(self):
+        for serial in ("LIM-S0", "LIM-S1"):
+            self.assertEqual(self.post('/api/assign/', {'device_id': serial}).status_code, 201)
+
+        response = self.post('/api/assign/', {'device_id': "LIM-S2"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("daily limit", response.json()['error'])
+        self.assertEqual(TabletDevice.objects.get(serial_number="LIM-S2").status, 'available')
+        self.assertEqual(DailyUsage.objects.get(user=self.user, tab_type=self.tab_type).count, 2)
+
+    def test_returned_loans_give_their_slot_back(self):
+        for serial in ("LIM-S0", "LIM-S1"):
+            self.post('/api/assign/', {'device_id': serial})
+        self.assertEqual(self.post('/api/return/initiate/', {'device_id': "LIM-S0"}).status_code, 200)
+        otp = ReturnVerification.objects.get(device__serial_number="LIM-S0", verified=False).otp_code
+        self.assertEqual(self.post('/api/return/verify/', {'device_id': "LIM-S0", 'otp_code': otp}).status_code, 200)
+
+        self.assertEqual(DailyUsage.objects.get(user=self.user, tab_type=self.tab_type).count, 1)
+        self.assertEqual(self.post('/api/assign/', {'device_id': "LIM-S2"}).status_code, 201)
+
+    def test_the_count_restarts_at_local_midnight(self):
+        # Asia/Kolkata is UTC+5:30: its day ends at 18:30 UTC
+        before = datetime(2026, 3, 10, 18, 29, 59, tzinfo=dt_timezone.utc)
+        after = before + timedelta(seconds=1)
+        tab_type = TabType.objects.create(name="One A Day", daily_limit_per_user=1)
+
+        with unittest.mock.patch('django.utils.timezone.now', return_value=before):
+            self.assertTrue(reserve_daily_slot(self.user, tab_type))
+            self.assertFalse(reserve_daily_slot(self.user, tab_type))
+        with unittest.mock.patch('django.utils.timezone.now', return_value=after):
+            self.assertTrue(reserve_daily_slot(self.user, tab_type))
+        self.assertEqual(
+            dict(DailyUsage.objects.filter(user=self.user, tab_type=tab_type).values_list('day', 'count')),
+            {datetime(2026, 3, 10).date(): 1, datetime(2026, 3, 11).date(): 1},
+        )
+
+        # A loan returned after midnight gives back the slot of the day it was issued
+        device = TabletDevice.objects.create(tab_type=tab_type, serial_number="LIM-DAY", qr_code="QR-LIM-DAY")
+        log = AssignmentLog.objects.create(user=self.user, device=device, ip_address='127.0.0.1', device_info='test')
+        log.issued_at = before
+        release_daily_slot(log)
+        self.assertEqual(DailyUsage.objects.get(user=self.user, tab_type=tab_type, day=datetime(2026, 3, 10).date()).count, 0)
+        self.assertEqual(DailyUsage.objects.get(user=self.user, tab_type=tab_type, day=datetime(2026, 3, 11).date()).count, 1)
+
+
+class DeviceIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Ingest Tab")
+        TabletDevice.objects.create(tab_type=cls.tab_type, serial_number="ING-OLD", qr_code="QR-ING-OLD")
+
+    def test_valid_rows_are_imported_and_bad_rows_reported(self):
+        rows = parse_csv(
+            "serial_number,qr_code,tab_type\n"
+            "ING-1,,Ingest Tab\n"
+            "ING-2,QR-CUSTOM,Ingest Tab\n"
+            "ING-1,,Ingest Tab\n"
+            "ING-OLD,,Ingest Tab\n"
+            "ING-3,,Unknown Tab\n"
+            ",,Ingest Tab\n"
+        )
+        result = ingest_devices(rows)
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['row'] for error in result['errors']], [4, 5, 6, 7])
+        self.assertEqual(TabletDevice.objects.get(serial_number="ING-1").qr_code, "QR-ING-1")
+        self.assertEqual(TabletDevice.objects.get(serial_number="ING-2").qr_code, "QR-CUSTOM")
+        self.assertEqual(AdminAuditLog.objects.filter(action_type="Inventory Update").count(), 1)
+
+    def test_unknown_types_can_be_created(self):
+        result = ingest_devices([(1, {"serial_number": "ING-NEW", "tab_type": "Brand New Tab"})], create_types=True)
+
+        self.assertEqual(result['tab_types_created'], ["Brand New Tab"])
+        self.assertTrue(TabletDevice.objects.filter(serial_number="ING-NEW", tab_type__name="Brand New Tab").exists())
+
+
+class BatchCheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Cart Tab", daily_limit_per_user=3)
+        cls.user = User.objects.create(username="kiosk", employee_id="KSK-1")
+        cls.serials = [f"CART-S{i}" for i in range(4)]
+        for serial in cls.serials:
+            TabletDevice.objects.create(tab_type=cls.tab_type, serial_number=serial, qr_code=f"QR-{serial}")
+
+    def test_cart_checkout_and_return(self):
+        results = batch_assign(self.user, self.serials + ["QR-CART-S0", "UNKNOWN"], "127.0.0.1", "test")
+
+        self.assertEqual([r['ok'] for r in results], [True, True, True, False, False, False])
+        self.assertIn("daily limit", results[3]['error'])
+        self.assertEqual(DailyUsage.objects.get(user=self.user).count, 3)
+        self.assertEqual(AssignmentLog.objects.filter(user=self.user, status='active').count(), 3)
+
+        returning = self.serials[:3]
+        self.assertTrue(all(r['ok'] for r in batch_initiate_return(self.user, returning)))
+        codes = dict(ReturnVerification.objects.filter(verified=False).values_list('device__serial_number', 'otp_code'))
+        results = batch_verify_return(self.user, [
+            {"device_id": returning[0], "otp_code": codes[returning[0]]},
+            {"device_id": returning[1], "otp_code": codes[returning[1]], "condition": "Cracked"},
+            {"device_id": returning[2], "otp_code": "000000"},
+        ])
+
+        self.assertEqual([r['ok'] for r in results], [True, True, False])
+        self.assertEqual(TabletDevice.objects.get(serial_number=returning[1]).status, 'repair')
+        self.assertEqual(DailyUsage.objects.get(user=self.user).count, 1)
+        self.assertEqual(AssignmentLog.objects.filter(user=self.user, status='active').count(), 1)
+
+
+class OTPSweeperTests(TestCase):
+
+    def test_sweep_removes_only_dead_codes(self):
+        tab_type = TabType.objects.create(name="Sweep Tab")
+        device = TabletDevice.objects.create(tab_type=tab_type, serial_number="SWP-S1", qr_code="QR-SWP-S1")
+        past, future = timezone.now() - timedelta(minutes=1), timezone.now() + timedelta(hours=1)
+
+        AssignmentOTP.objects.bulk_create(
+            [AssignmentOTP(tab_type=tab_type, otp_code=f"{100000 + i}", expires_at=past) for i in range(5)]
+        )
+        live_otp = AssignmentOTP.objects.create(tab_type=tab_type, otp_code="200000", expires_at=future)
+        ReturnVerification.objects.create(device=device, otp_code="300000", expires_at=past)
+        recent_verified = ReturnVerification.objects.create(device=device, otp_code="300001", expires_at=past, verified=True)
+        old_verified = ReturnVerification.objects.create(device=device, otp_code="300002", expires_at=past, verified=True)
+        ReturnVerification.objects.filter(id=old_verified.id).update(created_at=timezone.now() - timedelta(days=30))
+
+        result = sweep(batch_size=2, pause=0)
+
+        self.assertEqual(result['removed'], {
+            'expired_assignment_otps': 5, 'used_assignment_otps': 0,
+            'expired_return_otps': 1, 'verified_return_otps': 1,
+        })
+        self.assertEqual(list(AssignmentOTP.objects.values_list('id', flat=True)), [live_otp.id])
+        self.assertEqual(list(ReturnVerification.objects.values_list('id', flat=True)), [recent_verified.id])
+
+
+class LogPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tab_a, tab_b = TabType.objects.bulk_create([TabType(name="Page Tab A"), TabType(name="Page Tab B")])
+        ann, bob = User.objects.bulk_create([
+            User(username="ann", employee_id="PAG-1"), User(username="bob", employee_id="PAG-2"),
+        ])
+        cls.admin = User.objects.create(username="page-admin", employee_id="PAG-A", is_staff=True)
+        devices = TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=tab_a if i % 2 else tab_b, serial_number=f"PAG-S{i}", qr_code=f"QR-PAG-S{i}") for i in range(4)
+        ])
+        AssignmentLog.objects.bulk_create([
+            AssignmentLog(user=ann if i % 3 else bob, device=devices[i % 4], status='returned' if i % 2 else 'active',
+                          ip_address='127.0.0.1', device_info='test')
+            for i in range(23)
+        ])
+        # Runs of rows share a timestamp, so pages must break ties on id
+        base = timezone.now() - timedelta(hours=1)
+        for i, pk in enumerate(AssignmentLog.objects.order_by('id').values_list('id', flat=True)):
+            AssignmentLog.objects.filter(id=pk).update(issued_at=base + timedelta(minutes=i // 5))
+
+    def walk(self, query):
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.admin).access_token}"}
+        ids, cursor, pages = [], None, 0
+        while True:
+            path = f"/api/logs/?{query}" + (f"&cursor={cursor}" if cursor else "")
+            response = self.client.get(path, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids += [row['id'] for row in body['results']]
+            cursor, pages = body['next_cursor'], pages + 1
+            if cursor is None:
+                return ids, pages, body['results']
+
+    def test_pages_cover_every_row_once_in_order(self):
+        ids, pages, last = self.walk("limit=4")
+        expected = [str(pk) for pk in AssignmentLog.objects.order_by('-issued_at', '-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 6)
+        self.assertEqual(len(last), 3)
+
+    def test_filters_apply_on_every_page(self):
+        ids, pages, _ = self.walk("limit=2&status=returned&employee=ann&tab_model=Page+Tab+A")
+        expected = AssignmentLog.objects.filter(
+            status='returned', user__username='ann', device__tab_type__name="Page Tab A",
+        ).order_by('-issued_at', '-id').values_list('id', flat=True)
+        self.assertGreater(pages, 1)
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+    def test_a_full_last_page_has_no_next_cursor(self):
+        ids, pages, _ = self.walk("limit=23")
+        self.assertEqual((len(ids), pages), (23, 1))
+        ids, pages, last = self.walk("limit=22")
+        self.assertEqual((len(ids), pages, len(last)), (23, 2, 1))
+
+
+class LogArchiveTests(TestCase):
+
+    def test_archive_and_restore_round_trip(self):
+        tab_type = TabType.objects.create(name="Archive Tab")
+        user = User.objects.create(username="archivist", employee_id="ARC-1")
+        device = TabletDevice.objects.create(tab_type=tab_type, serial_number="ARC-S1", qr_code="QR-ARC-S1")
+        long_ago = timezone.now() - timedelta(days=400)
+
+        old = AssignmentLog.objects.create(user=user, device=device, status='returned', ip_address='127.0.0.1', device_info='test')
+        AssignmentLog.objects.filter(id=old.id).update(issued_at=long_ago, returned_at=long_ago + timedelta(hours=8))
+        recent = AssignmentLog.objects.create(user=user, device=device, status='returned', ip_address='127.0.0.1', device_info='test', returned_at=timezone.now())
+        active = AssignmentLog.objects.create(user=user, device=device, status='active', ip_address='127.0.0.1', device_info='test')
+
+        self.assertEqual(archive_logs(older_than_days=180, batch_size=1), 1)
+        self.assertEqual(set(AssignmentLog.objects.values_list('id', flat=True)), {recent.id, active.id})
+        self.assertEqual(ArchivedAssignmentLog.objects.get().issued_at, long_ago)
+
+        self.assertEqual(restore_logs(long_ago - timedelta(days=1), long_ago + timedelta(days=1)), 1)
+        restored = AssignmentLog.objects.get(id=old.id)
+        self.assertEqual((restored.issued_at, restored.status, restored.user_id), (long_ago, 'returned', user.id))
+        self.assertFalse(ArchivedAssignmentLog.objects.exists())
+
+
+class UsageExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = datetime(2026, 3, 10).date()
+        tab_type = TabType.objects.create(name="Export Tab")
+        cls.admin = User.objects.create(username="export-admin", employee_id="EXP-A", is_staff=True)
+        user = User.objects.create(username="exporter", employee_id="EXP-1")
+        devices = TabletDevice.objects.bulk_create([
+            TabletDevice(tab_type=tab_type, serial_number=f"EXP-S{i}", qr_code=f"QR-EXP-S{i}") for i in range(6)
+        ])
+
+        def at(days, hour, minute=0, second=0):
+            return timezone.make_aware(datetime.combine(cls.day + timedelta(days=days), time(hour, minute, second)))
+
+        # (device, issued, returned); the range tests ask for cls.day alone
+        live = [
+            (0, at(0, 9), at(0, 17)),
+            (1, at(0, 23, 59, 30), None),
+            (2, at(1, 0, 0, 10), at(1, 8)),    # The next local day
+            (3, at(-1, 22), at(0, 0, 30)),     # Issued the day before, returned that day
+        ]
+        for i, issued, returned in live:
+            log = AssignmentLog.objects.create(
+                user=user, device=devices[i], status='returned' if returned else 'active', returned_at=returned,
+                ip_address='127.0.0.1', device_info='test',
+            )
+            AssignmentLog.objects.filter(id=log.id).update(issued_at=issued)
+        ArchivedAssignmentLog.objects.bulk_create([
+            ArchivedAssignmentLog(user=user, device=devices[i], issued_at=issued, returned_at=returned, status='returned',
+                                  ip_address='127.0.0.1', device_info='test')
+            for i, issued, returned in [(4, at(0, 12), at(0, 13)), (5, at(-5, 10), at(-4, 10))]
+        ])
+
+    def export(self, query=''):
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.admin).access_token}"}
+        response = self.client.get(f'/api/admin/export-csv/?{query}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    @staticmethod
+    def events(body):
+        header, *rows = csv.reader(io.StringIO(body.decode()))
+        return [(row[0], row[1], row[4]) for row in rows]
+
+    def test_live_and_archived_events_are_merged_newest_first(self):
+        live = self.events(self.export()[1])
+        merged = self.events(self.export('archive=1')[1])
+        self.assertEqual((len(live), len(merged)), (7, 11))
+        self.assertTrue(set(live) <= set(merged))
+        self.assertEqual([timestamp for _, timestamp, _ in merged], sorted((timestamp for _, timestamp, _ in merged), reverse=True))
+
+    def test_date_range_covers_whole_local_days(self):
+        day = self.day.isoformat()
+        self.assertEqual(self.events(self.export(f'archive=1&date_from={day}&date_to={day}')[1]), [
+            ('Checked Out', f'{day} 23:59:30', 'EXP-S1'),
+            ('Returned', f'{day} 17:00:00', 'EXP-S0'),
+            ('Returned', f'{day} 13:00:00', 'EXP-S4'),
+            ('Checked Out', f'{day} 12:00:00', 'EXP-S4'),
+            ('Checked Out', f'{day} 09:00:00', 'EXP-S0'),
+            ('Returned', f'{day} 00:30:00', 'EXP-S3'),
+        ])
+        response = self.client.get('/api/admin/export-csv/?date_from=10-03-2026',
+                                   headers={'Authorization': f"Bearer {RefreshToken.for_user(self.admin).access_token}"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip_variant_is_the_same_csv(self):
+        plain_response, plain = self.export('archive=1')
+        response, body = self.export('archive=1&gzip=1')
+        self.assertEqual(plain_response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        # A .csv.gz download, not a transfer encoding: clients must keep the bytes compressed
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('warehouse_event_logs.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        log = AssignmentLog.objects.first()
+        AssignmentLog.objects.bulk_create([
+            AssignmentLog(user_id=log.user_id, device_id=log.device_id, status='returned', returned_at=timezone.now(),
+                          ip_address='127.0.0.1', device_info='bulk')
+            for _ in range(40)
+        ])
+        # Several DB chunks per stream; the 4 streams (live and archived checkouts and returns) are one query each
+        with unittest.mock.patch.object(views, 'EXPORT_CHUNK_SIZE', 7), CaptureQueriesContext(connection) as queries:
+            _, body = self.export('archive=1')
+        self.assertEqual(len(self.events(body)), 11 + 80)
+        self.assertLessEqual(len(queries), 5)
+
+
+class UsageRollupTests(TestCase):
+
+    def test_daily_metrics(self):
+        tab_type = TabType.objects.create(name="Rollup Tab")
+        users = [User.objects.create(username=f"roller{i}", employee_id=f"ROL-{i}") for i in range(2)]
+        device = TabletDevice.objects.create(tab_type=tab_type, serial_number="ROL-S1", qr_code="QR-ROL-S1")
+        day = timezone.localdate() - timedelta(days=1)
+        nine = timezone.make_aware(datetime.combine(day, time(9)))
+
+        def loan(user, start_hour, end_hour, status='returned', notes=None):
+            log = AssignmentLog.objects.create(user=user, device=device, status=status, notes=notes, ip_address='127.0.0.1', device_info='test')
+            returned_at = nine + timedelta(hours=end_hour) if end_hour is not None else None
+            AssignmentLog.objects.filter(id=log.id).update(issued_at=nine + timedelta(hours=start_hour), returned_at=returned_at)
+
+        loan(users[0], 0, 1)                                # 09:00-10:00 returned
+        loan(users[0], 0, 3, notes="Force returned by Admin")  # 09:00-12:00 force return
+        loan(users[1], 0.5, 2, status='transferred')        # 09:30-11:00 transferred
+        loan(users[1], 2, None, status='active')            # 11:00- still open
+
+        rollup_usage(since=day)
+
+        stats = TabTypeDailyRollup.objects.get(tab_type=tab_type, day=day)
+        self.assertEqual(
+            (stats.checkouts, stats.returns, stats.transfers, stats.force_returns, stats.peak_concurrent),
+            (4, 1, 1, 1, 3),
+        )
+        self.assertEqual(stats.mean_loan_seconds, (1 + 3 + 1.5) * 3600 / 3)
+        self.assertEqual(stats.p95_loan_seconds, 3 * 3600)
+        self.assertEqual(UserDailyRollup.objects.get(user=users[1], day=day).peak_concurrent, 1)
+        # The open loan keeps counting as open on the following day
+        self.assertEqual(TabTypeDailyRollup.objects.get(tab_type=tab_type, day=day + timedelta(days=1)).peak_concurrent, 1)
+
+        # Nothing changed since: the rows and the data version (the ETags) stay as they are
+        version = current_data_version()
+        rollup_usage(since=day)
+        self.assertEqual(current_data_version(), version)
+        self.assertEqual(TabTypeDailyRollup.objects.get(tab_type=tab_type, day=day).pk, stats.pk)
+
+    def test_analytics_rejects_invalid_dates(self):
+        admin = User.objects.create(username="rollup-admin", employee_id="ROL-A", is_staff=True)
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(admin).access_token}"}
+        for query in ('date_from=2024-02-30', 'date_to=2024-13-45', 'date_to=yesterday'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/admin/analytics/?{query}', headers=headers)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Dates must be YYYY-MM-DD."})
+
+    def test_analytics_etag_moves_at_midnight(self):
+        admin = User.objects.create(username="analytics-etag", employee_id="RU-E", is_staff=True)
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(admin).access_token}"}
+        etag = self.client.get('/api/admin/analytics/', headers=headers)['ETag']
+        self.assertEqual(self.client.get('/api/admin/analytics/', headers={**headers, 'If-None-Match': etag}).status_code, 304)
+
+        # The default window is the last 30 days: it has moved on, though nothing was written
+        with unittest.mock.patch.object(timezone, 'localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            response = self.client.get('/api/admin/analytics/', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class FleetConcurrencyTests(TestCase):
+
+    def setUp(self):
+        tab_type = TabType.objects.create(name="Fleet Tab")
+        user = User.objects.create(username="fleet", employee_id="FLT-1")
+        devices = [TabletDevice.objects.create(tab_type=tab_type, serial_number=f"FLT-S{i}", qr_code=f"QR-FLT-S{i}") for i in range(2)]
+        self.day = timezone.localdate() - timedelta(days=1)
+        nine = timezone.make_aware(datetime.combine(self.day, time(9)))
+
+        for device, start, end in ((devices[0], 0, 2), (devices[1], 1, None)):  # 09-11 and 10-open
+            log = AssignmentLog.objects.create(user=user, device=device, ip_address='127.0.0.1', device_info='test',
+                                               status='returned' if end else 'active')
+            AssignmentLog.objects.filter(id=log.id).update(
+                issued_at=nine + timedelta(hours=start), returned_at=nine + timedelta(hours=end) if end else None
+            )
+
+    def test_timeline_and_heatmap(self):
+        result = fleet.fleet_concurrency(self.day, self.day)
+        self.assertEqual(result['engine'], 'numpy')
+
+        on_loan = [(slot['peak_on_loan'], slot['mean_on_loan']) for slot in result['timeline'][8:12]]
+        self.assertEqual(on_loan, [(0, 0.0), (1, 1.0), (2, 2.0), (1, 1.0)])
+        self.assertEqual(result['heatmap']['utilisation'][self.day.weekday()][10], 1.0)
+
+        daily = fleet.fleet_concurrency(self.day, self.day, bucket='day')['timeline']
+        self.assertEqual((daily[0]['peak_on_loan'], daily[0]['mean_on_loan']), (2, round((2 + 14) / 24, 3)))
+
+    def test_open_loans_end_now(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        result = fleet.fleet_concurrency(tomorrow, tomorrow)
+
+        self.assertEqual({(slot['peak_on_loan'], slot['mean_on_loan']) for slot in result['timeline']}, {(0, 0.0)})
+        self.assertEqual(result['heatmap']['utilisation'][tomorrow.weekday()][10], 0.0)
+
+    def test_view_rejects_invalid_dates(self):
+        admin = User.objects.create(username="fleet-admin", employee_id="FLT-A", is_staff=True)
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(admin).access_token}"}
+        for query in ('date_to=2024-13-45', 'date_from=2024-02-30', 'date_to=yesterday'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/admin/fleet/concurrency/?{query}', headers=headers)
+                self.assertEqual(response.status_code, 400)
+
+    def test_ranges_reaching_today_are_not_cached(self):
+        admin = User.objects.create(username="fleet-etag", employee_id="FLT-E", is_staff=True)
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(admin).access_token}"}
+
+        past = f'/api/admin/fleet/concurrency/?date_from={self.day}&date_to={self.day}'
+        etag = self.client.get(past, headers=headers)['ETag']
+        self.assertEqual(self.client.get(past, headers={**headers, 'If-None-Match': etag}).status_code, 304)
+
+        # The open loan keeps running: the body changes with the clock, without a write
+        for path in ('/api/admin/fleet/concurrency/', f'/api/admin/fleet/concurrency/?date_from={self.day}'):
+            with self.subTest(path=path):
+                response = self.client.get(path, headers={**headers, 'If-None-Match': '*'})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+
+    def test_python_fallback_matches_numpy(self):
+        with_numpy = fleet.fleet_concurrency(self.day, self.day + timedelta(days=1))
+        with unittest.mock.patch.object(fleet, 'np', None):
+            without_numpy = fleet.fleet_concurrency(self.day, self.day + timedelta(days=1))
+
+        self.assertEqual(with_numpy['timeline'], without_numpy['timeline'])
+        self.assertEqual(with_numpy['heatmap'], without_numpy['heatmap'])
+
+
+class ConditionalReadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tab_type = TabType.objects.create(name="Tag Tab", daily_limit_per_user=2)
+        TabletDevice.objects.create(tab_type=cls.tab_type, serial_number="TAG-S1", qr_code="QR-TAG-S1")
+        cls.users = [User.objects.create(username=f"tag-{i}", employee_id=f"TAG-{i}") for i in range(2)]
+
+    def headers(self, user):
+        return {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def test_matching_etag_gets_304(self):
+        headers = self.headers(self.users[0])
+        response = self.client.get('/api/check-in/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):  # The data version; the handler doesn't run
+            cached = self.client.get('/api/check-in/', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual((cached['ETag'], cached['Cache-Control']), (etag, 'private, no-cache'))
+
+        stale = self.client.get('/api/check-in/', headers={**headers, 'If-None-Match': '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['ETag'], etag)
+
+    def test_a_write_changes_the_etag(self):
+        headers = self.headers(self.users[0])
+        etags = {path: self.client.get(path, headers=headers)['ETag'] for path in ('/api/check-in/', '/api/possession/')}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/assign/', {'device_id': "TAG-S1"}, content_type='application/json', headers=headers)
+
+        for path, etag in etags.items():
+            with self.subTest(path=path):
+                response = self.client.get(path, headers={**headers, 'If-None-Match': etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['device__serial_number'], "TAG-S1")
+
+    def test_per_user_etags_are_not_shared(self):
+        first, second = (self.headers(user) for user in self.users)
+        etag = self.client.get('/api/possession/', headers=first)['ETag']
+
+        response = self.client.get('/api/possession/', headers={**second, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/possession/', headers={**first, 'If-None-Match': etag}).status_code, 304)
+
+        # The device list is the same for everyone, so its tag is shared
+        etag = self.client.get('/api/check-in/', headers=first)['ETag']
+        self.assertEqual(self.client.get('/api/check-in/', headers={**second, 'If-None-Match': etag}).status_code, 304)
+
+
+class AsyncServingTests(TransactionTestCase):
+    """
+    The ASGI read views run on the read pool, whose threads have connections of
+    their own: the fixtures are committed, and those connections closed at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(close_pool_connections)
+
+    def setUp(self):
+        tab_type = TabType.objects.create(name="Async Tab")
+        device = TabletDevice.objects.create(tab_type=tab_type, serial_number="ASY-S1", qr_code="QR-ASY-S1")
+        self.user = User.objects.create(username="async", employee_id="ASY-1")
+        self.admin = User.objects.create(username="async-admin", employee_id="ASY-2", is_staff=True)
+        AssignmentLog.objects.create(user=self.user, device=device, ip_address='127.0.0.1', device_info='test', notes='Issued')
+        refresh_sections()  # The first dashboard read would build them and move the data version
+
+    @staticmethod
+    def _headers(user):
+        return {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"} if user else {}
+
+    async def test_async_views_answer_like_the_drf_views(self):
+        cases = [
+            ('/api/possession/', self.user, async_views.user_possession),
+            ('/api/user/history/', self.user, async_views.user_history),
+            ('/api/admin/dashboard/', self.admin, async_views.admin_dashboard),
+            ('/api/logs/?limit=1', self.admin, async_views.all_assignment_logs),
+            ('/api/logs/?cursor=bogus', self.admin, async_views.all_assignment_logs),
+            (f'/api/logs/?cursor={encode_cursor(timezone.now(), "bogus")}', self.admin, async_views.all_assignment_logs),
+            ('/api/admin/dashboard/', self.user, async_views.admin_dashboard),
+            ('/api/possession/', None, async_views.user_possession),
+        ]
+        for path, user, view in cases:
+            with self.subTest(path=path, user=user and user.username):
+                headers = self._headers(user)
+                wsgi = await sync_to_async(self.client.get)(path, headers=headers)
+                asgi = await self.async_client.get(path, headers=headers)
+
+                self.assertIs(asgi.resolver_match.func, view)
+                self.assertEqual((asgi.status_code, asgi.content), (wsgi.status_code, wsgi.content))
+                self.assertEqual(asgi.get('ETag'), wsgi.get('ETag'))
+
+                if wsgi.status_code == 200:
+                    cached = await self.async_client.get(path, headers={**headers, 'If-None-Match': wsgi['ETag']})
+                    self.assertEqual(cached.status_code, 304)
+
+    async def test_read_views_run_on_the_read_pool(self):
+        seen = []
+
+        def possession(user):
+            seen.append((threading.current_thread().name, id(connection.connection)))
+            return possession_logs(user)
+
+        with unittest.mock.patch.object(async_views, 'possession_logs', possession):
+            for _ in range(6):
+                response = await self.async_client.get('/api/possession/', headers=self._headers(self.user))
+                self.assertEqual(response.status_code, 200)
+
+        threads = {name for name, _ in seen}
+        self.assertTrue(all(name.startswith('read-view') for name in threads))
+        self.assertEqual(len(set(seen)), len(threads))  # Each thread kept its connection
+
+    async def test_async_views_count_their_queries(self):
+        metrics.registry.reset()
+        response = await self.async_client.get('/api/possession/', headers=self._headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(metrics.registry.snapshot()['user-possession GET']['queries_sum'], 0)
+
+    async def test_sync_views_run_on_the_pool(self):
+        def view(request):
+            return StreamingHttpResponse(threading.current_thread().name.encode() for _ in range(3))
+
+        response = await sync_view_in_pool(view)(RequestFactory().get('/'))
+        body = b''.join([chunk async for chunk in response])
+        self.assertEqual(body.count(b'sync-view'), 3)
+
+
+@unittest.mock.patch.object(stream, 'POLL_INTERVAL', 0.01)
+class DashboardStreamTests(TransactionTestCase):
+    """The stream's checks run on the read pool, so the fixtures are committed (see AsyncServingTests)."""
+    PATH = '/api/admin/dashboard/stream/'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(close_pool_connections)
+
+    def setUp(self):
+        self.tab_type = TabType.objects.create(name="Stream Tab")
+        self.admin = User.objects.create(username="stream-admin", employee_id="STR-1", is_staff=True)
+        self.headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.admin).access_token}"}
+        refresh_sections()
+        self.version = current_data_version()
+
+    @staticmethod
+    def parse(event):
+        fields = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+        return fields, json.loads(fields['data'])
+
+    def test_events_carry_the_cursor_and_reconnect_delay(self):
+        response = self.client.get(self.PATH, headers=self.headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        fields, delta = self.parse(response.content.decode())
+        self.assertEqual(fields['event'], 'delta')
+        self.assertEqual(fields['retry'], str(stream.RECONNECT_DELAY_MS))
+        self.assertEqual(int(fields['id']), delta['version'])
+        self.assertEqual(delta['version'], self.version)
+        self.assertEqual(set(delta['sections']), set(dashboard.SECTION_BUILDERS))  # No cursor: everything
+
+    def test_wsgi_sends_the_changes_since_the_cursor_and_closes(self):
+        response = self.client.get(f'{self.PATH}?since={self.version}', headers=self.headers)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content.decode().count('event: delta'), 1)
+        self.assertEqual(self.parse(response.content.decode())[1], {'version': self.version, 'sections': {}})
+
+        AdminAuditLog.objects.create(admin=self.admin, action_type="Stream", description="A write")
+        for headers in ({'Last-Event-ID': str(self.version)}, {}):
+            path = self.PATH if headers else f'{self.PATH}?since={self.version}'
+            with self.subTest(headers=headers):
+                _, delta = self.parse(self.client.get(path, headers={**self.headers, **headers}).content.decode())
+                self.assertGreater(delta['version'], self.version)
+                self.assertEqual(list(delta['sections']), ['audit_trails'])
+                self.assertEqual(delta['sections']['audit_trails'][0]['description'], "A write")
+
+    def test_unusable_cursors_get_the_full_dashboard(self):
+        for since in ('bogus', '-3', str(self.version + 1000)):
+            with self.subTest(since=since):
+                response = self.client.get(f'{self.PATH}?since={since}', headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(set(self.parse(response.content.decode())[1]['sections']), set(dashboard.SECTION_BUILDERS))
+
+    def test_admins_only(self):
+        user = User.objects.create(username="stream-user", employee_id="STR-2")
+        for headers in ({}, {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.client.get(self.PATH, headers=headers).status_code, 401)
+
+    async def test_asgi_pushes_each_change_once(self):
+        response = await self.async_client.get(f'{self.PATH}?since={self.version}', headers=self.headers)
+        self.assertTrue(response.streaming)
+        events = aiter(response.streaming_content)
+        try:
+            # The first event confirms the cursor; nothing changed since
+            _, delta = self.parse((await anext(events)).decode())
+            self.assertEqual(delta, {'version': self.version, 'sections': {}})
+
+            await sync_to_async(AdminAuditLog.objects.create)(admin=self.admin, action_type="Stream", description="Pushed")
+            _, delta = self.parse((await asyncio.wait_for(anext(events), 5)).decode())
+            self.assertEqual(list(delta['sections']), ['audit_trails'])
+
+            # Unchanged checks send nothing, so the next event is the next change
+            await asyncio.sleep(0.05)
+            await sync_to_async(TabletDevice.objects.create)(tab_type=self.tab_type, serial_number="STR-S1", qr_code="QR-STR-S1")
+            _, latest = self.parse((await asyncio.wait_for(anext(events), 5)).decode())
+            self.assertGreater(latest['version'], delta['version'])
+            self.assertEqual(set(latest['sections']), set(dashboard.SECTIONS_BY_MODEL[TabletDevice]))
+        finally:
+            await events.aclose()
+
+
+class SQLiteWriteProfileTests(TestCase):
+
+    def test_writes_are_serialized(self):
+        if connection.vendor != 'sqlite':
+            raise unittest.SkipTest("Writes are only serialized on SQLite")
+        running, overlaps = [], []
+
+        @serialized_writes
+        def write():
+            running.append(1)
+            overlaps.append(len(running))
+            threading.Event().wait(0.02)
+            running.pop()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: write(), range(8)))
+        self.assertEqual(max(overlaps), 1)
+
+        overlaps.clear()
+        with override_settings(SQLITE_SERIALIZE_WRITES=False), ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: write(), range(8)))
+        self.assertGreater(max(overlaps), 1)
+
+    def test_verify_return_is_one_transaction(self):
+        tab_type = TabType.objects.create(name="Profile Tab")
+        user = User.objects.create(username="profile", employee_id="PRF-1")
+        device = TabletDevice.objects.create(
+            tab_type=tab_type, serial_number="PRF-S1", qr_code="QR-PRF-S1", status='return_pending', assigned_to=user,
+        )
+        AssignmentLog.objects.create(user=user, device=device, ip_address='127.0.0.1', device_info='test')
+        rv = issue_return_otp(device)
+
+        client = Client(raise_request_exception=False)
+        with unittest.mock.patch('core.views.release_daily_slot', side_effect=RuntimeError):
+            response = client.post(
+                '/api/return/verify/', {'device_id': 'PRF-S1', 'otp_code': rv.otp_code},
+                content_type='application/json', headers={'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"},
+            )
+
+        # A failure at the last step leaves nothing half-returned
+        self.assertEqual(response.status_code, 500)
+        rv.refresh_from_db()
+        device.refresh_from_db()
+        self.assertFalse(rv.verified)
+        self.assertEqual((device.status, device.assigned_to), ('return_pending', user))
+        self.assertTrue(AssignmentLog.objects.filter(device=device, status='active').exists())
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create(username="cached", employee_id="JWT-1")
+        token = RefreshToken.for_user(self.user).access_token
+        self.request = RequestFactory().get('/api/possession/', headers={'Authorization': f"Bearer {token}"})
+
+    def authenticate(self):
+        return CachedJWTAuthentication().authenticate(self.request)[0]
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            first = self.authenticate()
+        with self.assertNumQueries(0):
+            second = self.authenticate()
+        self.assertEqual(second, self.user)
+        self.assertIsNot(second, first)  # Each request gets its own instance
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.authenticate()
+        self.user.role = 'admin'
+        self.user.save()
+        self.assertEqual(self.authenticate().role, 'admin')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_other_processes_see_the_change(self):
+        self.authenticate()
+        # The row changed and the version moved, but this process received no signal (another one saved it)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with unittest.mock.patch.object(post_save, 'send'):
+            bump_users_version()
+        # Seen at the next check of the version, not on every request
+        with self.assertNumQueries(0):
+            self.assertTrue(self.authenticate().is_active)
+        with override_settings(JWT_USER_CACHE_CHECK_INTERVAL=0), self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_logins_keep_the_cached_users(self):
+        self.authenticate()
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.user.password = make_password('rehashed')
+        self.user.save(update_fields=['password'])
+        with override_settings(JWT_USER_CACHE_CHECK_INTERVAL=0), self.assertNumQueries(1):
+            self.authenticate()  # The version check finds nothing moved
+
+    def test_entries_expire_and_the_cache_is_bounded(self):
+        with override_settings(JWT_USER_CACHE_TTL=0):
+            self.authenticate()
+            with self.assertNumQueries(1):
+                self.authenticate()
+
+        with override_settings(JWT_USER_CACHE_SIZE=1):
+            self.authenticate()
+            other = User.objects.create(username="cached-2", employee_id="JWT-2")
+            user_cache.put(other.pk, other, current_users_version())
+            self.assertIsNone(user_cache.get(self.user.pk))
+            self.assertEqual(user_cache.get(other.pk), other)
+
+
+@override_settings(LOGIN_HASH_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class LoginPipelineTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="login", employee_id="LOG-1")
+
+    def login(self, password):
+        return self.client.post('/api/token/', {'employee_id': 'LOG-1', 'password': password}, content_type='application/json')
+
+    def test_login_upgrades_outdated_hashes(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.user.set_password('s3cret-pass')
+        self.user.save()
+
+        self.assertEqual(self.login('wrong').status_code, 401)
+        response = self.login('s3cret-pass')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['employee_id'], 'LOG-1')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(check_password('s3cret-pass', self.user.password))
+
+    def test_busy_logins_get_429(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with unittest.mock.patch.object(login, '_slots', slots):
+            response = self.login('s3cret-pass')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_hashing_runs_in_the_pool(self):
+        if multiprocessing.current_process().daemon:
+            raise unittest.SkipTest("A parallel test worker can't start processes")
+        with override_settings(LOGIN_HASH_WORKERS=1):
+            encoded = login.run_hasher(hashers.make_password, 'pooled-pass')
+        self.assertTrue(check_password('pooled-pass', encoded))
+
+
+@override_settings(ADMISSION_TIERS={'normal': (0, 0, 1), 'low': (1, 0, 5)})
+class PriorityAdmissionTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username="admission", employee_id="ADM-1", is_staff=True)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {RefreshToken.for_user(self.admin).access_token}"
+
+    def test_full_tiers_shed_but_critical_routes_pass(self):
+        response = self.client.get('/api/possession/')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+        # Critical: never capped (400: no such OTP)
+        response = self.client.post('/api/return/verify/', {'device_id': 'X', 'otp_code': '000000'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ADMISSION_TIERS={'normal': (0, 0, 1), 'low': (0, 0, 5)})
+    def test_check_in_is_only_critical_for_writes(self):
+        response = self.client.get('/api/check-in/')  # Lists every device
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '5'))
+
+        response = self.client.post('/api/check-in/', {'tab_id': '00000000-0000-0000-0000-000000000000'}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_holds_its_slot_until_streamed(self):
+        export = self.client.get('/api/admin/export-csv/')
+        self.assertEqual(export.status_code, 200)
+
+        response = self.client.get('/api/logs/')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '5'))
+
+        b''.join(export.streaming_content)
+        self.assertEqual(self.client.get('/api/logs/').status_code, 200)
+
+    async def test_async_requests_queue_for_a_slot(self):
+        tier = AdmissionTier('low', limit=1, queue=1, wait=5)
+        self.assertTrue(await tier.aenter())
+
+        queued = asyncio.ensure_future(tier.aenter())
+        await asyncio.sleep(0)
+        self.assertFalse(await tier.aenter())  # The line is full
+        tier.leave()
+        self.assertTrue(await queued)
+        self.assertEqual(tier.active, 1)
+
+        tier.wait = 0.01
+        self.assertFalse(await tier.aenter())  # Gave up waiting
+        tier.leave()
+        self.assertEqual(tier.active, 0)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.admin = User.objects.create(username="metrics", employee_id="MET-1", is_staff=True)
+        self.headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.admin).access_token}"}
+
+    def scrape(self):
+        response = self.client.get('/api/admin/metrics/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_recorded_by_route(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/possession/', headers=self.headers).status_code, 200)
+        response = self.client.post('/api/return/verify/', {}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+        body = self.scrape()
+        self.assertIn('tab_audit_http_requests_total{view="user-possession",method="GET",status="200"} 2', body)
+        self.assertIn('tab_audit_http_requests_total{view="return-verify",method="POST",status="400"} 1', body)
+        self.assertIn('tab_audit_http_request_duration_seconds_count{view="user-possession",method="GET"} 2', body)
+        self.assertIn('tab_audit_http_response_bytes_bucket{view="user-possession",method="GET",le="+Inf"} 2', body)
+        queries = re.search(r'tab_audit_http_db_queries_sum\{view="user-possession",method="GET"\} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_streamed_export_is_measured_to_its_last_row(self):
+        export = self.client.get('/api/admin/export-csv/', headers=self.headers)
+        self.assertNotIn('export_usage_csv GET', metrics.registry.snapshot())  # Not sent yet
+        body = b''.join(export.streaming_content)  # The client closes it once consumed
+
+        series = metrics.registry.snapshot()['export_usage_csv GET']
+        self.assertEqual((series['responses'], series['size_sum']), ({'200': 1}, len(body)))
+        self.assertGreater(series['queries_sum'], 0)
+
+    def test_admin_only(self):
+        user = User.objects.create(username="metrics-user", employee_id="MET-2")
+        headers = {'Authorization': f"Bearer {RefreshToken.for_user(user).access_token}"}
+        self.assertEqual(self.client.get('/api/admin/metrics/', headers=headers).status_code, 403)
+        self.assertEqual(self.client.get('/api/admin/metrics/').status_code, 401)
+
+    def test_processes_add_up_and_exited_ones_are_archived(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.get('/api/possession/', headers=self.headers)
+            other = {'series': metrics.registry.snapshot()}
+            exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+            live_file, exited_file = f'{os.getppid()}-live.json', f'{exited.stdout.strip()}-gone.json'
+            metrics._write(os.path.join(directory, live_file), other)
+            metrics._write(os.path.join(directory, exited_file), other)
+            metrics.registry.flush()  # This process's own file is not counted on top of its counters
+
+            for _ in range(2):
+                self.assertEqual(metrics.collect()['user-possession GET']['responses'], {'200': 3})
+                self.assertEqual(
+                    sorted(os.listdir(directory)), sorted([metrics.ARCHIVE, live_file, metrics.registry.filename]),
+                )
+
+
+@override_settings(LOGIN_HASH_WORKERS=0, PASSWORD_HASH_ITERATIONS=1000)
+class QueryBudgetTests(TestCase):
+    """
+    SQL queries per request of every /api/ endpoint, against ROWS devices, loans,
+    archived loans, users, rollups and audit entries. The budgets are the same at every
+    size (LargeQueryBudgetTests), so a query per row (N+1) fails here. A request is
+    measured with a cold user cache and includes the dashboard update its commit triggers.
+    """
+    ROWS = 10
+    PASSWORD = 'budget-pass-123'
+
+    # (URL name, most queries, method, path, as, data, expected status). Writes include marking the
+    # dashboard sections they change stale (core/dashboard.py): 5 queries, however many sections.
+    # Device moves add 2 to adjust the stored counts, or 6 when they follow other marks (a second commit hook).
+    CASES = [
+        ('token_obtain_pair', 1, 'post', '/api/token/', None, {'employee_id': 'BUD-U', 'password': PASSWORD}, 200),
+        ('token_refresh', 1, 'post', '/api/token/refresh/', None, 'refresh', 200),
+        ('user-possession', 3, 'get', '/api/possession/', 'user', None, 200),
+        ('user-history', 3, 'get', '/api/user/history/', 'user', None, 200),
+        ('tab-check-in', 3, 'get', '/api/check-in/', 'user', None, 200),
+        ('tab-check-in', 5, 'post', '/api/check-in/', 'user', {'tab_id': '00000000-0000-0000-0000-000000000000'}, 404),
+        ('transfer-initiate', 13, 'post', '/api/transfer/initiate/', 'user', {'device_id': 'BUD-HELD-1'}, 200),
+        ('transfer-accept', 24, 'post', '/api/transfer/accept/', 'user', {'otp_code': '900003'}, 200),
+        ('admin-dashboard', 4, 'get', '/api/admin/dashboard/', 'admin', None, 200),
+        ('admin-dashboard-stream', 3, 'get', '/api/admin/dashboard/stream/', 'admin', None, 200),
+        ('export_usage_csv', 5, 'get', '/api/admin/export-csv/?archive=1', 'admin', None, 200),
+        ('import-devices', 15, 'post', '/api/admin/devices/import/', 'admin',
+         {'devices': [{'serial_number': 'BUD-NEW-1', 'tab_type': 'Budget Tab 0'},
+                      {'serial_number': 'BUD-NEW-2', 'tab_type': 'Budget Tab 1'}]}, 201),
+        ('usage-analytics', 3, 'get', '/api/admin/analytics/', 'admin', None, 200),
+        ('usage-analytics', 3, 'get', '/api/admin/analytics/?scope=user&employee=BUD', 'admin', None, 200),
+        ('fleet-concurrency', 5, 'get', '/api/admin/fleet/concurrency/', 'admin', None, 200),
+        ('metrics', 1, 'get', '/api/admin/metrics/', 'admin', None, 200),
+        ('all-logs', 3, 'get', '/api/logs/', 'admin', None, 200),
+        ('all-logs', 3, 'get', '/api/logs/?employee=BUD-U&status=returned', 'admin', None, 200),
+        ('all-logs', 3, 'get', '/api/logs/?archive=1', 'admin', None, 200),
+        ('assign-tablet', 18, 'post', '/api/assign/', 'user', {'device_id': 'BUD-FREE-1'}, 201),
+        ('assign-tablet', 24, 'post', '/api/assign/', 'user', {'otp_code': '900004'}, 201),
+        ('generate-assign-otp', 11, 'post', '/api/assign/generate-otp/', 'admin', 'tab_type', 200),
+        ('return-initiate', 22, 'post', '/api/return/initiate/', 'user', {'device_id': 'BUD-HELD-1'}, 200),
+        ('return-verify', 22, 'post', '/api/return/verify/', 'user', {'device_id': 'BUD-PEND-1', 'otp_code': '900001'}, 200),
+        ('assign-batch', 18, 'post', '/api/assign/batch/', 'user', {'devices': ['BUD-FREE-1', 'BUD-FREE-2']}, 200),
+        ('return-initiate-batch', 20, 'post', '/api/return/initiate/batch/', 'user', {'devices': ['BUD-HELD-1', 'BUD-HELD-2']}, 200),
+        ('return-verify-batch', 21, 'post', '/api/return/verify/batch/', 'user',
+         {'items': [{'device_id': 'BUD-PEND-1', 'otp_code': '900001'}, {'device_id': 'BUD-PEND-2', 'otp_code': '900002'}]}, 200),
+        ('admin-force-return', 19, 'post', '/api/admin/force-return/', 'admin', {'device_id': 'BUD-HELD-1'}, 200),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        n, now = cls.ROWS, timezone.now()
+        today = timezone.localdate()
+        cls.tab_types = TabType.objects.bulk_create(
+            [TabType(name=f"Budget Tab {i}", daily_limit_per_user=10) for i in range(3)]
+        )
+        cls.user, cls.peer, cls.admin = User.objects.bulk_create([
+            User(username="budget-user", employee_id="BUD-U", password=make_password(cls.PASSWORD)),
+            User(username="budget-peer", employee_id="BUD-P"),
+            User(username="budget-admin", employee_id="BUD-A", is_staff=True),
+        ])
+        users = User.objects.bulk_create([User(username=f"budget-{i}", employee_id=f"BUD-{i}") for i in range(n)])
+
+        # The fleet: every other device on loan, one loan in ten the user's; one returned loan per free device
+        devices, logs = [], []
+        for i in range(n):
+            device = TabletDevice(tab_type=cls.tab_types[i % 3], serial_number=f"BUD-S{i}", qr_code=f"QR-BUD-S{i}")
+            if i % 2:
+                device.status, device.assigned_to, device.assigned_at = 'assigned', cls.user if i % 20 == 1 else users[i], now
+                logs.append(AssignmentLog(user=device.assigned_to, device=device, ip_address='127.0.0.1', device_info='seed'))
+            else:
+                logs.append(AssignmentLog(
+                    user=cls.user if i % 10 == 0 else users[i], device=device, status='returned',
+                    returned_at=now - timedelta(minutes=i), ip_address='127.0.0.1', device_info='seed',
+                ))
+            devices.append(device)
+
+        # The requests' own devices and codes
+        tab = cls.tab_types[0]
+        for name, status, holder in [
+            ('FREE-1', 'available', None), ('FREE-2', 'available', None),
+            ('HELD-1', 'assigned', cls.user), ('HELD-2', 'assigned', cls.user),
+            ('PEND-1', 'return_pending', cls.user), ('PEND-2', 'return_pending', cls.user), ('XFER', 'assigned', cls.peer),
+        ]:
+            device = TabletDevice(tab_type=tab, serial_number=f"BUD-{name}", qr_code=f"QR-BUD-{name}", status=status,
+                                  assigned_to=holder, assigned_at=holder and now)
+            devices.append(device)
+            if holder:
+                logs.append(AssignmentLog(user=holder, device=device, ip_address='127.0.0.1', device_info='seed'))
+        TabletDevice.objects.bulk_create(devices, batch_size=500)
+        AssignmentLog.objects.bulk_create(logs, batch_size=500)
+
+        expires = now + timedelta(minutes=10)
+        by_serial = {device.serial_number: device for device in devices}
+        ReturnVerification.objects.bulk_create(
+            [ReturnVerification(device=by_serial[f"BUD-{name}"], otp_code=code, expires_at=expires)
+             for name, code in [('PEND-1', '900001'), ('PEND-2', '900002'), ('XFER', '900003')]]
+            + [ReturnVerification(device=devices[i], otp_code=f"{200000 + i}", expires_at=expires) for i in range(3, n, 4)],
+            batch_size=500,
+        )
+        AssignmentOTP.objects.bulk_create(
+            [AssignmentOTP(tab_type=tab, otp_code='900004', expires_at=expires)]
+            + [AssignmentOTP(tab_type=cls.tab_types[i % 3], otp_code=f"{500000 + i}", expires_at=expires) for i in range(n // 10)],
+        )
+
+        ArchivedAssignmentLog.objects.bulk_create([
+            ArchivedAssignmentLog(user=users[i], device=devices[i], issued_at=now - timedelta(days=400, minutes=i),
+                                  returned_at=now - timedelta(days=399, minutes=i), status='returned',
+                                  ip_address='127.0.0.1', device_info='seed')
+            for i in range(n)
+        ], batch_size=500)
+        UserDailyRollup.objects.bulk_create(
+            [UserDailyRollup(user=users[i], day=today - timedelta(days=i % 30), checkouts=1) for i in range(n)], batch_size=500,
+        )
+        TabTypeDailyRollup.objects.bulk_create(
+            [TabTypeDailyRollup(tab_type=tab_type, day=today - timedelta(days=d), checkouts=1)
+             for tab_type in cls.tab_types for d in range(30)],
+        )
+        AdminAuditLog.objects.bulk_create(
+            [AdminAuditLog(admin=cls.admin, action_type="Seed", description=f"Entry {i}") for i in range(n)], batch_size=500,
+        )
+        refresh_sections()
+
+    def setUp(self):
+        # Sections marked dirty by the writes of earlier tests, which never commit
+        dashboard._pending.sections = None
+
+    def request(self, method, path, as_user, data):
+        headers = {}
+        if as_user:
+            headers['Authorization'] = f"Bearer {RefreshToken.for_user(getattr(self, as_user)).access_token}"
+        if data == 'refresh':
+            data = {'refresh': str(RefreshToken.for_user(self.user))}
+        elif data == 'tab_type':
+            data = {'tab_type_id': str(self.tab_types[0].id)}
+
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                if method == 'get':
+                    response = self.client.get(path, headers=headers)
+                else:
+                    response = self.client.post(path, data, content_type='application/json', headers=headers)
+                if response.streaming:
+                    b''.join(response.streaming_content)  # The client closes it once consumed
+        return response, queries
+
+    def test_every_endpoint_stays_within_its_budget(self):
+        for name, budget, method, path, as_user, data, expected in self.CASES:
+            with self.subTest(name=name, path=path, method=method), transaction.atomic():
+                response, queries = self.request(method, path, as_user, data)
+                self.assertEqual(response.status_code, expected, getattr(response, 'content', b'')[:300])
+                sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+                self.assertLessEqual(len(queries), budget, f"{len(queries)} queries for {method.upper()} {path}:\n{sql}")
+                transaction.set_rollback(True)
+
+    def test_dashboard_rebuilds_stale_sections_once(self):
+        dashboard.mark_stale(dashboard.SECTION_BUILDERS)
+        # The first read rebuilds all 8 sections (6 or 7 queries each), the next one just reads them
+        for budget in (53, 4):
+            response, queries = self.request('get', '/api/admin/dashboard/', 'admin', None)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(queries), budget)
+
+    def test_polls_after_a_write_leave_the_counts_alone(self):
+        # A loan adjusts the stored device counts; the next poll only rebuilds the 3 device lists
+        self.request('post', '/api/assign/', 'user', {'device_id': 'BUD-FREE-1'})
+        stale = set(DashboardSection.objects.filter(version=dashboard.STALE).values_list('name', flat=True))
+        self.assertEqual(stale, set(dashboard.DEVICE_LIST_SECTIONS))
+
+        response, queries = self.request('get', '/api/admin/dashboard/', 'admin', None)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 23)
+        self.assertEqual(response.json()['stats'], dashboard._build_stats())
+        self.assertEqual({row['name']: row['stock_remaining'] for row in response.json()['stock']},
+                         {row['name']: row['stock_remaining'] for row in dashboard._build_stock()})
+
+    def test_every_api_route_has_a_budget(self):
+        budgeted = {name for name, *_ in self.CASES}
+        routes = {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None) and str(pattern.pattern).startswith('api/')}
+        self.assertEqual(routes - budgeted, set())
+
+
+class LargeQueryBudgetTests(QueryBudgetTests):
+    ROWS = 10_000
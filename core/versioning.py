@@ -0,0 +1,105 @@
+# core/versioning.py
+"""
+Global data version and ETag support for the read endpoints.
+
+The 'data' ChangeCounter is advanced after every committed write to the tablet
+lifecycle models: each such write marks at least one dashboard section stale
+(core/dashboard.py), and every mark takes the next version. Read endpoints
+derive a strong ETag from it, so a client that already holds the current
+representation gets a 304 after a single primary-key lookup.
+"""
+import hashlib
+from functools import wraps
+
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ChangeCounter
+
+DATA_VERSION = 'data'
+# Returned by an `extra` callable when the response changes with the clock alone: no ETag then
+UNCACHEABLE = object()
+
+
+def current_data_version():
+    return ChangeCounter.current(DATA_VERSION)
+
+
+def bump_data_version():
+    with transaction.atomic():
+        return ChangeCounter.bump(DATA_VERSION)
+
+
+def conditional_on_data_version(per_user=False, extra=None):
+    """
+    Decorator for APIView.get() handlers that adds a strong ETag and answers
+    If-None-Match with 304 Not Modified before the handler runs.
+
+    per_user: the response depends on request.user (include it in the tag).
+    extra:    optional callable(request) for state that changes the response
+              without a data write (e.g. OTP expiry, today's date). When it
+              returns UNCACHEABLE, the handler answers without validators.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            marker = extra(request) if extra else None
+            if marker is UNCACHEABLE:
+                return handler(self, request, *args, **kwargs)
+            # The version is read before the handler's queries: if a write lands in
+            # between, the client holds newer data under an older tag and simply refetches.
+            etag = _etag(request, current_data_version(), per_user, marker)
+
+            if _etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = handler(self, request, *args, **kwargs)
+            return _add_validators(response, etag)
+        return wrapper
+    return decorator
+
+
+def conditional_view_on_data_version(per_user=False, extra=None):
+    """
+    conditional_on_data_version() for plain function views (core/async_views.py).
+    The tags are the same, so a client keeps its cache across WSGI and ASGI servers.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            marker = extra(request) if extra else None
+            if marker is UNCACHEABLE:
+                return view(request, *args, **kwargs)
+            etag = _etag(request, current_data_version(), per_user, marker)
+
+            if _etag_matches(request, etag):
+                response = HttpResponseNotModified()
+            else:
+                response = view(request, *args, **kwargs)
+            return _add_validators(response, etag)
+        return wrapper
+    return decorator
+
+
+def _etag(request, version, per_user, extra):
+    parts = [request.path, request.GET.urlencode(), str(version)]
+    if per_user:
+        parts.append(str(request.user.pk))
+    if extra is not None:
+        parts.append(str(extra))
+    return quote_etag(hashlib.sha1("|".join(parts).encode()).hexdigest()[:32])
+
+
+def _etag_matches(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def _add_validators(response, etag):
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        # Let browsers keep the body but revalidate it on every request
+        response['Cache-Control'] = 'private, no-cache'
+    return response
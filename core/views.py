@@ -1,10 +1,11 @@
 from django.shortcuts import get_object_or_404   # <--- MUST HAVE THIS
 from django.core.exceptions import ValidationError
-from datetime import timedelta
+from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db import transaction
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Count, Q
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -17,15 +18,33 @@ from drf_spectacular.utils import extend_schema
 
 # Make sure User and ReturnVerification are in this list!
 from .models import AdminAuditLog, TabType, TabletDevice, AssignmentLog,AssignmentOTP, User, ReturnVerification 
+from .models import ArchivedAssignmentLog, TabTypeDailyRollup, UserDailyRollup
 from .serializers import CheckInSerializer, TabTypeSerializer, TabletDeviceSerializer
+from .dashboard import get_dashboard_snapshot, expired_otp_marker
+from .versioning import UNCACHEABLE, conditional_on_data_version
+from .pagination import keyset_page, parse_page_size
+from .limits import reserve_daily_slot, release_daily_slot
+from .otp import allocate_otp, issue_return_otp, OTPSpaceExhausted
+from .allocation import claim_any_device, claim_device, use_assignment_otp
+from .ingest import ingest_devices, parse_csv, parse_json
+from .batch import batch_assign, batch_initiate_return, batch_verify_return
+from .fleet import fleet_concurrency
+from .writelock import serialized_writes
+from .login import LoginBusy, login_slot
+from . import metrics
 import csv
-import random
+import heapq
+import logging
+import zlib
 from core import models
 
+logger = logging.getLogger(__name__)
+
 class GenerateAssignmentOTPView(APIView):
     """Admin generates an OTP that users can use to get a random free tab."""
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
+    @serialized_writes
     def post(self, request):
         tab_type_id = request.data.get('tab_type_id')
         try:
@@ -41,18 +60,19 @@ class GenerateAssignmentOTPView(APIView):
                 status=400
             )
 
-        # Generate a unique 6-digit OTP
-        otp = f"{random.randint(100000, 999999)}"
-        while AssignmentOTP.objects.filter(otp_code=otp, is_used=False).exists():
-            otp = f"{random.randint(100000, 999999)}"
-            
-        AssignmentOTP.objects.create(tab_type=tab_type, otp_code=otp)
-        return Response({"message": "Assignment OTP Generated!", "otp_code": otp})
+        # Generate a unique 6-digit OTP (uniqueness among live codes is enforced by the DB)
+        try:
+            assignment_otp = allocate_otp(AssignmentOTP, tab_type=tab_type)
+        except OTPSpaceExhausted:
+            return Response({"error": "Could not generate a unique OTP right now. Please try again."}, status=503)
+
+        return Response({"message": "Assignment OTP Generated!", "otp_code": assignment_otp.otp_code})
         
 class AssignTabletView(APIView):
     """Handles a user self-assigning a tablet via SCAN OR OTP."""
     permission_classes = [permissions.IsAuthenticated]
 
+    @serialized_writes
     def post(self, request):
         device_id = request.data.get('device_id') # For Scanning
         otp_code = request.data.get('otp_code')   # For OTP Assignment
@@ -63,83 +83,78 @@ class AssignTabletView(APIView):
 
         device = None
 
-        # --- OTP ASSIGNMENT WORKFLOW ---
-        if otp_code:
-            try:
-                assignment_otp = AssignmentOTP.objects.get(otp_code=otp_code, is_used=False)
+        with transaction.atomic():
+            # --- OTP ASSIGNMENT WORKFLOW ---
+            if otp_code:
+                assignment_otp = AssignmentOTP.objects.select_related('tab_type').filter(otp_code=otp_code, is_used=False).first()
+                if assignment_otp is None:
+                    return Response({"error": "Invalid or already used OTP."}, status=status.HTTP_404_NOT_FOUND)
                 if assignment_otp.expires_at < timezone.now():
                     return Response({"error": "This OTP has expired."}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Find the first available device of the requested type
-                device = TabletDevice.objects.filter(tab_type=assignment_otp.tab_type, status='available').first()
-                if not device:
-                    return Response({"error": f"No available devices for {assignment_otp.tab_type.name} at the moment."}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Mark OTP as used so it can't be used twice
-                assignment_otp.is_used = True
-                assignment_otp.save()
-            except AssignmentOTP.DoesNotExist:
-                return Response({"error": "Invalid or already used OTP."}, status=status.HTTP_404_NOT_FOUND)
-        
-        # --- SCAN ASSIGNMENT WORKFLOW ---
-        else:
-            try:
-                # 1. Try to find the device matching the literal serial_number string first
-                device = TabletDevice.objects.filter(serial_number=device_id).first()
-                
-                # 2. If it's not found by serial number, check if device_id might be a valid UUID for structural matching
-                if not device:
-                    try:
-                        # Try parsing it to see if it's a UUID string structure before hitting the DB field
-                        import uuid
-                        uuid.UUID(str(device_id))
-                        device = TabletDevice.objects.filter(id=device_id).first()
-                    except ValueError:
-                        # If it's not a valid UUID string (like "ANAL DAS-2"), skip the UUID database lookup entirely
-                        device = None
-                
-                # 3. If neither strategy yields a device record, raise the standard exception
-                if not device:
-                    raise TabletDevice.DoesNotExist
-                    
-            except TabletDevice.DoesNotExist:
-                return Response({"error": f"Tablet '{device_id}' does not exist in the system registry."}, status=status.HTTP_404_NOT_FOUND)
-
-            if device.status != 'available':
-                return Response({"error": f"Device is currently {device.status}."}, status=status.HTTP_400_BAD_REQUEST)
+                tab_type = assignment_otp.tab_type
 
-        # 3. Check Daily Limit
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # FIX: Filter with status='active' so any log items marked 'returned' or 'transferred' don't lock down their daily tier allowance
-        usage_today = AssignmentLog.objects.filter(
-            user=user, 
-            device__tab_type=device.tab_type, 
-            issued_at__gte=today_start,
-            status='active'
-        ).count()
-
-        if usage_today >= device.tab_type.daily_limit_per_user:
-            return Response({"error": f"You reached your daily limit for this tab type."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 4. Update Device Status
-        device.status = 'assigned'
-        device.assigned_to = user
-        device.assigned_at = timezone.now()
-        device.save()
-
-        # 5. Create Assignment Log
-        AssignmentLog.objects.create(
-            user=user, device=device, status='active',
-            ip_address=request.META.get('REMOTE_ADDR', '0.0.0.0'),
-            device_info=request.META.get('HTTP_USER_AGENT', 'Unknown')
-        )
+            # --- SCAN ASSIGNMENT WORKFLOW ---
+            else:
+                try:
+                    # 1. Try to find the device matching the literal serial_number string first
+                    device = TabletDevice.objects.select_related('tab_type').filter(serial_number=device_id).first()
+                    
+                    # 2. If it's not found by serial number, check if device_id might be a valid UUID for structural matching
+                    if not device:
+                        try:
+                            # Try parsing it to see if it's a UUID string structure before hitting the DB field
+                            import uuid
+                            uuid.UUID(str(device_id))
+                            device = TabletDevice.objects.select_related('tab_type').filter(id=device_id).first()
+                        except ValueError:
+                            # If it's not a valid UUID string (like "ANAL DAS-2"), skip the UUID database lookup entirely
+                            device = None
+                    
+                    # 3. If neither strategy yields a device record, raise the standard exception
+                    if not device:
+                        raise TabletDevice.DoesNotExist
+                        
+                except TabletDevice.DoesNotExist:
+                    return Response({"error": f"Tablet '{device_id}' does not exist in the system registry."}, status=status.HTTP_404_NOT_FOUND)
+
+                if device.status != 'available':
+                    return Response({"error": f"Device is currently {device.status}."}, status=status.HTTP_400_BAD_REQUEST)
+                tab_type = device.tab_type
+
+            # 3. Check Daily Limit (single-row counter; returned/transferred loans give their slot back)
+            if not reserve_daily_slot(user, tab_type):
+                return Response({"error": f"You reached your daily limit for this tab type."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # 4. Claim the device in one atomic step, so concurrent requests never get the same one.
+            #    Any failure from here on rolls back the reserved slot (and the OTP use).
+            if otp_code:
+                # Mark OTP as used so it can't be used twice
+                if not use_assignment_otp(assignment_otp):
+                    transaction.set_rollback(True)
+                    return Response({"error": "Invalid or already used OTP."}, status=status.HTTP_404_NOT_FOUND)
+
+                # Hand out any available device of the requested type
+                device = claim_any_device(tab_type, user)
+                if device is None:
+                    transaction.set_rollback(True)
+                    return Response({"error": f"No available devices for {tab_type.name} at the moment."}, status=status.HTTP_400_BAD_REQUEST)
+            elif not claim_device(device, user):
+                transaction.set_rollback(True)
+                return Response({"error": "Device was just assigned to someone else."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # 5. Create Assignment Log
+            AssignmentLog.objects.create(
+                user=user, device=device, status='active',
+                ip_address=request.META.get('REMOTE_ADDR', '0.0.0.0'),
+                device_info=request.META.get('HTTP_USER_AGENT', 'Unknown')
+            )
 
         return Response({"message": f"Assigned! Pick up device Serial: {device.serial_number}"}, status=status.HTTP_201_CREATED) 
 
 class TabCheckInView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_data_version()
     def get(self, request):
         try:
             # Explicitly fetch all tabs to ensure the model is accessible
@@ -148,9 +163,10 @@ class TabCheckInView(APIView):
             serializer = TabletDeviceSerializer(available_tabs, many=True)
             return Response(serializer.data)
         except Exception as e:
-            print(f"GET Error: {str(e)}") 
+            logger.exception("Listing tablets failed")
             return Response({"error": str(e)}, status=500)
 
+    @serialized_writes
     def post(self, request):
         """Handles both Logging usage (+1) and Returning tabs (-1)."""
         serializer = CheckInSerializer(data=request.data)
@@ -221,91 +237,29 @@ class UserPossessionView(APIView):
     """Returns the physical devices currently assigned to the user."""
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_data_version(per_user=True)
     def get(self, request):
         try:
-            # Query the new AssignmentLog model for active assignments
-            active_assignments = AssignmentLog.objects.filter(
-                user=request.user, 
-                status='active'
-            ).select_related('device', 'device__tab_type')
-
-            data = [
-                {
-                    "device__serial_number": log.device.serial_number,
-                    "device__tab_type__name": log.device.tab_type.name,
-                    "issued_at": log.issued_at
-                }
-                for log in active_assignments
-            ]
-            return Response(data)
+            return Response(list(possession_logs(request.user)))
         except Exception as e:
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Possession lookup failed for %s", request.user.pk)
             return Response({"error": str(e)}, status=500)
 
 
+def possession_logs(user):
+    """The user's active loans as /api/possession/ returns them (also used by core/async_views.py)."""
+    return AssignmentLog.objects.filter(user=user, status='active').values(
+        'device__serial_number', 'device__tab_type__name', 'issued_at'
+    )
+
+
 class AdminDashboardView(APIView):
+    """Serves the precomputed dashboard snapshot (see core/dashboard.py)."""
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
+    @conditional_on_data_version(extra=expired_otp_marker)
     def get(self, request):
-        tab_types = TabType.objects.values('id', 'name')
-        
-        stock_summary = TabType.objects.annotate(
-            stock_remaining=Count('devices', filter=Q(devices__status='available'))
-        ).values('id', 'name', 'stock_remaining', 'daily_limit_per_user')
-
-        active_loans = AssignmentLog.objects.filter(status='active').select_related(
-            'user', 'device', 'device__tab_type'
-        ).values('user__employee_id', 'user__username', 'device__serial_number', 'device__tab_type__name', 'issued_at').order_by('-issued_at')
-
-        recent_activity_qs = AssignmentLog.objects.select_related('user', 'device', 'device__tab_type').order_by('-issued_at')[:15]
-        
-        recent_activity = [{
-            'user__username': log.user.username, 
-            'tab__name': log.device.tab_type.name, 
-            'action': log.status, 
-            'notes': log.notes,  # Safely passes null for old logs, and text for new transfers
-            'timestamp': log.issued_at if log.status == 'active' else log.returned_at
-        } for log in recent_activity_qs]
-        
-        audit_trails = AdminAuditLog.objects.select_related('admin').order_by('-timestamp')[:20].values('admin__username', 'action_type', 'description', 'timestamp')
-        
-        # --- UPDATE START: Filter to show only the LATEST OTP per device ---
-        all_pending_qs = ReturnVerification.objects.filter(verified=False).select_related(
-            'device', 'device__assigned_to'
-        ).order_by('-created_at') # Newest first
-
-        unique_returns_map = {}
-        for rv in all_pending_qs:
-            serial = rv.device.serial_number
-            # Since we ordered by -created_at, the first time we see a serial, it's the latest one.
-            if serial not in unique_returns_map:
-                unique_returns_map[serial] = {
-                    'device__serial_number': serial,
-                    'device__assigned_to__username': rv.device.assigned_to.username if rv.device.assigned_to else "Unknown",
-                    'device__assigned_to__employee_id': rv.device.assigned_to.employee_id if rv.device.assigned_to else "Unknown",
-                    'otp_code': rv.otp_code,
-                    'created_at': rv.created_at
-                }
-        
-        pending_returns = list(unique_returns_map.values())
-        # --- UPDATE END ---
-
-        # Fetch active assignment OTPs so admin can see them
-        active_assignment_otps = AssignmentOTP.objects.filter(is_used=False, expires_at__gt=timezone.now()).select_related('tab_type').values('otp_code', 'tab_type__name', 'created_at').order_by('-created_at')
-
-        stats = {
-            "total": TabletDevice.objects.count(), "available": TabletDevice.objects.filter(status='available').count(),
-            "assigned": TabletDevice.objects.filter(status='assigned').count(), "repair": TabletDevice.objects.filter(status='repair').count()
-        }
-
-        return Response({
-            "tab_types": list(tab_types),
-            "stock": list(stock_summary), "stats": stats, "active_loans": list(active_loans),
-            "recent_activity": recent_activity, "audit_trails": list(audit_trails),
-            "pending_returns": pending_returns,
-            "active_assignment_otps": list(active_assignment_otps)
-        })
+        return Response(get_dashboard_snapshot())
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -321,39 +275,51 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+
+    def post(self, request, *args, **kwargs):
+        try:
+            with login_slot():
+                return super().post(request, *args, **kwargs)
+        except LoginBusy as e:
+            return Response(
+                {"error": "Too many people are logging in right now. Please try again in a few seconds."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(e.retry_after)},
+            )
     
 
 class UserActivityHistoryView(APIView):
     """Returns the last 20 actions performed by the logged-in user."""
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_data_version(per_user=True)
     def get(self, request):
         try:
-            # 1. Use 'issued_at' for ordering instead of 'timestamp'
-            # 2. Use 'device__tab_type' for select_related instead of 'tab'
-            logs = AssignmentLog.objects.filter(
-                user=request.user
-            ).select_related('device__tab_type').order_by('-issued_at')[:20]
-            
-            data = []
-            for log in logs:
-                data.append({
-                    "tab_name": log.device.tab_type.name, # Correct path to the name
-                    "action": log.status,                # Use the 'status' field from model
-                    "timestamp": log.issued_at,          # Match model field name
-                    "notes": log.notes                   # Include audit trail notes
-                })
-                
-            return Response(data)
+            return Response([history_row(row) for row in activity_history(request.user)])
         except Exception as e:
-            # This will print the error to your console for debugging
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Activity history failed for %s", request.user.pk)
             return Response({"error": str(e)}, status=500)
 
+
+def activity_history(user):
+    """The user's last 20 loans, newest first (also used by core/async_views.py)."""
+    return AssignmentLog.objects.filter(user=user).order_by('-issued_at').values(
+        'device__tab_type__name', 'status', 'issued_at', 'notes'
+    )[:20]
+
+
+def history_row(row):
+    return {
+        "tab_name": row['device__tab_type__name'],
+        "action": row['status'],
+        "timestamp": row['issued_at'],
+        "notes": row['notes'],
+    }
+
+
 class InitiateReturnView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @serialized_writes
     def post(self, request):
         device_id = request.data.get("device_id")
         try:
@@ -365,18 +331,18 @@ class InitiateReturnView(APIView):
         except TabletDevice.DoesNotExist:
             return Response({"error": "Device not found, not assigned to you, or already returned."}, status=404)
 
-        # --- FIX: Delete any existing unverified OTPs for this device ---
-        # This prevents "old" OTPs from cluttering the dashboard or being used
-        ReturnVerification.objects.filter(device=device, verified=False).delete()
-        # ---------------------------------------------------------------
+        # One transaction for the OTP and the status: one commit and one dashboard update
+        try:
+            with transaction.atomic():
+                # Generate a new OTP, replacing any existing unverified one for this device
+                # (the database allows one live code per device)
+                issue_return_otp(device)
 
-        # Generate a new OTP and save it
-        otp = f"{random.randint(100000, 999999)}"
-        ReturnVerification.objects.create(device=device, otp_code=otp)
-        
-        # Change status
-        device.status = "return_pending"
-        device.save()
+                # Change status
+                device.status = "return_pending"
+                device.save()
+        except OTPSpaceExhausted:
+            return Response({"error": "Could not generate a unique OTP right now. Please try again."}, status=503)
         
         return Response({"message": "Return initiated. Please ask the Admin for your 6-digit OTP to complete the return."})
         
@@ -384,6 +350,7 @@ class InitiateReturnView(APIView):
 class VerifyReturnView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @serialized_writes
     def post(self, request):
         device_id = request.data.get("device_id")
         otp_code = request.data.get("otp_code")
@@ -403,53 +370,265 @@ class VerifyReturnView(APIView):
         if rv.expires_at < timezone.now():
             return Response({"error": "OTP expired. Please initiate return again."}, status=400)
         
-        rv.verified = True
-        rv.save()
-        
-        device = rv.device
-        device.status = "available" if condition.lower() == "good" else "repair"
-        device.condition = condition
-        device.assigned_to = None
-        device.save()
-        
-        try:
-            log = AssignmentLog.objects.get(device=device, status="active")
-            log.status = "returned"
-            log.returned_at = timezone.now()
-            log.save()
-        except AssignmentLog.DoesNotExist:
-            pass
+        # One transaction for the OTP, device and log: one commit and one dashboard update
+        with transaction.atomic():
+            rv.verified = True
+            rv.save()
+            
+            device = rv.device
+            device.status = "available" if condition.lower() == "good" else "repair"
+            device.condition = condition
+            device.assigned_to = None
+            device.save()
+            
+            try:
+                log = AssignmentLog.objects.get(device=device, status="active")
+                log.status = "returned"
+                log.returned_at = timezone.now()
+                log.save()
+                release_daily_slot(log)
+            except AssignmentLog.DoesNotExist:
+                pass
         
         return Response({"success": "Return Verified! You have successfully returned the tablet."})
 
+class BatchAssignView(APIView):
+    """Kiosk checkout: assigns a cart of scanned devices ({"devices": [serial or QR, ...]}) in one request."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @serialized_writes
+    def post(self, request):
+        try:
+            results = batch_assign(
+                request.user, request.data.get('devices'),
+                ip_address=request.META.get('REMOTE_ADDR', '0.0.0.0'),
+                device_info=request.META.get('HTTP_USER_AGENT', 'Unknown'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results, "succeeded": sum(r['ok'] for r in results)})
+
+
+class BatchInitiateReturnView(APIView):
+    """Kiosk return, step 1: starts the return of a cart of devices ({"devices": [...]})."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @serialized_writes
+    def post(self, request):
+        try:
+            results = batch_initiate_return(request.user, request.data.get('devices'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except OTPSpaceExhausted:
+            return Response({"error": "Could not generate unique OTPs right now. Please try again."}, status=503)
+        except IntegrityError:
+            # A return for one of these devices was initiated concurrently; nothing was changed
+            return Response({"error": "Some of these returns were just initiated elsewhere. Please try again."}, status=409)
+        return Response({"results": results, "succeeded": sum(r['ok'] for r in results)})
+
+
+class BatchVerifyReturnView(APIView):
+    """Kiosk return, step 2: {"items": [{"device_id", "otp_code", "condition"}, ...]}."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @serialized_writes
+    def post(self, request):
+        try:
+            results = batch_verify_return(request.user, request.data.get('items'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results, "succeeded": sum(r['ok'] for r in results)})
+
 class AllAssignmentLogsView(APIView):
-    """Returns a full list of all assignment logs for the dedicated logs page."""
+    """
+    Returns one page of assignment logs for the dedicated logs page, newest first.
+
+    Query params: cursor, limit, date_from / date_to (YYYY-MM-DD, local time, inclusive),
+    status, employee (matches employee ID or username), tab_model (tab type name),
+    archive=1 (page through archived logs instead, see core/archive.py).
+    """
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
+    @conditional_on_data_version()
     def get(self, request):
-        logs = AssignmentLog.objects.select_related(
-            'user', 'device', 'device__tab_type'
-        ).order_by('-issued_at')
-        
-        data = []
-        for log in logs:
-            data.append({
-                'id': log.id,
-                'employee_id': log.user.employee_id,
-                'username': log.user.username,
-                'serial_number': log.device.serial_number,
-                'tab_model': log.device.tab_type.name,
-                'status': log.status, # 'active' or 'returned'
-                'issued_at': log.issued_at,
-                'returned_at': log.returned_at,
-            })
-            
+        try:
+            logs, limit = assignment_log_query(request.query_params)
+            rows, next_cursor = keyset_page(logs, request.query_params.get('cursor'), limit)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": [log_row(row) for row in rows], "next_cursor": next_cursor})
+
+
+def assignment_log_query(params):
+    """
+    The filtered .values() queryset and page size for the logs page (also used by
+    core/async_views.py). Raises ValueError for an invalid filter.
+    """
+    logs = ArchivedAssignmentLog.objects.all() if params.get('archive') == '1' else AssignmentLog.objects.all()
+
+    try:
+        limit = parse_page_size(params.get('limit'))
+
+        # Date filters are calendar days in the server's TIME_ZONE
+        if params.get('date_from'):
+            logs = logs.filter(issued_at__gte=_local_day_start(params['date_from']))
+        if params.get('date_to'):
+            logs = logs.filter(issued_at__lt=_local_day_start(params['date_to']) + timedelta(days=1))
+    except ValueError as e:
+        raise ValueError(f"Invalid filter: {e}")
+
+    if params.get('status'):
+        logs = logs.filter(status=params['status'])
+
+    # Users and tab types are small tables: resolve them first so the log scan stays on indexed FKs
+    if params.get('employee'):
+        term = params['employee']
+        logs = logs.filter(user__in=User.objects.filter(
+            Q(employee_id__icontains=term) | Q(username__icontains=term)
+        ).values('id'))
+    if params.get('tab_model'):
+        logs = logs.filter(device__tab_type__in=TabType.objects.filter(name=params['tab_model']).values('id'))
+
+    return logs.values(
+        'id', 'user__employee_id', 'user__username', 'device__serial_number',
+        'device__tab_type__name', 'status', 'issued_at', 'returned_at'
+    ), limit
+
+
+def log_row(row):
+    return {
+        'id': row['id'],
+        'employee_id': row['user__employee_id'],
+        'username': row['user__username'],
+        'serial_number': row['device__serial_number'],
+        'tab_model': row['device__tab_type__name'],
+        'status': row['status'], # 'active', 'returned' or 'transferred'
+        'issued_at': row['issued_at'],
+        'returned_at': row['returned_at'],
+    }
+
+
+def _today(request):
+    """ETag extra of UsageAnalyticsView: its default window moves at midnight."""
+    return timezone.localdate()
+
+
+class UsageAnalyticsView(APIView):
+    """
+    Daily utilisation rollups (core/rollups.py), newest day first.
+
+    Query params: scope ('tab_type' (default) or 'user'), date_from / date_to
+    (YYYY-MM-DD, inclusive; default the last 30 days), tab_model, employee.
+    """
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    @conditional_on_data_version(extra=_today)
+    def get(self, request):
+        params = request.query_params
+        scope = params.get('scope', 'tab_type')
+        if scope not in ('tab_type', 'user'):
+            return Response({"error": "scope must be 'tab_type' or 'user'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        date_to = _parse_day(params.get('date_to'), default=timezone.localdate())
+        date_from = _parse_day(params.get('date_from'), default=date_to and date_to - timedelta(days=29))
+        if date_from is None or date_to is None:
+            return Response({"error": "Dates must be YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if scope == 'tab_type':
+            rows = TabTypeDailyRollup.objects.filter(day__range=(date_from, date_to))
+            if params.get('tab_model'):
+                rows = rows.filter(tab_type__name=params['tab_model'])
+            keys = ('tab_type__name',)
+        else:
+            rows = UserDailyRollup.objects.filter(day__range=(date_from, date_to))
+            if params.get('employee'):
+                term = params['employee']
+                rows = rows.filter(Q(user__employee_id__icontains=term) | Q(user__username__icontains=term))
+            keys = ('user__employee_id', 'user__username')
+
+        results = list(rows.values(
+            'day', *keys, 'checkouts', 'returns', 'transfers', 'force_returns',
+            'mean_loan_seconds', 'p95_loan_seconds', 'peak_concurrent'
+        ).order_by('-day', *keys))
+
+        return Response({"scope": scope, "date_from": date_from, "date_to": date_to, "results": results})
+
+
+def _clock_marker(request):
+    """
+    ETag extra of FleetConcurrencyView. Open loans run until now, so a range that
+    reaches today changes with the clock alone: such responses are not cached.
+    """
+    date_to = _parse_day(request.GET.get('date_to'), default=timezone.localdate())
+    return UNCACHEABLE if date_to is not None and date_to >= timezone.localdate() else None
+
+
+class FleetConcurrencyView(APIView):
+    """
+    Devices on loan over time plus an hour-of-week utilisation heatmap (core/fleet.py).
+
+    Query params: date_from / date_to (YYYY-MM-DD, inclusive; default the last 7 days),
+    tab_model (tab type name; default the whole fleet), bucket ('hour' or 'day').
+    """
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    MAX_DAYS = 366
+
+    @conditional_on_data_version(extra=_clock_marker)
+    def get(self, request):
+        params = request.query_params
+        date_to = _parse_day(params.get('date_to'), default=timezone.localdate())
+        date_from = _parse_day(params.get('date_from'), default=date_to and date_to - timedelta(days=6))
+        if date_from is None or date_to is None or date_from > date_to:
+            return Response({"error": "Give date_from <= date_to as YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            return Response({"error": f"The range is limited to {self.MAX_DAYS} days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        bucket = params.get('bucket', 'hour')
+        if bucket not in ('hour', 'day'):
+            return Response({"error": "bucket must be 'hour' or 'day'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tab_type = None
+        if params.get('tab_model'):
+            tab_type = TabType.objects.filter(name=params['tab_model']).first()
+            if tab_type is None:
+                return Response({"error": "Unknown tab model."}, status=status.HTTP_404_NOT_FOUND)
+
+        data = fleet_concurrency(date_from, date_to, tab_type=tab_type, bucket=bucket)
+        data.update(date_from=date_from, date_to=date_to, tab_model=tab_type.name if tab_type else None)
         return Response(data)
 
+
+class MetricsView(APIView):
+    """Per-endpoint latency, query and payload metrics of all server processes, for Prometheus (core/metrics.py)."""
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def _parse_day(value, default=None):
+    """Parses YYYY-MM-DD; `default` when the value is empty, None when it isn't a day (2024-02-30 included)."""
+    if not value:
+        return default
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def _local_day_start(value):
+    """Parses YYYY-MM-DD into an aware datetime at local midnight. Raises ValueError."""
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"'{value}' is not a YYYY-MM-DD date.")
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
 class AdminForceReturnView(APIView):
     """Allows an Admin to forcefully return a device without an OTP."""
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
+    @serialized_writes
     def post(self, request):
         device_id = request.data.get("device_id")
         
@@ -477,6 +656,7 @@ class AdminForceReturnView(APIView):
                     log.returned_at = timezone.now()
                     log.notes = "Force returned by Admin"
                     log.save()
+                    release_daily_slot(log)
 
                 # 3. Create an Audit Trail
                 AdminAuditLog.objects.create(
@@ -537,103 +717,129 @@ def admin_dashboard_stats(request):
     except Exception as e:
         return Response({"error": str(e)}, status=500)
     
+class _Echo:
+    """File-like object for csv.writer that hands each row back instead of buffering it."""
+    def write(self, value):
+        return value
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_EVENT_FIELDS = ('user__employee_id', 'user__username', 'device__serial_number', 'device__tab_type__name')
+
+
+def _export_event_streams(date_from=None, date_to=None, model=AssignmentLog):
+    """
+    Two newest-first event streams read in DB chunks: checkouts ordered by issued_at
+    and returns ordered by returned_at. Each yields (timestamp, action, *fields).
+    """
+    checkouts = model.objects.all()
+    returns = model.objects.filter(status='returned', returned_at__isnull=False)
+    if date_from:
+        checkouts = checkouts.filter(issued_at__gte=date_from)
+        returns = returns.filter(returned_at__gte=date_from)
+    if date_to:
+        checkouts = checkouts.filter(issued_at__lt=date_to)
+        returns = returns.filter(returned_at__lt=date_to)
+
+    checkout_events = (
+        (row[0], 'Checked Out') + row[1:]
+        for row in checkouts.order_by('-issued_at').values_list('issued_at', *EXPORT_EVENT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return_events = (
+        (row[0], 'Returned') + row[1:]
+        for row in returns.order_by('-returned_at').values_list('returned_at', *EXPORT_EVENT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return checkout_events, return_events
+
+
+def _export_csv_rows(events):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['Action', 'Timestamp', 'Employee ID', 'Username', 'Device Serial', 'Tab Model'])
+
+    batch = []
+    for timestamp, action, emp_id, username, serial, model in events:
+        local_time = timezone.localtime(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        batch.append(writer.writerow([action, local_time, emp_id, username, serial, model]))
+        if len(batch) >= 500:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def export_usage_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="warehouse_event_logs.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        'Action', 
-        'Timestamp', 
-        'Employee ID', 
-        'Username', 
-        'Device Serial', 
-        'Tab Model'
-    ])
-
-    logs = AssignmentLog.objects.select_related(
-        'user', 'device', 'device__tab_type'
-    ).all().order_by('-issued_at')
-    
-    # Split the row-based logs into distinct events
-    events = []
-    for log in logs:
-        if log.issued_at:
-            events.append({
-                'action': 'Checked Out',
-                'timestamp': log.issued_at,
-                'emp_id': log.user.employee_id,
-                'username': log.user.username,
-                'serial': log.device.serial_number,
-                'model': log.device.tab_type.name
-            })
-        if log.status == 'returned' and log.returned_at:
-            events.append({
-                'action': 'Returned',
-                'timestamp': log.returned_at,
-                'emp_id': log.user.employee_id,
-                'username': log.user.username,
-                'serial': log.device.serial_number,
-                'model': log.device.tab_type.name
-            })
-            
-    # Sort events purely chronologically
-    events.sort(key=lambda x: x['timestamp'], reverse=True)
-
-    for event in events:
-        local_time = timezone.localtime(event['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-        writer.writerow([
-            event['action'],
-            local_time,
-            event['emp_id'],
-            event['username'],
-            event['serial'],
-            event['model']
-        ])
-
+    """
+    Streams checkout/return events newest first, in bounded memory.
+    Optional params: date_from / date_to (YYYY-MM-DD, local time, inclusive), gzip=1,
+    archive=1 (include archived logs).
+    """
+    try:
+        date_from = _local_day_start(request.query_params['date_from']) if request.query_params.get('date_from') else None
+        date_to = _local_day_start(request.query_params['date_to']) + timedelta(days=1) if request.query_params.get('date_to') else None
+    except ValueError as e:
+        return Response({"error": f"Invalid filter: {e}"}, status=400)
+
+    streams = list(_export_event_streams(date_from, date_to))
+    if request.query_params.get('archive') == '1':
+        streams.extend(_export_event_streams(date_from, date_to, model=ArchivedAssignmentLog))
+
+    # All streams are already ordered, so a lazy merge replaces the global sort
+    events = heapq.merge(*streams, key=lambda event: event[0], reverse=True)
+    rows = _export_csv_rows(events)
+
+    if request.query_params.get('gzip') in ('1', 'true'):
+        response = StreamingHttpResponse(_gzip_stream(rows), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="warehouse_event_logs.csv.gz"'
+    else:
+        response = StreamingHttpResponse(rows, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="warehouse_event_logs.csv"'
     return response
     
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
-def add_tab_stock(request):
-    name = request.data.get('name')
-    quantity = int(request.data.get('quantity', 0))
-    limit = int(request.data.get('limit', 1))
-
-    if not name:
-        return Response({"error": "Tab name is required."}, status=400)
-
-    # get_or_create determines if this is a NEW tab or an existing one
-    tab, created = TabletDevice.objects.get_or_create(
-        name=name,
-        defaults={'stock_remaining': quantity, 'daily_limit_per_user': limit}
-    )
+@serialized_writes
+def import_devices(request):
+    """
+    Bulk-registers a shipment of devices.
+    Send either a JSON body {"devices": [{serial_number, qr_code, tab_type}, ...]}
+    or a multipart upload 'file' (.csv or .json). Rows with errors are reported and skipped.
+    """
+    create_types = str(request.data.get('create_types', '')).lower() in ('1', 'true', 'yes')
+    upload = request.FILES.get('file')
 
-    action_desc = ""
-    if created:
-        action_desc = f"Created new tab '{name}' with {quantity} units and limit {limit}."
-    else:
-        tab.stock_remaining += quantity
-        tab.save()
-        action_desc = f"Added {quantity} units to '{name}'. New total: {tab.stock_remaining}."
-
-    # THIS IS THE TRACE: It saves who did it, what they did, and when
-    AdminAuditLog.objects.create(
-        admin=request.user,
-        action_type="Inventory Update",
-        description=action_desc
-    )
+    try:
+        if upload is not None:
+            text = upload.read().decode('utf-8-sig')
+            rows = parse_json(text) if upload.name.lower().endswith('.json') else parse_csv(text)
+        elif 'devices' in request.data:
+            rows = parse_json(request.data['devices'])
+        else:
+            return Response({"error": "Provide a 'devices' list or a CSV/JSON 'file'."}, status=400)
 
-    return Response({
-        "message": f"Successfully updated {name}",
-        "new_stock": tab.stock_remaining
-    })
+        result = ingest_devices(rows, admin=request.user, create_types=create_types)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return Response({"error": f"Could not read the import: {e}"}, status=400)
+    except IntegrityError:
+        # Another import registered some of the same serials in the meantime; nothing was saved
+        return Response({"error": "Conflicting concurrent import. Please retry."}, status=409)
+
+    return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
 
 # --- TRANSFER LOGIC ---
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@serialized_writes
 def initiate_transfer(request):
     """User A initiates a transfer and gets an OTP to give to User B."""
     device_id = request.data.get("device_id")
@@ -648,22 +854,22 @@ def initiate_transfer(request):
     except TabletDevice.DoesNotExist:
         return Response({"error": "Device not found or is not currently assigned to you."}, status=404)
 
-    # Clear any existing unverified OTPs for this device
-    ReturnVerification.objects.filter(device=device, verified=False).delete()
-
-    # Generate a new 6-digit Transfer OTP
-    otp = f"{random.randint(100000, 999999)}"
-    ReturnVerification.objects.create(device=device, otp_code=otp)
+    # Generate a new 6-digit Transfer OTP (replaces any existing unverified one for this device)
+    try:
+        rv = issue_return_otp(device)
+    except OTPSpaceExhausted:
+        return Response({"error": "Could not generate a unique OTP right now. Please try again."}, status=503)
     
     return Response({
         "message": "Transfer initiated successfully.",
-        "transfer_otp": otp,
+        "transfer_otp": rv.otp_code,
         "instructions": "Share this 6-digit OTP with the receiving user. They must enter it to claim the tablet."
     }, status=200)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@serialized_writes
 def accept_transfer(request):
     """User B enters the OTP to claim the tablet from User A."""
     otp_code = request.data.get("otp_code")
@@ -691,17 +897,12 @@ def accept_transfer(request):
     if original_user == request.user:
         return Response({"error": "You cannot transfer a device to yourself."}, status=400)
 
-    # Enforce Daily Limits for the receiving user (User B)
-    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    usage_today = AssignmentLog.objects.filter(
-        user=request.user, device__tab_type=device.tab_type, issued_at__gte=today_start
-    ).count()
-
-    if usage_today >= device.tab_type.daily_limit_per_user:
-        return Response({"error": f"You have reached your daily limit for {device.tab_type.name} tablets."}, status=400)
-
     try:
         with transaction.atomic():
+            # Enforce Daily Limits for the receiving user (User B)
+            if not reserve_daily_slot(request.user, device.tab_type):
+                return Response({"error": f"You have reached your daily limit for {device.tab_type.name} tablets."}, status=400)
+
             # 1. Safely find User A's active log and mark it as transferred out
             old_log = AssignmentLog.objects.filter(device=device, status="active", user=original_user).first()
             if old_log:
@@ -709,6 +910,7 @@ def accept_transfer(request):
                 old_log.returned_at = timezone.now()
                 old_log.notes = f"Transferred to {request.user.username} ({request.user.employee_id})"
                 old_log.save()
+                release_daily_slot(old_log)
 
             # 2. Reassign the device to User B
             device.assigned_to = request.user
@@ -0,0 +1,45 @@
+# core/writelock.py
+"""
+In-process write serialization for SQLite.
+
+SQLite has one writer at a time. When several threads of a server write at
+once, the losers sleep in SQLite's busy handler, which polls with growing
+pauses, and fail with "database is locked" once the busy timeout runs out. The
+write views therefore take one process-wide lock first: writers queue on it and
+each one starts the moment the previous one is done. Readers don't take it,
+and in WAL mode (settings.py) they are never blocked by the writer either.
+
+Writers in other processes (gunicorn workers, manage.py commands) still meet at
+the database lock, where the busy timeout and BEGIN IMMEDIATE of the SQLite
+profile apply. On other databases, or with SQLITE_SERIALIZE_WRITES = False,
+serialized_writes does nothing.
+
+checkpoint_wal runs after migrate and moves the WAL into the database file,
+which is all Django copies to clone a test database (manage.py test --parallel).
+"""
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+_lock = threading.RLock()  # Re-entrant: a write view may call another
+
+
+def serialized_writes(func):
+    """Decorator for write views (functions or methods): runs them one at a time per process."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.vendor != 'sqlite' or not settings.SQLITE_SERIALIZE_WRITES:
+            return func(*args, **kwargs)
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def checkpoint_wal(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: writes the committed WAL pages into the SQLite database file."""
+    db = connections[using]
+    if db.vendor == 'sqlite' and not db.is_in_memory_db():
+        with db.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
@@ -78,11 +78,59 @@ const AdminDashboard = () => {
         });
     };
 
-    // Auto-refresh the dashboard every 10 seconds to catch new OTPs
+    // Live updates: the server pushes only the dashboard sections that changed.
+    // Under the ASGI server the stream stays open; under waitress it closes after
+    // each delta and we reconnect with our version cursor.
     useEffect(() => {
-        fetchDashboardData();
-        const intervalId = setInterval(fetchDashboardData, 2000); 
-        return () => clearInterval(intervalId);
+        const controller = new AbortController();
+        let cursor = 0;
+
+        const applyEvent = (rawEvent) => {
+            const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+            if (!dataLine) return; // keep-alive comment
+            const delta = JSON.parse(dataLine.slice(6));
+            cursor = delta.version;
+            if (delta.sections.active_assignment_otps) {
+                delta.sections.active_assignment_otps = delta.sections.active_assignment_otps
+                    .filter(otp => new Date(otp.expires_at) > new Date());
+            }
+            setData(prev => ({ ...prev, ...delta.sections }));
+            setLoading(false);
+        };
+
+        const listen = async () => {
+            while (!controller.signal.aborted) {
+                try {
+                    const res = await fetch(`${API_BASE_URL}/api/admin/dashboard/stream/?since=${cursor}`, {
+                        headers: { Authorization: `Bearer ${token}` },
+                        signal: controller.signal
+                    });
+                    if (!res.ok) throw new Error(`Stream responded ${res.status}`);
+
+                    const reader = res.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                            applyEvent(buffer.slice(0, boundary));
+                            buffer = buffer.slice(boundary + 2);
+                        }
+                    }
+                } catch (err) {
+                    if (controller.signal.aborted) return;
+                    console.error("Dashboard Stream Error:", err);
+                    setLoading(false);
+                }
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        };
+
+        listen();
+        return () => controller.abort();
     }, [token, API_BASE_URL]);
 
     // RE-ADDED EXPORT CSV FUNCTION
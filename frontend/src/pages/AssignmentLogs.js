@@ -15,25 +15,49 @@ const AssignmentLogs = () => {
     const [filterDate, setFilterDate] = useState('');
     const [filterTab, setFilterTab] = useState('');
     const [filterUser, setFilterUser] = useState('');
+    const [showArchive, setShowArchive] = useState(false); // Older closed loans live in the archive
 
     const navigate = useNavigate();
     const API_BASE_URL = `http://${window.location.hostname}:8000`;
 
-    useEffect(() => {
+    const [nextCursor, setNextCursor] = useState(null);
+    const [tabModels, setTabModels] = useState([]);
+
+    // Filters are applied on the server; logs arrive one cursor page at a time
+    const fetchLogs = (cursor = null) => {
+        const params = { limit: 200 };
+        if (cursor) params.cursor = cursor;
+        if (filterDate) { params.date_from = filterDate; params.date_to = filterDate; }
+        if (filterTab) params.tab_model = filterTab;
+        if (filterUser) params.employee = filterUser;
+        if (showArchive) params.archive = 1;
+
         axios.get(`${API_BASE_URL}/api/logs/`, {
-            headers: { Authorization: `Bearer ${token}` }
+            headers: { Authorization: `Bearer ${token}` },
+            params
         })
         .then(res => {
-            setLogs(res.data);
+            setLogs(prev => cursor ? [...prev, ...res.data.results] : res.data.results);
+            setNextCursor(res.data.next_cursor);
             setLoading(false);
         })
         .catch(err => {
             console.error("Logs Load Error:", err);
             setLoading(false);
         });
-    }, [token, API_BASE_URL]);
+    };
+
+    useEffect(() => {
+        const timer = setTimeout(() => fetchLogs(), 300); // debounce typing in the user filter
+        return () => clearTimeout(timer);
+    }, [token, API_BASE_URL, filterDate, filterTab, filterUser, showArchive]);
+
+    // Model names for the filter dropdown (kept once seen, so filtering doesn't shrink the list)
+    useEffect(() => {
+        setTabModels(prev => [...new Set([...prev, ...logs.map(log => log.tab_model)])]);
+    }, [logs]);
 
-    const uniqueTabs = [...new Set(logs.map(log => log.tab_model))];
+    const uniqueTabs = tabModels;
 
     const clearFilters = () => {
         setFilterDate('');
@@ -44,18 +68,8 @@ const AssignmentLogs = () => {
     // ==========================================
     // LOGIC 1: FILTERED VIEW (Classic - 1 Row per Assignment)
     // ==========================================
-    const classicFilteredLogs = logs.filter(log => {
-        const matchUser = filterUser === '' || 
-                          log.username.toLowerCase().includes(filterUser.toLowerCase()) ||
-                          log.employee_id.toLowerCase().includes(filterUser.toLowerCase());
-        const matchTab = filterTab === '' || log.tab_model === filterTab;
-        let matchDate = true;
-        if (filterDate) {
-            const logDate = new Date(log.issued_at).toISOString().split('T')[0]; 
-            matchDate = logDate === filterDate;
-        }
-        return matchUser && matchTab && matchDate;
-    });
+    // Already filtered server-side
+    const classicFilteredLogs = logs;
 
     // ==========================================
     // LOGIC 2: DETAILED VIEW (Events - Split Checkout/Return)
@@ -176,6 +190,13 @@ const AssignmentLogs = () => {
                             <label style={{ display: 'block', fontSize: '12px', fontWeight: 'bold', color: '#6b7280', marginBottom: '5px' }}>User-Wise Filter</label>
                             <input type="text" placeholder="Search Name or Emp ID..." className="input-field" style={{ margin: 0 }} value={filterUser} onChange={(e) => setFilterUser(e.target.value)} />
                         </div>
+                        <div style={{ minWidth: '140px' }}>
+                            <label style={{ display: 'block', fontSize: '12px', fontWeight: 'bold', color: '#6b7280', marginBottom: '5px' }}>History</label>
+                            <select className="input-field" style={{ margin: 0 }} value={showArchive ? 'archive' : 'recent'} onChange={(e) => setShowArchive(e.target.value === 'archive')}>
+                                <option value="recent">Recent</option>
+                                <option value="archive">Archived</option>
+                            </select>
+                        </div>
                         <div style={{ display: 'flex', alignItems: 'flex-end' }}>
                             <button onClick={clearFilters} style={{ background: '#ef4444', color: 'white', border: 'none', padding: '12px 15px', borderRadius: '8px', cursor: 'pointer', fontWeight: 'bold', height: '42px' }}>Clear Filters</button>
                         </div>
@@ -258,6 +279,11 @@ const AssignmentLogs = () => {
                                     )}
                                 </tbody>
                             </table>
+                            {nextCursor && (
+                                <div style={{ padding: '15px', textAlign: 'center' }}>
+                                    <button onClick={() => fetchLogs(nextCursor)} style={{ background: '#3b82f6', color: 'white', border: 'none', padding: '10px 20px', borderRadius: '8px', cursor: 'pointer', fontWeight: 'bold' }}>Load More</button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </div>
@@ -14,6 +14,9 @@ const Login = () => {
     const { login } = useContext(AuthContext);
     const isSecure = window.location.protocol === 'https:';
     const API_BASE_URL = `http://${window.location.hostname}:8000`;
+    const MAX_LOGIN_ATTEMPTS = 5;
+
+    const wait = (seconds) => new Promise((resolve) => setTimeout(resolve, seconds * 1000));
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -21,10 +24,22 @@ const Login = () => {
         setError("");
 
         try {
-            const res = await axios.post(`${API_BASE_URL}/api/token/`, {
-                employee_id: employeeId,
-                password: password
-            });
+            let res;
+            for (let attempt = 1; !res; attempt++) {
+                try {
+                    res = await axios.post(`${API_BASE_URL}/api/token/`, {
+                        employee_id: employeeId,
+                        password: password
+                    });
+                } catch (err) {
+                    // 429: too many logins at once (start of shift). Retry when the server says to.
+                    if (err.response?.status !== 429 || attempt === MAX_LOGIN_ATTEMPTS) throw err;
+                    const seconds = Number(err.response.headers['retry-after']) || 2;
+                    setError(`Many people are logging in right now. Retrying in ${seconds}s...`);
+                    await wait(seconds);
+                }
+            }
+            setError("");
 
             // Check if the custom backend response includes the 'user' object
             if (res.data && res.data.user) {
@@ -36,7 +51,11 @@ const Login = () => {
                 console.error("Missing user object:", res.data);
             }
         } catch (err) {
-            setError("Invalid Employee ID or Password.");
+            if (err.response?.status === 429) {
+                setError(err.response.data.error);
+            } else {
+                setError("Invalid Employee ID or Password.");
+            }
             console.error("Login Error:", err.response?.data || err.message);
         } finally {
             setLoading(false);
@@ -1,35 +1,164 @@
+"""
+Production launcher.
+
+    python production_server.py
+
+On Linux/macOS the site is served by gunicorn with several worker processes,
+each running TAB_AUDIT_THREADS threads. The app is loaded and warmed up once in
+the master before any worker is forked, so every worker answers its first
+request warm. Workers are recycled after about TAB_AUDIT_MAX_REQUESTS requests
+(with jitter, so they don't all restart together). On Windows, or when
+gunicorn is not installed, the site falls back to a single waitress process.
+
+Environment (defaults in brackets):
+  TAB_AUDIT_PORT [8000]           TAB_AUDIT_SERVER [gunicorn, waitress on Windows]
+  TAB_AUDIT_WORKERS [CPU count]   TAB_AUDIT_THREADS [6]
+  TAB_AUDIT_MAX_REQUESTS [1000]   TAB_AUDIT_PIDFILE [none]
+  TAB_AUDIT_SWEEP_INTERVAL [300]  TAB_AUDIT_ROLLUP_INTERVAL [900]  (0 disables the job)
+  TAB_AUDIT_METRICS_DIR [./metrics]  where the processes share their request metrics
+  TAB_AUDIT_LOGIN_WORKERS [CPU count / workers in gunicorn mode]  password hashing processes per worker
+
+In gunicorn mode the background jobs (OTP sweeper, usage rollups) run once, in a
+separate `python production_server.py --jobs` process started by the master.
+
+Rolling restarts (gunicorn), with the master's pid from the banner or TAB_AUDIT_PIDFILE:
+  kill -HUP <pid>    new workers are started, then the old ones finish their
+                     requests (up to 30s) and exit. Code is not reloaded
+                     (it is preloaded in the master).
+  kill -USR2 <pid>   starts a new master and workers on the current code next to
+                     the old ones; then kill -QUIT <old pid> to drain and stop them.
+"""
 import os
 import sys
-import socket
+import logging
+import threading
+import subprocess
+from wsgiref.util import setup_testing_defaults
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows (no fork), or not installed
+    BaseApplication = None
+
+PORT = int(os.environ.get('TAB_AUDIT_PORT', 8000))
+SERVER = os.environ.get('TAB_AUDIT_SERVER', 'gunicorn' if BaseApplication is not None else 'waitress')
+WORKERS = int(os.environ.get('TAB_AUDIT_WORKERS', os.cpu_count() or 1))
+THREADS = int(os.environ.get('TAB_AUDIT_THREADS', 6))
+MAX_REQUESTS = int(os.environ.get('TAB_AUDIT_MAX_REQUESTS', 1000))
+PIDFILE = os.environ.get('TAB_AUDIT_PIDFILE')
+SWEEP_INTERVAL = int(os.environ.get('TAB_AUDIT_SWEEP_INTERVAL', 300))
+ROLLUP_INTERVAL = int(os.environ.get('TAB_AUDIT_ROLLUP_INTERVAL', 900))
+
+# Read by the settings, so set before the app is imported.
+# The worker processes add up their /api/admin/metrics/ counters here (core/metrics.py)
+os.environ.setdefault('TAB_AUDIT_METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+if SERVER == 'gunicorn':
+    # Every worker starts its own login hashing pool (core/login.py): share the CPUs between them
+    os.environ.setdefault('TAB_AUDIT_LOGIN_WORKERS', str(max(1, (os.cpu_count() or 1) // WORKERS)))
+
+from django.db import connections
 from waitress import serve
 from tab_audit_system.wsgi import application
+from core.sweeper import start_sweeper_thread
+from core.periodic import start_periodic_thread
+from core.rollups import rollup_usage
+from server_utils import get_ip
+
+def start_background_jobs():
+    logging.basicConfig(format='%(asctime)s %(name)s: %(message)s')
+    logging.getLogger('core.sweeper').setLevel(logging.INFO)
+
+    # Background cleanup of expired OTP rows (set TAB_AUDIT_SWEEP_INTERVAL=0 to disable)
+    if SWEEP_INTERVAL > 0:
+        start_sweeper_thread(interval=SWEEP_INTERVAL)
 
-def get_ip():
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        # doesn't even have to be reachable
-        s.connect(('10.255.255.255', 1))
-        IP = s.getsockname()[0]
-    except Exception:
-        IP = '127.0.0.1'
-    finally:
-        s.close()
-    return IP
-
-if __name__ == '__main__':
+    # Keep the analytics rollups current (set TAB_AUDIT_ROLLUP_INTERVAL=0 to disable)
+    if ROLLUP_INTERVAL > 0:
+        start_periodic_thread('usage-rollup', rollup_usage, ROLLUP_INTERVAL)
+
+def run_background_jobs():
+    """`--jobs`: the job process of gunicorn mode. The jobs must run once, not once per worker."""
+    start_background_jobs()
+    threading.Event().wait()
+
+def warm_up(app):
+    """Sends a few requests through the app, so URL resolvers, templates and the DB driver are loaded."""
+    for path in ('/api/', '/'):
+        environ = {'PATH_INFO': path}
+        setup_testing_defaults(environ)
+        statuses = []
+        body = app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(body)
+        finally:
+            body.close()
+        print(f"   warm-up GET {path}: {statuses[0]}")
+
+    connections['default'].ensure_connection()  # Fail now, not on the first request, if the DB is unreachable
+    # Forked workers must not inherit (and share) the master's connections
+    connections.close_all()
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """gunicorn run from this script, serving the preloaded application."""
+
+        def load_config(self):
+            options = {
+                'bind': f'0.0.0.0:{PORT}',
+                'workers': WORKERS,
+                'worker_class': 'gthread',
+                'threads': THREADS,
+                'preload_app': True,
+                'max_requests': MAX_REQUESTS,
+                'max_requests_jitter': MAX_REQUESTS // 10,
+                'graceful_timeout': 30,
+                'timeout': 120,  # Heartbeat of a worker process; long CSV exports run on its threads
+                'pidfile': PIDFILE,
+                'when_ready': self.when_ready,
+                'on_exit': self.on_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+        jobs = None
+
+        @classmethod
+        def when_ready(cls, server):
+            # A fresh interpreter: no threads or DB connections are forked from the master
+            cls.jobs = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--jobs'])
+
+        @classmethod
+        def on_exit(cls, server):
+            if cls.jobs is not None:
+                cls.jobs.terminate()
+
+if __name__ == '__main__' and sys.argv[1:] == ['--jobs']:
+    run_background_jobs()
+elif __name__ == '__main__':
     ip_address = get_ip()
-    port = 8000
-    
+    port = PORT
+    if SERVER == 'gunicorn' and BaseApplication is None:
+        sys.exit("TAB_AUDIT_SERVER=gunicorn, but gunicorn cannot be imported here (it does not run on Windows).")
+    mode = f"gunicorn, {WORKERS} workers x {THREADS} threads" if SERVER == 'gunicorn' else f"Waitress, {THREADS} threads"
+
     print("="*60)
-    print(f"   TAB AUDIT SYSTEM - PRODUCTION MODE (Waitress)")
-    print(f"   STATUS: RUNNING")
+    print(f"   TAB AUDIT SYSTEM - PRODUCTION MODE ({mode})")
+    print(f"   STATUS: RUNNING (pid {os.getpid()})")
     print("-" * 60)
     print(f"   >> Admin Panel:  http://{ip_address}:{port}/admin/")
     print(f"   >> For Tab return: http://{ip_address}:{port}/")
     print(f"   >> Admin otp dashboard: http://{ip_address}:{port}/admin/dashboard")
     print(f"   >> Check If running or not: http://{ip_address}:{port}/api/")
     print("="*60)
+    warm_up(application)
     print("\nLogs:")
 
-    # This runs the server robustly (like Apache/Nginx)
-    serve(application, host='0.0.0.0', port=port, threads=6)
\ No newline at end of file
+    if SERVER == 'gunicorn':
+        GunicornServer().run()
+    else:
+        start_background_jobs()
+        # This runs the server robustly (like Apache/Nginx)
+        serve(application, host='0.0.0.0', port=port, threads=THREADS)
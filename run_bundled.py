@@ -20,11 +20,15 @@ django.setup()
 # 3. Get the WSGI app
 application = get_wsgi_application()
 
+# Same settings as production_server.py (the bundle is for Windows, where gunicorn doesn't run)
+PORT = int(os.environ.get('TAB_AUDIT_PORT', 8000))
+THREADS = int(os.environ.get('TAB_AUDIT_THREADS', 6))
+
 if __name__ == '__main__':
     print("=========================================")
     print("   STARTING TAB AUDIT SERVER (BUNDLED)   ")
-    print("   Running on http://0.0.0.0:8000        ")
+    print(f"   Running on http://0.0.0.0:{PORT:<5}       ")
     print("=========================================")
     
     # 4. Start the Server (Waitress is robust for bundled apps)
-    serve(application, host='0.0.0.0', port=8000, threads=6)
\ No newline at end of file
+    serve(application, host='0.0.0.0', port=PORT, threads=THREADS)
\ No newline at end of file
@@ -0,0 +1,19 @@
+"""
+Helpers shared by the server launchers (production_server.py, asgi_server.py).
+
+Importing this module sets nothing up: no environment, Django or server.
+"""
+import socket
+
+
+def get_ip():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # doesn't even have to be reachable
+        s.connect(('10.255.255.255', 1))
+        IP = s.getsockname()[0]
+    except Exception:
+        IP = '127.0.0.1'
+    finally:
+        s.close()
+    return IP
@@ -0,0 +1,33 @@
+"""
+URLconf for requests served over ASGI (selected by core.middleware.ASGIURLConfMiddleware).
+
+The routes are those of urls.py. The read endpoints are swapped for the lean
+views of core/async_views.py, which run on the read pool of core/syncpool.py,
+and the remaining sync views run on its other pool.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.urls import URLPattern
+
+from core import async_views
+from core.syncpool import sync_view_in_pool
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+ASYNC_VIEWS = {
+    'user-possession': async_views.user_possession,
+    'user-history': async_views.user_history,
+    'admin-dashboard': async_views.admin_dashboard,
+    'all-logs': async_views.all_assignment_logs,
+}
+
+
+def _for_asgi(pattern):
+    if not isinstance(pattern, URLPattern):
+        return pattern  # The Django admin keeps Django's own handling
+    view = ASYNC_VIEWS.get(pattern.name, pattern.callback)
+    if not iscoroutinefunction(view):
+        view = sync_view_in_pool(view)
+    return URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+
+
+urlpatterns = [_for_asgi(pattern) for pattern in wsgi_urlpatterns]
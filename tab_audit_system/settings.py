@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
@@ -49,9 +51,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.ASGIURLConfMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.PriorityAdmissionMiddleware',
     'core.middleware.DisableCSRFForAPIMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -61,6 +66,28 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'tab_audit_system.urls'
 
+# Requests served over ASGI (asgi_server.py) use lean read views; see core/async_views.py
+ASGI_URLCONF = 'tab_audit_system.asgi_urls'
+# Threads that run the sync (write, export) views under ASGI; see core/syncpool.py
+ASGI_SYNC_THREADS = int(os.environ.get('TAB_AUDIT_SYNC_THREADS', 6))
+# Threads that run the read views (possession, history, dashboard, logs) and the dashboard stream under ASGI
+ASGI_READ_THREADS = int(os.environ.get('TAB_AUDIT_READ_THREADS', 4))
+
+# Requests in progress per process, by priority tier, before more are shed with 503 + Retry-After;
+# see core.middleware.PriorityAdmissionMiddleware. Critical routes (assign, return, force return) are
+# never capped. With the 6 server threads, low (2) + normal (3) always leave one for critical requests.
+ADMISSION_TIERS = {
+    # tier: (in progress at once, queued under ASGI, seconds a queued request waits)
+    'normal': (int(os.environ.get('TAB_AUDIT_NORMAL_LIMIT', 3)), 32, 2),
+    'low': (int(os.environ.get('TAB_AUDIT_LOW_PRIORITY_LIMIT', 2)), 8, 5),
+}
+
+# Per-endpoint request metrics, at /api/admin/metrics/; see core/metrics.py. With several worker
+# processes, each one shares its counters through a file in METRICS_DIR (production_server.py sets
+# it), written every METRICS_FLUSH_INTERVAL seconds. Empty: a scrape sees the serving process only.
+METRICS_DIR = os.environ.get('TAB_AUDIT_METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -90,8 +117,37 @@ DATABASES = {
 }
 
 DATABASES = {
-    'default': dj_database_url.config(default='sqlite:///db.sqlite3')
+    'default': dj_database_url.config(
+        default='sqlite:///db.sqlite3',
+        # Persistent connections. Under ASGI the app's queries run on the long-lived threads of core/syncpool.py
+        conn_max_age=int(os.environ.get('TAB_AUDIT_CONN_MAX_AGE', 600)),
+        conn_health_checks=True,
+    )
 }
+
+# SQLite profile for many concurrent users (see core/writelock.py):
+# - WAL: readers never wait for the writer, and the writer never waits for readers.
+# - synchronous=NORMAL: fsync at checkpoints, not at every commit. This is safe with WAL: a power
+#   cut can lose the last commits, but never corrupts the database.
+# - BEGIN IMMEDIATE: a transaction takes the write lock when it starts, so it waits in
+#   the busy timeout instead of failing with "database is locked" when it first writes.
+# - timeout: how long (seconds) a writer waits for another process's write lock.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    })
+    # Tests run on a file too, not in memory: each thread of a concurrency test then gets a
+    # connection of its own, with the same locking as the server. The name is unique per test
+    # run (set once, so parallel test workers inherit it), so runs never share a file.
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', os.environ.setdefault(
+        'TAB_AUDIT_TEST_DATABASE', os.path.join(tempfile.gettempdir(), f'tab_audit_test_{os.getpid()}.sqlite3'),
+    ))
+
+# Write views run one at a time per process on SQLite; see core/writelock.py
+SQLITE_SERIALIZE_WRITES = True
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -111,6 +167,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Logins hash on a process pool, with PBKDF2 at a configurable cost; see core/login.py
+AUTHENTICATION_BACKENDS = ['core.login.PooledModelBackend']
+
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# PBKDF2 iterations (0: Django's default). Stored hashes are redone at their next login.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('TAB_AUDIT_PASSWORD_ITERATIONS', 0))
+# Hashing processes per server process (0: hash on the request thread).
+# production_server.py divides the CPUs between its gunicorn workers instead.
+LOGIN_HASH_WORKERS = int(os.environ.get('TAB_AUDIT_LOGIN_WORKERS', os.cpu_count() or 1))
+# Logins in progress per server process before new ones get 429. Keep it below
+# TAB_AUDIT_THREADS, so that a login burst always leaves threads for the other endpoints.
+LOGIN_MAX_PENDING = int(os.environ.get('TAB_AUDIT_LOGIN_MAX_PENDING', 4))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -125,7 +201,8 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication with a per-process cache of the token users
+        'core.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -138,6 +215,13 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 }
+
+# Token users are cached per process for this many seconds (0 disables the cache); see core/authentication.py
+JWT_USER_CACHE_TTL = int(os.environ.get('TAB_AUDIT_USER_CACHE_TTL', 30))
+JWT_USER_CACHE_SIZE = 2048
+# Seconds between checks for user changes saved by other server processes
+JWT_USER_CACHE_CHECK_INTERVAL = float(os.environ.get('TAB_AUDIT_USER_CACHE_CHECK_INTERVAL', 2))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Company Tab Logging System API',
     'DESCRIPTION': 'Internal system for multi-branch tab usage auditing [cite: 2, 9]',
@@ -170,4 +254,6 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
     "http://172.31.0.203:3000",
 ]
+# The login page waits as long as a 429 from /api/token/ asks before retrying
+CORS_EXPOSE_HEADERS = ['Retry-After']
 
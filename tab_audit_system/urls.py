@@ -8,11 +8,14 @@ from rest_framework_simplejwt.views import TokenRefreshView
 # --- We must import initiate_transfer and accept_transfer here ---
 from core.views import (
     MyTokenObtainPairView, TabCheckInView, UserActivityHistoryView, 
-    UserPossessionView, AdminDashboardView, add_tab_stock, 
+    UserPossessionView, AdminDashboardView, import_devices, 
     export_usage_csv, AssignTabletView, InitiateReturnView, 
     VerifyReturnView, GenerateAssignmentOTPView, AllAssignmentLogsView,
-    initiate_transfer, accept_transfer,AdminForceReturnView
+    initiate_transfer, accept_transfer,AdminForceReturnView,
+    BatchAssignView, BatchInitiateReturnView, BatchVerifyReturnView, UsageAnalyticsView,
+    FleetConcurrencyView, MetricsView
 )
+from core.stream import dashboard_stream
 
 urlpatterns = [
     # Frontend Admin routes
@@ -38,8 +41,12 @@ urlpatterns = [
     
     # Admin API
     path('api/admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('api/admin/dashboard/stream/', dashboard_stream, name='admin-dashboard-stream'),
     path('api/admin/export-csv/', export_usage_csv, name='export_usage_csv'),
-    path('api/admin/add-tab/', add_tab_stock, name='add-tab'),
+    path('api/admin/devices/import/', import_devices, name='import-devices'),
+    path('api/admin/analytics/', UsageAnalyticsView.as_view(), name='usage-analytics'),
+    path('api/admin/fleet/concurrency/', FleetConcurrencyView.as_view(), name='fleet-concurrency'),
+    path('api/admin/metrics/', MetricsView.as_view(), name='metrics'),
     path('api/logs/', AllAssignmentLogsView.as_view(), name='all-logs'),
     
     # Assignment & Return
@@ -48,6 +55,11 @@ urlpatterns = [
     path('api/return/initiate/', InitiateReturnView.as_view(), name='return-initiate'),
     path('api/return/verify/', VerifyReturnView.as_view(), name='return-verify'),
 
+    # Kiosk carts: several devices per request
+    path('api/assign/batch/', BatchAssignView.as_view(), name='assign-batch'),
+    path('api/return/initiate/batch/', BatchInitiateReturnView.as_view(), name='return-initiate-batch'),
+    path('api/return/verify/batch/', BatchVerifyReturnView.as_view(), name='return-verify-batch'),
+
     path('api/admin/force-return/', AdminForceReturnView.as_view(), name='admin-force-return'),
     
     # Catch-all for React frontend (MUST be at the very bottom)